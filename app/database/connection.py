@@ -1,12 +1,24 @@
 import os
-from typing import Optional
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional, Type
 import asyncpg
 from loguru import logger
 
 # Global connection pool
 _pool: Optional[asyncpg.Pool] = None
 
-async def create_pool() -> asyncpg.Pool:
+
+class Row(asyncpg.Record):
+    """Read-only row returned by the pool
+
+    Supports `row['field']`, `row.get()`, `keys()` and `items()` without
+    copying into a dict. Rows cannot be modified; use `dict(row)` for a
+    mutable copy or for JSON encoding. Note that iterating a row yields
+    its values, not its keys.
+    """
+
+
+async def create_pool(record_class: Type[asyncpg.Record] = Row) -> asyncpg.Pool:
     """Create and return database connection pool"""
     global _pool
     
@@ -21,7 +33,8 @@ async def create_pool() -> asyncpg.Pool:
             user=os.getenv("DB_USER", "postgres"),
             password=os.getenv("DB_PASSWORD", "postgres"),
             min_size=5,
-            max_size=20
+            max_size=20,
+            record_class=record_class
         )
         
         # Initialize database if needed
@@ -48,60 +61,54 @@ async def close_pool():
         _pool = None
         logger.info("Database connection pool closed")
 
+@asynccontextmanager
+async def acquire(conn: Optional[asyncpg.Connection] = None) -> AsyncIterator[asyncpg.Connection]:
+    """Use the given connection, or acquire one from the pool if there is none"""
+    if conn is not None:
+        yield conn
+        return
+    
+    pool = await get_pool()
+    async with pool.acquire() as pool_conn:
+        yield pool_conn
+
+@asynccontextmanager
+async def transaction() -> AsyncIterator[asyncpg.Connection]:
+    """Acquire a connection and run everything done with it in one transaction"""
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            yield conn
+
+async def stream(query: str, *args, batch_size: Optional[int] = None) -> AsyncIterator[Row]:
+    """Stream the rows of a query from a server-side cursor, `batch_size` rows per round trip
+
+    The transaction stays open until the caller has consumed every row, so
+    only use it for consumers that don't wait on anything slow in between.
+    """
+    batch_size = batch_size or int(os.getenv("DB_STREAM_BATCH_SIZE", "1000"))
+    pool = await get_pool()
+    
+    async with pool.acquire() as conn:
+        # Server-side cursors only live inside a transaction
+        async with conn.transaction():
+            async for row in conn.cursor(query, *args, prefetch=batch_size):
+                yield row
+
 async def init_db():
-    """Initialize database tables if they don't exist"""
+    """Bring the database schema up to date"""
+    from app.database.migrations import run_migrations
+    from app.database.partitions import ensure_partitions
+    
     pool = await get_pool()
     
     async with pool.acquire() as conn:
-        # Create users table
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                telegram_id BIGINT UNIQUE NOT NULL,
-                username VARCHAR(255),
-                full_name VARCHAR(255) NOT NULL,
-                bio TEXT,
-                interests TEXT[],
-                location_lat FLOAT,
-                location_lon FLOAT,
-                radius INTEGER DEFAULT 10,
-                preferred_language VARCHAR(50) DEFAULT 'en',
-                photo_url TEXT,
-                created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-                updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-                is_active BOOLEAN DEFAULT TRUE,
-                preferred_days TEXT[],
-                preferred_time_start TIME,
-                preferred_time_end TIME,
-                timezone VARCHAR(50) DEFAULT 'UTC'
-            )
-        ''')
-        
-        # Create matches table
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS matches (
-                id SERIAL PRIMARY KEY,
-                user1_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                user2_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-                status VARCHAR(50) DEFAULT 'pending',
-                meeting_date TIMESTAMP WITH TIME ZONE,
-                feedback_user1 TEXT,
-                feedback_user2 TEXT,
-                UNIQUE(user1_id, user2_id, created_at)
-            )
-        ''')
+        # Apply pending schema migrations; a no-op when the version is current
+        old_version, new_version = await run_migrations(conn)
+        if new_version != old_version:
+            logger.info(f"Database schema migrated from version {old_version} to {new_version}")
         
-        # Create match history table
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS match_history (
-                id SERIAL PRIMARY KEY,
-                user1_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                user2_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                match_date TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-                status VARCHAR(50) DEFAULT 'completed',
-                feedback TEXT
-            )
-        ''')
+        # Make sure upcoming months have partitions; only missing ones are created
+        await ensure_partitions(conn)
         
         logger.info("Database tables initialized")
\ No newline at end of file
@@ -0,0 +1,274 @@
+import asyncio
+from typing import List, NamedTuple, Tuple
+import asyncpg
+from loguru import logger
+
+from app.database.partitions import partition_table
+
+# Arbitrary key that serializes migration runs across processes
+MIGRATION_LOCK_KEY = 7_240_511
+# Seconds between attempts to take the lock while another process migrates
+MIGRATION_LOCK_POLL_INTERVAL = 0.5
+
+
+class Migration(NamedTuple):
+    """A schema change applied once, in version order
+
+    Statements of a regular migration run in one transaction; they are SQL
+    strings or async functions taking the connection. A concurrent migration
+    holds (index name, CREATE INDEX CONCURRENTLY statement) pairs that run
+    outside a transaction so large tables stay writable.
+    """
+    version: int
+    name: str
+    statements: List
+    concurrent: bool = False
+
+
+async def _backfill_match_stats(conn: asyncpg.Connection):
+    """Fill user_match_stats from the matches that predate the counters"""
+    from app.database.repositories.match_repository import MatchRepository
+
+    await MatchRepository.rebuild_match_stats(conn)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "baseline tables", [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            telegram_id BIGINT UNIQUE NOT NULL,
+            username VARCHAR(255),
+            full_name VARCHAR(255) NOT NULL,
+            bio TEXT,
+            interests TEXT[],
+            location_lat FLOAT,
+            location_lon FLOAT,
+            radius INTEGER DEFAULT 10,
+            preferred_language VARCHAR(50) DEFAULT 'en',
+            photo_url TEXT,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+            is_active BOOLEAN DEFAULT TRUE,
+            preferred_days TEXT[],
+            preferred_time_start TIME,
+            preferred_time_end TIME,
+            timezone VARCHAR(50) DEFAULT 'UTC',
+            unreachable_since TIMESTAMP WITH TIME ZONE
+        )
+        ''',
+        # Databases created before migrations existed may lack newer columns
+        '''
+        ALTER TABLE users ADD COLUMN IF NOT EXISTS unreachable_since TIMESTAMP WITH TIME ZONE
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS matches (
+            id SERIAL PRIMARY KEY,
+            user1_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            user2_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+            status VARCHAR(50) DEFAULT 'pending',
+            meeting_date TIMESTAMP WITH TIME ZONE,
+            feedback_user1 TEXT,
+            feedback_user2 TEXT,
+            UNIQUE(user1_id, user2_id, created_at)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS match_history (
+            id SERIAL PRIMARY KEY,
+            user1_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            user2_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            match_date TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+            status VARCHAR(50) DEFAULT 'completed',
+            feedback TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS notification_outbox (
+            id BIGSERIAL PRIMARY KEY,
+            kind VARCHAR(50) NOT NULL,
+            payload JSONB NOT NULL,
+            idempotency_key VARCHAR(255) UNIQUE NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            available_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+            last_error TEXT,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+            sent_at TIMESTAMP WITH TIME ZONE
+        )
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_notification_outbox_pending
+        ON notification_outbox (available_at) WHERE status = 'pending'
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS user_match_stats (
+            user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+            total INTEGER NOT NULL DEFAULT 0,
+            completed INTEGER NOT NULL DEFAULT 0,
+            missed INTEGER NOT NULL DEFAULT 0,
+            pending INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+    ]),
+    Migration(2, "indexes for hot predicates", [
+        ("idx_matches_user1_created", '''
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_matches_user1_created
+            ON matches (user1_id, created_at DESC)
+        '''),
+        ("idx_matches_user2_created", '''
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_matches_user2_created
+            ON matches (user2_id, created_at DESC)
+        '''),
+        ("idx_matches_status", '''
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_matches_status
+            ON matches (status)
+        '''),
+        ("idx_matches_created_at", '''
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_matches_created_at
+            ON matches (created_at)
+        '''),
+        ("idx_match_history_user1_date", '''
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_match_history_user1_date
+            ON match_history (user1_id, match_date DESC)
+        '''),
+        ("idx_match_history_user2_date", '''
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_match_history_user2_date
+            ON match_history (user2_id, match_date DESC)
+        '''),
+        ("idx_users_active", '''
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_active
+            ON users (id) WHERE is_active = TRUE
+        '''),
+    ], concurrent=True),
+    Migration(3, "monthly partitions for matches and match history", [
+        lambda conn: partition_table(conn, "matches"),
+        lambda conn: partition_table(conn, "match_history"),
+    ]),
+    Migration(4, "distinct pairs kept out of archival", [
+        '''
+        CREATE TABLE IF NOT EXISTS match_pairs (
+            user1_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            user2_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            PRIMARY KEY (user1_id, user2_id),
+            CHECK (user1_id < user2_id)
+        )
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_match_pairs_user2 ON match_pairs (user2_id)
+        ''',
+        '''
+        INSERT INTO match_pairs (user1_id, user2_id)
+        SELECT DISTINCT LEAST(user1_id, user2_id), GREATEST(user1_id, user2_id)
+        FROM (
+            SELECT user1_id, user2_id FROM matches
+            UNION ALL
+            SELECT user1_id, user2_id FROM match_history
+        ) AS pairs
+        WHERE user1_id IS NOT NULL AND user2_id IS NOT NULL AND user1_id <> user2_id
+        ON CONFLICT DO NOTHING
+        ''',
+    ]),
+    Migration(5, "per-user match counters filled from existing matches", [
+        _backfill_match_stats,
+    ]),
+]
+
+
+def latest_version() -> int:
+    """Get the version the code expects"""
+    return max(migration.version for migration in MIGRATIONS)
+
+
+async def get_schema_version(conn: asyncpg.Connection) -> int:
+    """Get the applied schema version, 0 for a database without migrations"""
+    if not await conn.fetchval("SELECT to_regclass('schema_version') IS NOT NULL"):
+        return 0
+
+    return await conn.fetchval('SELECT COALESCE(MAX(version), 0) FROM schema_version')
+
+
+async def _create_index_concurrently(conn: asyncpg.Connection, name: str, statement: str):
+    """Create an index without blocking writes, replacing one left invalid by a failed run"""
+    valid = await conn.fetchval('''
+        SELECT i.indisvalid FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = $1
+    ''', name)
+
+    if valid is False:
+        logger.warning(f"Rebuilding invalid index {name}")
+        await conn.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+    await conn.execute(statement)
+
+
+async def _lock_migrations(conn: asyncpg.Connection):
+    """Take the migration lock, polling instead of waiting in the server
+
+    A session blocked in pg_advisory_lock holds a snapshot, and a concurrent
+    index build in the lock holder waits for that snapshot to go away, so a
+    blocking wait deadlocks. Between attempts this session holds nothing.
+    """
+    while not await conn.fetchval('SELECT pg_try_advisory_lock($1)', MIGRATION_LOCK_KEY):
+        await asyncio.sleep(MIGRATION_LOCK_POLL_INTERVAL)
+
+
+async def _apply(conn: asyncpg.Connection, migration: Migration):
+    """Apply one migration and record its version"""
+    if migration.concurrent:
+        for name, statement in migration.statements:
+            await _create_index_concurrently(conn, name, statement)
+
+        await conn.execute('''
+            INSERT INTO schema_version (version, name) VALUES ($1, $2)
+        ''', migration.version, migration.name)
+        return
+
+    async with conn.transaction():
+        for statement in migration.statements:
+            if callable(statement):
+                await statement(conn)
+            else:
+                await conn.execute(statement)
+
+        await conn.execute('''
+            INSERT INTO schema_version (version, name) VALUES ($1, $2)
+        ''', migration.version, migration.name)
+
+
+async def run_migrations(conn: asyncpg.Connection) -> Tuple[int, int]:
+    """Bring the schema up to date and return the (old, new) versions
+
+    Does nothing beyond reading the version when it is already current.
+    """
+    target = latest_version()
+    current = await get_schema_version(conn)
+    if current >= target:
+        return current, current
+
+    # Only one process migrates; the others wait and then see the new version
+    await _lock_migrations(conn)
+    try:
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                applied_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+            )
+        ''')
+
+        start = current = await get_schema_version(conn)
+
+        for migration in sorted(MIGRATIONS, key=lambda migration: migration.version):
+            if migration.version <= current:
+                continue
+
+            logger.info(f"Applying migration {migration.version}: {migration.name}")
+            await _apply(conn, migration)
+            current = migration.version
+
+        return start, current
+    finally:
+        await conn.execute('SELECT pg_advisory_unlock($1)', MIGRATION_LOCK_KEY)
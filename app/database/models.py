@@ -1,5 +1,6 @@
+import sys
 from datetime import datetime, time
-from typing import List, Optional, Union
+from typing import Any, List, Mapping, Optional, Sequence, Union
 from pydantic import BaseModel, Field
 
 
@@ -50,6 +51,7 @@ class User(UserBase):
     created_at: datetime
     updated_at: datetime
     is_active: bool = True
+    unreachable_since: Optional[datetime] = None
 
 
 class MatchBase(BaseModel):
@@ -108,4 +110,44 @@ class UserProfile(BaseModel):
     bio: Optional[str]
     interests: List[str]
     photo_url: Optional[str]
-    preferred_language: str
\ No newline at end of file
+    preferred_language: str
+
+class MatchingUser:
+    """Lean read-only snapshot of the user fields a matching round reads
+
+    Supports `user['field']` like the row dicts used elsewhere, so the
+    matching code works on either. Slots and interned strings keep a round
+    with many users small, and instances pickle cheaply into worker processes.
+    """
+    __slots__ = ("id", "location_lat", "location_lon", "radius", "preferred_language", "interests")
+
+    def __init__(
+        self,
+        id: int,
+        location_lat: Optional[float] = None,
+        location_lon: Optional[float] = None,
+        radius: Optional[int] = None,
+        preferred_language: Optional[str] = None,
+        interests: Optional[Sequence[str]] = None
+    ):
+        self.id = id
+        self.location_lat = location_lat
+        self.location_lon = location_lon
+        self.radius = radius
+        # Languages and interests repeat across users, so share one copy of each string
+        self.preferred_language = sys.intern(preferred_language) if preferred_language else preferred_language
+        self.interests = tuple(sys.intern(interest) for interest in interests or ())
+
+    @classmethod
+    def from_row(cls, row: Mapping[str, Any]) -> "MatchingUser":
+        """Build a snapshot from a user row"""
+        return cls(*(row[field] for field in cls.__slots__))
+
+    def __getitem__(self, field: str) -> Any:
+        try:
+            return getattr(self, field)
+        except AttributeError:
+            raise KeyError(field) from None
+
+    def __repr__(self) -> str:
+        return f"MatchingUser(id={self.id})"
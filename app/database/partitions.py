@@ -0,0 +1,250 @@
+import asyncio
+import gzip
+import os
+import re
+from datetime import date, datetime
+from typing import Dict, List, NamedTuple, Optional
+
+import asyncpg
+from loguru import logger
+
+from app.database.connection import acquire
+
+
+class PartitionedTable(NamedTuple):
+    """A table split into monthly range partitions"""
+    column: str
+    create: str
+    indexes: List[str]
+
+
+PARTITIONED_TABLES: Dict[str, PartitionedTable] = {
+    "matches": PartitionedTable("created_at", '''
+        CREATE TABLE matches (
+            id INTEGER NOT NULL DEFAULT nextval('{sequence}'),
+            user1_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            user2_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+            status VARCHAR(50) DEFAULT 'pending',
+            meeting_date TIMESTAMP WITH TIME ZONE,
+            feedback_user1 TEXT,
+            feedback_user2 TEXT,
+            PRIMARY KEY (id, created_at),
+            UNIQUE (user1_id, user2_id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    ''', [
+        'CREATE INDEX IF NOT EXISTS idx_matches_user1_created ON matches (user1_id, created_at DESC)',
+        'CREATE INDEX IF NOT EXISTS idx_matches_user2_created ON matches (user2_id, created_at DESC)',
+        'CREATE INDEX IF NOT EXISTS idx_matches_status ON matches (status)',
+        'CREATE INDEX IF NOT EXISTS idx_matches_created_at ON matches (created_at)',
+    ]),
+    "match_history": PartitionedTable("match_date", '''
+        CREATE TABLE match_history (
+            id INTEGER NOT NULL DEFAULT nextval('{sequence}'),
+            user1_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            user2_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            match_date TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+            status VARCHAR(50) DEFAULT 'completed',
+            feedback TEXT,
+            PRIMARY KEY (id, match_date)
+        ) PARTITION BY RANGE (match_date)
+    ''', [
+        'CREATE INDEX IF NOT EXISTS idx_match_history_user1_date ON match_history (user1_id, match_date DESC)',
+        'CREATE INDEX IF NOT EXISTS idx_match_history_user2_date ON match_history (user2_id, match_date DESC)',
+    ]),
+}
+
+
+def month_start(value: date) -> date:
+    """Get the first day of the month of a date"""
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    """Move the first day of a month by a number of months"""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    """Get the name of a table's partition for a month"""
+    return f"{table}_{month.year:04d}_{month.month:02d}"
+
+
+def partition_month(table: str, name: str) -> Optional[date]:
+    """Get the month a partition covers, or None for other tables like the default partition"""
+    found = re.fullmatch(rf"{re.escape(table)}_(\d{{4}})_(\d{{2}})", name)
+    return date(int(found.group(1)), int(found.group(2)), 1) if found else None
+
+
+def partitions_to_archive(table: str, names: List[str], cutoff: date) -> List[str]:
+    """Get the monthly partitions that end on or before the cutoff month, oldest first"""
+    months = {name: partition_month(table, name) for name in names}
+    return sorted(
+        (name for name, month in months.items() if month and add_months(month, 1) <= cutoff),
+        key=lambda name: months[name]
+    )
+
+
+async def list_partitions(conn: asyncpg.Connection, table: str) -> List[str]:
+    """Get the names of a table's partitions"""
+    rows = await conn.fetch('''
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = $1
+    ''', table)
+
+    return [row['relname'] for row in rows]
+
+
+async def create_partitions(conn: asyncpg.Connection, table: str, first: date, last: date) -> List[str]:
+    """Create the missing monthly partitions from the first to the last month"""
+    existing = set(await list_partitions(conn, table))
+    created = []
+
+    month = month_start(first)
+    while month <= last:
+        name = partition_name(table, month)
+
+        if name not in existing:
+            await conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table}
+                FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')
+            ''')
+            created.append(name)
+
+        month = add_months(month, 1)
+
+    return created
+
+
+async def ensure_partitions(
+    conn: Optional[asyncpg.Connection] = None,
+    months_ahead: Optional[int] = None
+) -> List[str]:
+    """Create partitions for the current month and the coming ones"""
+    months_ahead = months_ahead if months_ahead is not None else int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+    current = month_start(datetime.utcnow().date())
+    created = []
+
+    async with acquire(conn) as conn:
+        for table in PARTITIONED_TABLES:
+            try:
+                created += await create_partitions(conn, table, current, add_months(current, months_ahead))
+            except asyncpg.PostgresError as e:
+                # Usually rows for the month already landed in the default partition
+                logger.error(f"Failed to create partitions for {table}: {e}")
+
+    if created:
+        logger.info(f"Created partitions: {', '.join(created)}")
+
+    return created
+
+
+async def partition_table(conn: asyncpg.Connection, table: str):
+    """Convert a plain table into a monthly partitioned one, keeping its rows and IDs
+
+    Runs inside the migration transaction.
+    """
+    spec = PARTITIONED_TABLES[table]
+    sequence = await conn.fetchval("SELECT pg_get_serial_sequence($1, 'id')", table)
+
+    # Move the old table and its indexes out of the way
+    await conn.execute(f'ALTER SEQUENCE {sequence} OWNED BY NONE')
+    await conn.execute(f'ALTER TABLE {table} RENAME TO {table}_unpartitioned')
+    for row in await conn.fetch("SELECT indexname FROM pg_indexes WHERE tablename = $1", f"{table}_unpartitioned"):
+        await conn.execute(f'ALTER INDEX {row["indexname"]} RENAME TO {row["indexname"]}_unpartitioned')
+
+    await conn.execute(spec.create.format(sequence=sequence))
+    await conn.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+
+    # Cover every month that has rows, up to the current one
+    oldest = await conn.fetchval(f'SELECT MIN({spec.column}) FROM {table}_unpartitioned')
+    current = month_start(datetime.utcnow().date())
+    await create_partitions(conn, table, month_start(oldest.date()) if oldest else current, current)
+
+    columns = [
+        row['column_name'] for row in await conn.fetch('''
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = $1 ORDER BY ordinal_position
+        ''', table)
+    ]
+    selected = [f"COALESCE({column}, NOW())" if column == spec.column else column for column in columns]
+    await conn.execute(f'''
+        INSERT INTO {table} ({", ".join(columns)})
+        SELECT {", ".join(selected)} FROM {table}_unpartitioned
+    ''')
+
+    await conn.execute(f'ALTER SEQUENCE {sequence} OWNED BY {table}.id')
+    await conn.execute(f'DROP TABLE {table}_unpartitioned')
+
+    for statement in spec.indexes:
+        await conn.execute(statement)
+
+
+async def _export_partition(conn: asyncpg.Connection, name: str, path: str):
+    """Write a table to a gzip compressed CSV file without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    temporary = f"{path}.part"
+    archive = await loop.run_in_executor(None, gzip.open, temporary, "wb")
+
+    try:
+        async def write(data: bytes):
+            await loop.run_in_executor(None, archive.write, data)
+
+        await conn.copy_from_table(name, output=write, format='csv', header=True)
+    finally:
+        await loop.run_in_executor(None, archive.close)
+
+    # Only a complete file gets the final name
+    os.replace(temporary, path)
+
+
+async def archive_partitions(
+    retention_months: Optional[int] = None,
+    archive_dir: Optional[str] = None
+) -> List[str]:
+    """Save partitions older than the retention period to gzip files, then detach and drop them
+
+    Off unless a retention period is set. Nothing is dropped without an
+    existing absolute archive directory, which should be durable storage
+    such as a mounted volume, or while per-user stats are computed from
+    the matches table. Who has met whom is kept in match_pairs.
+    """
+    from app.database.repositories.match_repository import stats_counters_enabled
+
+    retention_months = retention_months if retention_months is not None else int(
+        os.getenv("PARTITION_RETENTION_MONTHS", "0")
+    )
+    archive_dir = archive_dir or os.getenv("PARTITION_ARCHIVE_DIR", "")
+
+    if retention_months <= 0:
+        return []
+
+    if not archive_dir or not os.path.isabs(archive_dir) or not os.path.isdir(archive_dir):
+        logger.error(
+            f"Not archiving partitions: PARTITION_ARCHIVE_DIR must be an existing absolute directory, got {archive_dir!r}"
+        )
+        return []
+
+    if not stats_counters_enabled():
+        logger.error("Not archiving partitions: match stats would lose archived matches with MATCH_STATS_COUNTERS off")
+        return []
+
+    cutoff = add_months(month_start(datetime.utcnow().date()), -retention_months)
+    archived = []
+
+    async with acquire() as conn:
+        for table in PARTITIONED_TABLES:
+            for name in partitions_to_archive(table, await list_partitions(conn, table), cutoff):
+                # Old months no longer change, so export first and only drop a fully written partition
+                await _export_partition(conn, name, os.path.join(archive_dir, f"{name}.csv.gz"))
+                
+                await conn.execute(f'ALTER TABLE {table} DETACH PARTITION {name}')
+                await conn.execute(f'DROP TABLE {name}')
+
+                logger.info(f"Archived partition {name}")
+                archived.append(name)
+
+    return archived
@@ -1,5 +1,7 @@
 # repositories package
 from app.database.repositories.user_repository import UserRepository
 from app.database.repositories.match_repository import MatchRepository
+from app.database.repositories.outbox_repository import OutboxRepository
+from app.database.repositories.loader import DataLoader, user_loader, match_loader
 
-__all__ = ['UserRepository', 'MatchRepository']
\ No newline at end of file
+__all__ = ['UserRepository', 'MatchRepository', 'OutboxRepository', 'DataLoader', 'user_loader', 'match_loader']
\ No newline at end of file
@@ -0,0 +1,93 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional
+
+from app.database.repositories.user_repository import UserRepository
+from app.database.repositories.match_repository import MatchRepository
+
+
+class DataLoader:
+    """Coalesce point lookups made in the same event-loop tick into one batch call
+
+    Keys requested while a tick runs are resolved together by `batch_fn`,
+    which takes a list of keys and returns a dict of the ones it found.
+    Requests for a key that is already queued or being loaded share its
+    future. Nothing is cached once a batch has resolved, and results are
+    shared between callers, so they must not be modified.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+        max_batch_size: int = 1000
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        self._queue: List[Hashable] = []
+        self._scheduled = False
+
+    def _bind(self) -> asyncio.AbstractEventLoop:
+        """Reset the state when used from a different event loop"""
+        loop = asyncio.get_running_loop()
+
+        if loop is not self._loop:
+            self._loop = loop
+            self._pending = {}
+            self._queue = []
+            self._scheduled = False
+
+        return loop
+
+    async def load(self, key: Hashable) -> Optional[Any]:
+        """Load one value, or None if it does not exist"""
+        loop = self._bind()
+        future = self._pending.get(key)
+
+        if future is None:
+            future = loop.create_future()
+            self._pending[key] = future
+            self._queue.append(key)
+
+            # Dispatch once everything already runnable in this tick has queued its keys
+            if not self._scheduled:
+                self._scheduled = True
+                loop.call_soon(self._dispatch)
+
+        # Shield so a cancelled caller doesn't cancel the lookup for the others
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys: Iterable[Hashable]) -> List[Optional[Any]]:
+        """Load several values in the order of the keys"""
+        return list(await asyncio.gather(*[self.load(key) for key in keys]))
+
+    def _dispatch(self):
+        """Start one batch call per chunk of queued keys"""
+        keys, self._queue = self._queue, []
+        self._scheduled = False
+
+        for start in range(0, len(keys), self.max_batch_size):
+            asyncio.ensure_future(self._resolve(keys[start:start + self.max_batch_size]))
+
+    async def _resolve(self, keys: List[Hashable]):
+        """Run a batch call and settle the futures of its keys"""
+        try:
+            results = await self.batch_fn(keys)
+        except Exception as e:
+            for key in keys:
+                future = self._pending.pop(key)
+                if not future.done():
+                    future.set_exception(e)
+                    # Mark as retrieved in case every caller was cancelled
+                    future.exception()
+            return
+
+        for key in keys:
+            future = self._pending.pop(key)
+            if not future.done():
+                future.set_result(results.get(key))
+
+
+# Shared loaders for the hottest point lookups
+user_loader = DataLoader(UserRepository.get_users_by_ids)
+match_loader = DataLoader(MatchRepository.get_matches_by_ids)
@@ -1,30 +1,159 @@
-from typing import List, Optional, Dict, Any, Tuple
+from typing import List, Optional, Dict, Any, Tuple, AsyncIterator
 from datetime import datetime
+import os
 import asyncpg
 
-from app.database.connection import get_pool
+from app.database.connection import Row, get_pool, acquire, stream
 from app.database.models import MatchCreate, MatchUpdate, MatchHistoryCreate
 
 
+def for_participant(columns: str, table: str, extra: str = "", tail: str = "") -> str:
+    """Build a query for the rows of `table` where $1 is either participant
+
+    A UNION ALL of one branch per participant column lets each branch use its
+    own (user_id, date) index instead of scanning for an OR predicate.
+    `extra` adds conditions and `tail` adds ORDER BY/LIMIT to every branch.
+    """
+    return (
+        f"(SELECT {columns} FROM {table} WHERE user1_id = $1{extra}{tail}) "
+        f"UNION ALL "
+        f"(SELECT {columns} FROM {table} WHERE user2_id = $1 AND user1_id <> $1{extra}{tail})"
+    )
+
+
+def stats_counters_enabled() -> bool:
+    """Whether the user_match_stats counters are maintained and read"""
+    return os.getenv("MATCH_STATS_COUNTERS", "true").lower() == "true"
+
+
 class MatchRepository:
     """Repository for match-related database operations"""
 
+    @staticmethod
+    async def _apply_stats(conn: asyncpg.Connection, changes: List[Tuple[int, str, int]]):
+        """Apply (user_id, status, +1/-1) changes to the per-user match counters"""
+        if not changes or not stats_counters_enabled():
+            return
+        
+        await conn.execute('''
+            INSERT INTO user_match_stats AS s (user_id, total, completed, missed, pending)
+            SELECT user_id,
+                   SUM(delta),
+                   COALESCE(SUM(delta) FILTER (WHERE status = 'completed'), 0),
+                   COALESCE(SUM(delta) FILTER (WHERE status IN ('missed', 'cancelled')), 0),
+                   COALESCE(SUM(delta) FILTER (WHERE status = 'pending'), 0)
+            FROM unnest($1::int[], $2::text[], $3::int[]) AS changes(user_id, status, delta)
+            GROUP BY user_id
+            ON CONFLICT (user_id) DO UPDATE SET
+                total = s.total + EXCLUDED.total,
+                completed = s.completed + EXCLUDED.completed,
+                missed = s.missed + EXCLUDED.missed,
+                pending = s.pending + EXCLUDED.pending
+        ''', [change[0] for change in changes], [change[1] for change in changes],
+            [change[2] for change in changes])
+
+    @staticmethod
+    async def _record_pairs(conn: asyncpg.Connection, pairs: List[Tuple[int, int]]):
+        """Remember who has met whom in match_pairs, which outlives archived partitions"""
+        pairs = [
+            (min(user1_id, user2_id), max(user1_id, user2_id))
+            for user1_id, user2_id in pairs
+            if user1_id is not None and user2_id is not None and user1_id != user2_id
+        ]
+        if not pairs:
+            return
+        
+        await conn.execute('''
+            INSERT INTO match_pairs (user1_id, user2_id)
+            SELECT * FROM unnest($1::int[], $2::int[])
+            ON CONFLICT DO NOTHING
+        ''', [pair[0] for pair in pairs], [pair[1] for pair in pairs])
+
+    @staticmethod
+    async def rebuild_match_stats(conn: Optional[asyncpg.Connection] = None):
+        """Recompute the per-user match counters from the matches table
+        
+        Matches in archived partitions are no longer counted.
+        """
+        async with acquire(conn) as conn:
+            async with conn.transaction():
+                await conn.execute('DELETE FROM user_match_stats')
+                await conn.execute('''
+                    INSERT INTO user_match_stats (user_id, total, completed, missed, pending)
+                    SELECT user_id,
+                           COUNT(*),
+                           COUNT(*) FILTER (WHERE status = 'completed'),
+                           COUNT(*) FILTER (WHERE status IN ('missed', 'cancelled')),
+                           COUNT(*) FILTER (WHERE status = 'pending')
+                    FROM (
+                        SELECT user1_id AS user_id, status FROM matches
+                        UNION ALL
+                        SELECT user2_id AS user_id, status FROM matches
+                    ) AS participants
+                    WHERE user_id IS NOT NULL
+                    GROUP BY user_id
+                ''')
+
     @staticmethod
     async def create_match(match: MatchCreate) -> int:
         """Create a new match and return the match ID"""
         pool = await get_pool()
         
         async with pool.acquire() as conn:
-            match_id = await conn.fetchval('''
-                INSERT INTO matches (user1_id, user2_id, status, meeting_date)
-                VALUES ($1, $2, $3, $4)
-                RETURNING id
-            ''', match.user1_id, match.user2_id, match.status, match.meeting_date)
+            async with conn.transaction():
+                match_id = await conn.fetchval('''
+                    INSERT INTO matches (user1_id, user2_id, status, meeting_date)
+                    VALUES ($1, $2, $3, $4)
+                    RETURNING id
+                ''', match.user1_id, match.user2_id, match.status, match.meeting_date)
+                
+                await MatchRepository._apply_stats(conn, [
+                    (match.user1_id, match.status, 1),
+                    (match.user2_id, match.status, 1)
+                ])
+                await MatchRepository._record_pairs(conn, [(match.user1_id, match.user2_id)])
             
             return match_id
 
     @staticmethod
-    async def get_match_by_id(match_id: int) -> Optional[Dict[str, Any]]:
+    async def create_matches(
+        matches: List[MatchCreate],
+        conn: Optional[asyncpg.Connection] = None
+    ) -> List[int]:
+        """Create many matches in a single transaction and return their IDs in order"""
+        if not matches:
+            return []
+        
+        async with acquire(conn) as conn:
+            async with conn.transaction():
+                # Reserve IDs up front so they can be returned in input order
+                rows = await conn.fetch('''
+                    SELECT nextval(pg_get_serial_sequence('matches', 'id')) AS id
+                    FROM generate_series(1, $1)
+                ''', len(matches))
+                match_ids = [row['id'] for row in rows]
+                
+                # Bulk load the whole round with COPY
+                await conn.copy_records_to_table(
+                    'matches',
+                    records=[
+                        (match_id, match.user1_id, match.user2_id, match.status, match.meeting_date)
+                        for match_id, match in zip(match_ids, matches)
+                    ],
+                    columns=['id', 'user1_id', 'user2_id', 'status', 'meeting_date']
+                )
+                
+                await MatchRepository._apply_stats(conn, [
+                    (user_id, match.status, 1)
+                    for match in matches
+                    for user_id in (match.user1_id, match.user2_id)
+                ])
+                await MatchRepository._record_pairs(conn, [(match.user1_id, match.user2_id) for match in matches])
+            
+            return match_ids
+
+    @staticmethod
+    async def get_match_by_id(match_id: int) -> Optional[Row]:
         """Get a match by ID"""
         pool = await get_pool()
         
@@ -33,13 +162,27 @@ class MatchRepository:
                 SELECT * FROM matches WHERE id = $1
             ''', match_id)
             
-            return dict(match) if match else None
+            return match
 
     @staticmethod
-    async def update_match(match_id: int, match_data: MatchUpdate) -> bool:
-        """Update match information"""
+    async def get_matches_by_ids(match_ids: List[int]) -> Dict[int, Row]:
+        """Get several matches by ID with one query, keyed by ID"""
         pool = await get_pool()
         
+        async with pool.acquire() as conn:
+            matches = await conn.fetch('''
+                SELECT * FROM matches WHERE id = ANY($1::int[])
+            ''', list(match_ids))
+            
+            return {match['id']: match for match in matches}
+
+    @staticmethod
+    async def update_match(
+        match_id: int,
+        match_data: MatchUpdate,
+        conn: Optional[asyncpg.Connection] = None
+    ) -> bool:
+        """Update match information"""
         # Filter out None values
         update_data = {k: v for k, v in match_data.dict().items() if v is not None}
         if not update_data:
@@ -48,61 +191,77 @@ class MatchRepository:
         # Build the SET clause dynamically
         set_clause = ", ".join([f"{key} = ${i+1}" for i, key in enumerate(update_data.keys())])
         
-        # Build the query
-        query = f"UPDATE matches SET {set_clause} WHERE id = ${len(update_data) + 1} RETURNING id"
+        # Build the query, returning the previous status for the counters
+        query = f'''
+            UPDATE matches m SET {set_clause}
+            FROM (SELECT id, status FROM matches WHERE id = ${len(update_data) + 1} FOR UPDATE) AS old
+            WHERE m.id = old.id
+            RETURNING m.id, m.user1_id, m.user2_id, m.status, old.status AS old_status
+        '''
         
         # Build the parameters
         params = list(update_data.values()) + [match_id]
         
-        async with pool.acquire() as conn:
-            result = await conn.fetchval(query, *params)
+        async with acquire(conn) as conn:
+            async with conn.transaction():
+                result = await conn.fetchrow(query, *params)
+                
+                if result and result['status'] != result['old_status']:
+                    await MatchRepository._apply_stats(conn, [
+                        (user_id, status, delta)
+                        for user_id in (result['user1_id'], result['user2_id'])
+                        for status, delta in ((result['old_status'], -1), (result['status'], 1))
+                    ])
+            
             return result is not None
 
     @staticmethod
-    async def get_user_matches(user_id: int, status: Optional[str] = None) -> List[Dict[str, Any]]:
+    async def get_user_matches(user_id: int, status: Optional[str] = None) -> List[Row]:
         """Get all matches for a user"""
         pool = await get_pool()
         
-        conditions = ["(user1_id = $1 OR user2_id = $1)"]
+        extra = ""
         params = [user_id]
         
         if status:
-            conditions.append("status = $2")
+            extra = " AND status = $2"
             params.append(status)
         
-        where_clause = " AND ".join(conditions)
-        query = f"SELECT * FROM matches WHERE {where_clause} ORDER BY created_at DESC"
+        query = f"SELECT * FROM ({for_participant('*', 'matches', extra)}) AS m ORDER BY created_at DESC"
         
         async with pool.acquire() as conn:
             matches = await conn.fetch(query, *params)
-            return [dict(match) for match in matches]
+            return matches
 
     @staticmethod
-    async def get_match_history(user_id: int) -> List[Dict[str, Any]]:
+    async def get_match_history(user_id: int) -> List[Row]:
         """Get match history for a user"""
         pool = await get_pool()
         
         async with pool.acquire() as conn:
-            history = await conn.fetch('''
-                SELECT * FROM match_history 
-                WHERE user1_id = $1 OR user2_id = $1
+            history = await conn.fetch(f'''
+                SELECT * FROM ({for_participant('*', 'match_history')}) AS h
                 ORDER BY match_date DESC
             ''', user_id)
             
-            return [dict(entry) for entry in history]
+            return history
 
     @staticmethod
-    async def add_to_history(history_entry: MatchHistoryCreate) -> int:
+    async def add_to_history(
+        history_entry: MatchHistoryCreate,
+        conn: Optional[asyncpg.Connection] = None
+    ) -> int:
         """Add a match to history"""
-        pool = await get_pool()
-        
-        async with pool.acquire() as conn:
-            history_id = await conn.fetchval('''
-                INSERT INTO match_history (user1_id, user2_id, status, feedback)
-                VALUES ($1, $2, $3, $4)
-                RETURNING id
-            ''', history_entry.user1_id, history_entry.user2_id, 
-                history_entry.status, history_entry.feedback)
+        async with acquire(conn) as conn:
+            async with conn.transaction():
+                history_id = await conn.fetchval('''
+                    INSERT INTO match_history (user1_id, user2_id, status, feedback)
+                    VALUES ($1, $2, $3, $4)
+                    RETURNING id
+                ''', history_entry.user1_id, history_entry.user2_id, 
+                    history_entry.status, history_entry.feedback)
+                
+                await MatchRepository._record_pairs(conn, [(history_entry.user1_id, history_entry.user2_id)])
             
             return history_id
 
@@ -112,27 +271,82 @@ class MatchRepository:
         pool = await get_pool()
         
         async with pool.acquire() as conn:
-            # Get from matches table
-            current_matches = await conn.fetch('''
-                SELECT user1_id, user2_id FROM matches
-                WHERE user1_id = $1 OR user2_id = $1
+            # Pairs are stored once, smaller ID first, so the branches never overlap
+            rows = await conn.fetch('''
+                SELECT user2_id AS other_id FROM match_pairs WHERE user1_id = $1
+                UNION ALL
+                SELECT user1_id FROM match_pairs WHERE user2_id = $1
             ''', user_id)
             
-            # Get from history table
-            history_matches = await conn.fetch('''
-                SELECT user1_id, user2_id FROM match_history
-                WHERE user1_id = $1 OR user2_id = $1
-            ''', user_id)
+            return [row['other_id'] for row in rows]
+
+    @staticmethod
+    async def iter_match_pairs(batch_size: int = 5000) -> AsyncIterator[Tuple[int, int]]:
+        """Stream every distinct pair of users that has ever been matched, archived ones included"""
+        async for row in stream('''
+            SELECT user1_id, user2_id FROM match_pairs
+        ''', batch_size=batch_size):
+            yield row['user1_id'], row['user2_id']
+
+    @staticmethod
+    async def iter_pending_reminders(
+        timezones: Optional[List[str]] = None,
+        created_before: Optional[datetime] = None,
+        batch_size: Optional[int] = None
+    ) -> AsyncIterator[Row]:
+        """Stream one reminder row per participant of every pending match
+        
+        Each row carries the match ID, the recipient's telegram ID and the
+        partner's ID and name, so reminders need no further queries. With
+        `timezones` only recipients in those timezones ('' for none) are included,
+        and with `created_before` only matches created before that time.
+        
+        Matches are paged by ID, `batch_size` at a time, with short queries
+        whose connection is released before the rows are handed out, so slow
+        rate-limited sends never keep a transaction or snapshot open.
+        """
+        batch_size = batch_size or int(os.getenv("DB_STREAM_BATCH_SIZE", "1000"))
+        last_id = 0
+        
+        while True:
+            pool = await get_pool()
             
-            # Combine and extract the other user's ID
-            matched_users = set()
-            for match in current_matches + history_matches:
-                if match['user1_id'] == user_id:
-                    matched_users.add(match['user2_id'])
-                else:
-                    matched_users.add(match['user1_id'])
+            async with pool.acquire() as conn:
+                page = await conn.fetch('''
+                    SELECT id FROM matches
+                    WHERE status = 'pending' AND id > $1
+                      AND ($2::timestamptz IS NULL OR created_at < $2::timestamptz)
+                    ORDER BY id
+                    LIMIT $3
+                ''', last_id, created_before, batch_size)
+                
+                if not page:
+                    return
+                
+                rows = await conn.fetch('''
+                    SELECT m.id AS match_id,
+                           recipient.telegram_id AS telegram_id,
+                           partner.id AS partner_id,
+                           partner.full_name AS partner_full_name
+                    FROM matches m
+                    CROSS JOIN LATERAL (
+                        VALUES (m.user1_id, m.user2_id), (m.user2_id, m.user1_id)
+                    ) AS pair(recipient_id, partner_id)
+                    JOIN users recipient ON recipient.id = pair.recipient_id
+                    JOIN users partner ON partner.id = pair.partner_id
+                    WHERE m.id = ANY($1::int[])
+                      AND m.status = 'pending'
+                      AND recipient.unreachable_since IS NULL
+                      AND ($2::text[] IS NULL OR COALESCE(recipient.timezone, '') = ANY($2::text[]))
+                    ORDER BY m.id
+                ''', [match['id'] for match in page], timezones)
             
-            return list(matched_users)
+            for row in rows:
+                yield row
+            
+            if len(page) < batch_size:
+                return
+            last_id = page[-1]['id']
 
     @staticmethod
     async def count_missed_matches(user_id: int) -> int:
@@ -141,9 +355,10 @@ class MatchRepository:
         
         async with pool.acquire() as conn:
             # Get the most recent matches in reverse chronological order
-            recent_matches = await conn.fetch('''
-                SELECT id, status FROM matches
-                WHERE (user1_id = $1 OR user2_id = $1)
+            recent_matches = await conn.fetch(f'''
+                SELECT id, status FROM (
+                    {for_participant('id, status, created_at', 'matches', tail=' ORDER BY created_at DESC LIMIT 10')}
+                ) AS recent
                 ORDER BY created_at DESC
                 LIMIT 10
             ''', user_id)
@@ -159,45 +374,72 @@ class MatchRepository:
             
             return missed_count
 
+    @staticmethod
+    async def get_missed_streaks(max_lookback: int = 10) -> Dict[int, int]:
+        """Count consecutive missed matches for every active user in one query"""
+        pool = await get_pool()
+        
+        async with pool.acquire() as conn:
+            # Rank each active user's matches newest first, then take the position
+            # of the first non-missed match as the length of the current streak
+            rows = await conn.fetch('''
+                WITH participants AS (
+                    SELECT user1_id AS user_id, status, created_at FROM matches
+                    UNION ALL
+                    SELECT user2_id AS user_id, status, created_at FROM matches
+                ),
+                ranked AS (
+                    SELECT p.user_id, p.status,
+                           ROW_NUMBER() OVER (
+                               PARTITION BY p.user_id ORDER BY p.created_at DESC
+                           ) AS rn
+                    FROM participants p
+                    JOIN users u ON u.id = p.user_id
+                    WHERE u.is_active = TRUE
+                )
+                SELECT user_id,
+                       COALESCE(
+                           MIN(rn) FILTER (
+                               WHERE COALESCE(status, '') NOT IN ('missed', 'cancelled')
+                           ) - 1,
+                           COUNT(*)
+                       ) AS missed_count
+                FROM ranked
+                WHERE rn <= $1
+                GROUP BY user_id
+            ''', max_lookback)
+            
+            # Users without a streak are left out of the result
+            return {row['user_id']: row['missed_count'] for row in rows if row['missed_count'] > 0}
+
     @staticmethod
     async def get_match_stats(user_id: int) -> Dict[str, int]:
         """Get match statistics for a user"""
         pool = await get_pool()
         
         async with pool.acquire() as conn:
-            # Count total matches
-            total = await conn.fetchval('''
-                SELECT COUNT(*) FROM matches
-                WHERE user1_id = $1 OR user2_id = $1
-            ''', user_id)
-            
-            # Count completed matches
-            completed = await conn.fetchval('''
-                SELECT COUNT(*) FROM matches
-                WHERE (user1_id = $1 OR user2_id = $1) AND status = 'completed'
-            ''', user_id)
+            if stats_counters_enabled():
+                stats = await conn.fetchrow('''
+                    SELECT total, completed, missed, pending FROM user_match_stats
+                    WHERE user_id = $1
+                ''', user_id)
+            else:
+                # Count everything in one aggregate
+                stats = await conn.fetchrow(f'''
+                    SELECT COUNT(*) AS total,
+                           COUNT(*) FILTER (WHERE status = 'completed') AS completed,
+                           COUNT(*) FILTER (WHERE status IN ('missed', 'cancelled')) AS missed,
+                           COUNT(*) FILTER (WHERE status = 'pending') AS pending
+                    FROM ({for_participant('status', 'matches')}) AS m
+                ''', user_id)
             
-            # Count missed matches
-            missed = await conn.fetchval('''
-                SELECT COUNT(*) FROM matches
-                WHERE (user1_id = $1 OR user2_id = $1) AND status IN ('missed', 'cancelled')
-            ''', user_id)
-            
-            # Count pending matches
-            pending = await conn.fetchval('''
-                SELECT COUNT(*) FROM matches
-                WHERE (user1_id = $1 OR user2_id = $1) AND status = 'pending'
-            ''', user_id)
+            if not stats:
+                return {"total": 0, "completed": 0, "missed": 0, "pending": 0}
             
-            return {
-                "total": total,
-                "completed": completed,
-                "missed": missed,
-                "pending": pending
-            }
+            return dict(stats)
             
     @staticmethod
-    async def get_matches_by_status(status: str) -> List[Dict[str, Any]]:
+    async def get_matches_by_status(status: str) -> List[Row]:
         """Get all matches with a specific status"""
         pool = await get_pool()
         
@@ -206,4 +448,4 @@ class MatchRepository:
                 SELECT * FROM matches WHERE status = $1
             ''', status)
             
-            return [dict(match) for match in matches]
\ No newline at end of file
+            return matches
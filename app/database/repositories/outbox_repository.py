@@ -0,0 +1,119 @@
+from typing import List, Optional, Dict, Any, Tuple
+from datetime import datetime
+import json
+import asyncpg
+
+from app.database.connection import acquire
+
+
+# (kind, payload, idempotency_key, available_at)
+OutboxEntry = Tuple[str, Dict[str, Any], str, Optional[datetime]]
+
+
+class OutboxRepository:
+    """Repository for the transactional notification outbox"""
+
+    @staticmethod
+    async def enqueue(
+        kind: str,
+        payload: Dict[str, Any],
+        idempotency_key: str,
+        available_at: Optional[datetime] = None,
+        conn: Optional[asyncpg.Connection] = None
+    ) -> Optional[int]:
+        """Queue a notification; returns None if the key was already queued"""
+        async with acquire(conn) as conn:
+            return await conn.fetchval('''
+                INSERT INTO notification_outbox (kind, payload, idempotency_key, available_at)
+                VALUES ($1, $2::jsonb, $3, COALESCE($4, NOW()))
+                ON CONFLICT (idempotency_key) DO NOTHING
+                RETURNING id
+            ''', kind, json.dumps(payload), idempotency_key, available_at)
+
+    @staticmethod
+    async def enqueue_many(entries: List[OutboxEntry], conn: Optional[asyncpg.Connection] = None) -> int:
+        """Queue many notifications with one statement and return how many were new"""
+        if not entries:
+            return 0
+
+        async with acquire(conn) as conn:
+            result = await conn.execute('''
+                INSERT INTO notification_outbox (kind, payload, idempotency_key, available_at)
+                SELECT kind, payload::jsonb, idempotency_key, COALESCE(available_at, NOW())
+                FROM unnest($1::text[], $2::text[], $3::text[], $4::timestamptz[])
+                    AS entries(kind, payload, idempotency_key, available_at)
+                ON CONFLICT (idempotency_key) DO NOTHING
+            ''', [entry[0] for entry in entries], [json.dumps(entry[1]) for entry in entries],
+                [entry[2] for entry in entries], [entry[3] for entry in entries])
+
+            # Status is "INSERT 0 <count>"
+            return int(result.split()[-1])
+
+    @staticmethod
+    async def claim_batch(limit: int, lease_seconds: float) -> List[Dict[str, Any]]:
+        """Claim due notifications for delivery
+
+        Claimed rows are hidden from other workers for the lease time, so a
+        worker that dies mid-delivery only delays them.
+        """
+        async with acquire() as conn:
+            rows = await conn.fetch('''
+                UPDATE notification_outbox
+                SET attempts = attempts + 1,
+                    available_at = NOW() + make_interval(secs => $2)
+                WHERE id IN (
+                    SELECT id FROM notification_outbox
+                    WHERE status = 'pending' AND available_at <= NOW()
+                    ORDER BY available_at
+                    LIMIT $1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, kind, payload, idempotency_key, attempts
+            ''', limit, float(lease_seconds))
+
+            entries = []
+            for row in rows:
+                entry = dict(row)
+                entry['payload'] = json.loads(entry['payload'])
+                entries.append(entry)
+
+            return entries
+
+    @staticmethod
+    async def mark_sent(entry_id: int) -> bool:
+        """Mark a notification as delivered"""
+        async with acquire() as conn:
+            result = await conn.fetchval('''
+                UPDATE notification_outbox
+                SET status = 'sent', sent_at = NOW(), last_error = NULL
+                WHERE id = $1
+                RETURNING id
+            ''', entry_id)
+
+            return result is not None
+
+    @staticmethod
+    async def mark_retry(entry_id: int, error: str, delay_seconds: float) -> bool:
+        """Schedule another delivery attempt after a failure"""
+        async with acquire() as conn:
+            result = await conn.fetchval('''
+                UPDATE notification_outbox
+                SET available_at = NOW() + make_interval(secs => $3), last_error = $2
+                WHERE id = $1
+                RETURNING id
+            ''', entry_id, error, float(delay_seconds))
+
+            return result is not None
+
+    @staticmethod
+    async def mark_failed(entry_id: int, error: str) -> bool:
+        """Give up on a notification"""
+        async with acquire() as conn:
+            result = await conn.fetchval('''
+                UPDATE notification_outbox
+                SET status = 'failed', last_error = $2
+                WHERE id = $1
+                RETURNING id
+            ''', entry_id, error)
+
+            return result is not None
@@ -1,14 +1,47 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator
+import os
 import asyncpg
 from datetime import datetime
 
-from app.database.connection import get_pool
-from app.database.models import User, UserCreate, UserUpdate
+from app.database.cache import TTLCache
+from app.database.connection import Row, get_pool, acquire, stream
+from app.database.models import User, UserCreate, UserUpdate, MatchingUser
 
 
 class UserRepository:
     """Repository for user-related database operations"""
 
+    # Users by ("id", id) and ("telegram_id", telegram_id). The cache is per
+    # process and writes elsewhere don't invalidate it, so reads may lag another
+    # process by up to USER_CACHE_TTL; matching streams users uncached instead
+    _cache = TTLCache(
+        maxsize=int(os.getenv("USER_CACHE_SIZE", "10000")),
+        ttl=float(os.getenv("USER_CACHE_TTL", "5"))
+    )
+
+    @staticmethod
+    def _cache_user(user: Row):
+        """Store a user under both of its keys"""
+        UserRepository._cache.set(("id", user['id']), user)
+        UserRepository._cache.set(("telegram_id", user['telegram_id']), user)
+
+    @staticmethod
+    def _invalidate(row: Optional[asyncpg.Record]):
+        """Drop a changed user from the cache"""
+        if row:
+            UserRepository._cache.pop(("id", row['id']))
+            UserRepository._cache.pop(("telegram_id", row['telegram_id']))
+
+    @staticmethod
+    def clear_cache():
+        """Drop all cached users"""
+        UserRepository._cache.clear()
+
+    @staticmethod
+    def cache_stats() -> Dict[str, int]:
+        """Get the user cache hit, miss and eviction counters"""
+        return UserRepository._cache.stats()
+
     @staticmethod
     async def create_user(user: UserCreate) -> int:
         """Create a new user and return the user ID"""
@@ -33,8 +66,12 @@ class UserRepository:
             return user_id
 
     @staticmethod
-    async def get_user_by_telegram_id(telegram_id: int) -> Optional[Dict[str, Any]]:
+    async def get_user_by_telegram_id(telegram_id: int) -> Optional[Row]:
         """Get a user by Telegram ID"""
+        user = UserRepository._cache.get(("telegram_id", telegram_id))
+        if user is not None:
+            return user
+        
         pool = await get_pool()
         
         async with pool.acquire() as conn:
@@ -42,11 +79,20 @@ class UserRepository:
                 SELECT * FROM users WHERE telegram_id = $1
             ''', telegram_id)
             
-            return dict(user) if user else None
+            if not user:
+                return None
+            
+            # Rows are read-only, so the cached one can be shared
+            UserRepository._cache_user(user)
+            return user
 
     @staticmethod
-    async def get_user_by_id(user_id: int) -> Optional[Dict[str, Any]]:
+    async def get_user_by_id(user_id: int) -> Optional[Row]:
         """Get a user by ID"""
+        user = UserRepository._cache.get(("id", user_id))
+        if user is not None:
+            return user
+        
         pool = await get_pool()
         
         async with pool.acquire() as conn:
@@ -54,7 +100,42 @@ class UserRepository:
                 SELECT * FROM users WHERE id = $1
             ''', user_id)
             
-            return dict(user) if user else None
+            if not user:
+                return None
+            
+            # Rows are read-only, so the cached one can be shared
+            UserRepository._cache_user(user)
+            return user
+
+    @staticmethod
+    async def get_users_by_ids(user_ids: List[int]) -> Dict[int, Row]:
+        """Get several users by ID with one query, keyed by ID"""
+        users = {}
+        missing = []
+        
+        # Serve what we can from the cache
+        for user_id in set(user_ids):
+            user = UserRepository._cache.get(("id", user_id))
+            if user is not None:
+                users[user_id] = user
+            else:
+                missing.append(user_id)
+        
+        if not missing:
+            return users
+        
+        pool = await get_pool()
+        
+        async with pool.acquire() as conn:
+            rows = await conn.fetch('''
+                SELECT * FROM users WHERE id = ANY($1::int[])
+            ''', missing)
+            
+            for user in rows:
+                UserRepository._cache_user(user)
+                users[user['id']] = user
+            
+            return users
 
     @staticmethod
     async def update_user(user_id: int, user_data: UserUpdate) -> bool:
@@ -71,17 +152,18 @@ class UserRepository:
         set_clause += ", updated_at = $1"
         
         # Build the query
-        query = f"UPDATE users SET {set_clause} WHERE telegram_id = ${len(update_data) + 2} RETURNING id"
+        query = f"UPDATE users SET {set_clause} WHERE id = ${len(update_data) + 2} RETURNING id, telegram_id"
         
         # Build the parameters
         params = [datetime.now()] + list(update_data.values()) + [user_id]
         
         async with pool.acquire() as conn:
-            result = await conn.fetchval(query, *params)
+            result = await conn.fetchrow(query, *params)
+            UserRepository._invalidate(result)
             return result is not None
 
     @staticmethod
-    async def get_active_users() -> List[Dict[str, Any]]:
+    async def get_active_users() -> List[Row]:
         """Get all active users"""
         pool = await get_pool()
         
@@ -90,7 +172,38 @@ class UserRepository:
                 SELECT * FROM users WHERE is_active = TRUE
             ''')
             
-            return [dict(user) for user in users]
+            return users
+
+    @staticmethod
+    async def iter_matching_users(batch_size: Optional[int] = None) -> AsyncIterator[MatchingUser]:
+        """Stream active users with only the fields matching reads"""
+        async for user in stream('''
+            SELECT id, location_lat, location_lon, radius, preferred_language, interests
+            FROM users WHERE is_active = TRUE ORDER BY id
+        ''', batch_size=batch_size):
+            yield MatchingUser.from_row(user)
+
+    @staticmethod
+    async def get_active_timezones() -> List[str]:
+        """Get the distinct timezones of active users ('' for users without one)"""
+        pool = await get_pool()
+        
+        async with pool.acquire() as conn:
+            rows = await conn.fetch('''
+                SELECT DISTINCT COALESCE(timezone, '') AS timezone FROM users WHERE is_active = TRUE
+            ''')
+            
+            return [row['timezone'] for row in rows]
+
+    @staticmethod
+    async def get_timezones(user_ids: List[int], conn: Optional[asyncpg.Connection] = None) -> Dict[int, str]:
+        """Get the timezone of each of the given users"""
+        async with acquire(conn) as conn:
+            rows = await conn.fetch('''
+                SELECT id, timezone FROM users WHERE id = ANY($1::int[])
+            ''', user_ids)
+            
+            return {row['id']: row['timezone'] for row in rows}
 
     @staticmethod
     async def get_users_by_criteria(
@@ -99,7 +212,7 @@ class UserRepository:
         radius_km: Optional[int] = None,
         lat: Optional[float] = None,
         lon: Optional[float] = None
-    ) -> List[Dict[str, Any]]:
+    ) -> List[Row]:
         """Get users by various criteria"""
         pool = await get_pool()
         
@@ -140,7 +253,7 @@ class UserRepository:
         
         async with pool.acquire() as conn:
             users = await conn.fetch(query, *params)
-            return [dict(user) for user in users]
+            return users
 
     @staticmethod
     async def deactivate_user(user_id: int) -> bool:
@@ -148,13 +261,30 @@ class UserRepository:
         pool = await get_pool()
         
         async with pool.acquire() as conn:
-            result = await conn.fetchval('''
+            result = await conn.fetchrow('''
                 UPDATE users 
                 SET is_active = FALSE, updated_at = $1
                 WHERE id = $2
-                RETURNING id
+                RETURNING id, telegram_id
             ''', datetime.now(), user_id)
             
+            UserRepository._invalidate(result)
+            return result is not None
+
+    @staticmethod
+    async def mark_unreachable(telegram_id: int) -> bool:
+        """Deactivate a user whose chat can no longer receive messages"""
+        pool = await get_pool()
+        
+        async with pool.acquire() as conn:
+            result = await conn.fetchrow('''
+                UPDATE users 
+                SET is_active = FALSE, unreachable_since = $1, updated_at = $1
+                WHERE telegram_id = $2 AND unreachable_since IS NULL
+                RETURNING id, telegram_id
+            ''', datetime.now(), telegram_id)
+            
+            UserRepository._invalidate(result)
             return result is not None
 
     @staticmethod
@@ -163,11 +293,12 @@ class UserRepository:
         pool = await get_pool()
         
         async with pool.acquire() as conn:
-            result = await conn.fetchval('''
+            result = await conn.fetchrow('''
                 UPDATE users 
-                SET is_active = TRUE, updated_at = $1
+                SET is_active = TRUE, unreachable_since = NULL, updated_at = $1
                 WHERE id = $2
-                RETURNING id
+                RETURNING id, telegram_id
             ''', datetime.now(), user_id)
             
+            UserRepository._invalidate(result)
             return result is not None
\ No newline at end of file
@@ -1,3 +1,4 @@
+from typing import Any, Dict, Optional
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, WebAppInfo
 from aiogram.filters import Command, CommandStart
@@ -11,10 +12,9 @@ from app.database.models import UserCreate, UserUpdate
 router = Router()
 
 @router.message(CommandStart())
-async def cmd_start(message: Message, state: FSMContext):
+async def cmd_start(message: Message, state: FSMContext, user: Optional[Dict[str, Any]]):
     """Handle /start command"""
     # Check if user exists
-    user = await UserRepository.get_user_by_telegram_id(message.from_user.id)
     
     if not user:
         # Create new user with basic info
@@ -50,6 +50,11 @@ async def cmd_start(message: Message, state: FSMContext):
             reply_markup=keyboard
         )
     else:
+        # Users we marked unreachable have unblocked the bot
+        if user.get('unreachable_since'):
+            await UserRepository.activate_user(user['id'])
+            logger.info(f"User {user['id']} is reachable again")
+        
         # Welcome back message
         from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
         
@@ -94,11 +99,8 @@ async def cmd_help(message: Message):
     await message.answer(help_text)
 
 @router.message(Command("profile"))
-async def cmd_profile(message: Message):
+async def cmd_profile(message: Message, user: Optional[Dict[str, Any]]):
     """Handle /profile command"""
-    # Get user profile
-    user = await UserRepository.get_user_by_telegram_id(message.from_user.id)
-    
     if not user:
         # This shouldn't happen, but just in case
         await message.answer(
@@ -169,11 +171,8 @@ async def cmd_profile(message: Message):
     await message.answer(profile_text, reply_markup=keyboard)
 
 @router.message(Command("matches"))
-async def cmd_matches(message: Message):
+async def cmd_matches(message: Message, user: Optional[Dict[str, Any]]):
     """Handle /matches command"""
-    # Get user
-    user = await UserRepository.get_user_by_telegram_id(message.from_user.id)
-    
     if not user:
         await message.answer("⚠️ Your profile was not found. Please use /start to register.")
         return
@@ -189,6 +188,12 @@ async def cmd_matches(message: Message):
         )
         return
     
+    # Get all partners at once
+    other_users = await UserRepository.get_users_by_ids([
+        match['user1_id'] if match['user1_id'] != user['id'] else match['user2_id']
+        for match in matches
+    ])
+    
     # Create inline keyboard
     from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
     webapp_url = os.getenv("WEBAPP_URL")
@@ -197,7 +202,7 @@ async def cmd_matches(message: Message):
     for match in matches:
         # Determine the other user
         other_user_id = match['user1_id'] if match['user1_id'] != user['id'] else match['user2_id']
-        other_user = await UserRepository.get_user_by_id(other_user_id)
+        other_user = other_users.get(other_user_id)
         
         if not other_user:
             continue
@@ -301,11 +306,8 @@ async def cmd_matches(message: Message):
                 await message.answer(message_text)
 
 @router.message(Command("history"))
-async def cmd_history(message: Message):
+async def cmd_history(message: Message, user: Optional[Dict[str, Any]]):
     """Handle /history command"""
-    # Get user
-    user = await UserRepository.get_user_by_telegram_id(message.from_user.id)
-    
     if not user:
         await message.answer("⚠️ Your profile was not found. Please use /start to register.")
         return
@@ -321,13 +323,19 @@ async def cmd_history(message: Message):
         )
         return
     
+    # Get all partners at once
+    other_users = await UserRepository.get_users_by_ids([
+        entry['user1_id'] if entry['user1_id'] != user['id'] else entry['user2_id']
+        for entry in history
+    ])
+    
     # Create message
     history_text = "📚 <b>Your Match History</b>\n\n"
     
     for entry in history:
         # Get the other user
         other_user_id = entry['user1_id'] if entry['user1_id'] != user['id'] else entry['user2_id']
-        other_user = await UserRepository.get_user_by_id(other_user_id)
+        other_user = other_users.get(other_user_id)
         
         if not other_user:
             continue
@@ -342,11 +350,8 @@ async def cmd_history(message: Message):
     await message.answer(history_text)
 
 @router.message(Command("stats"))
-async def cmd_stats(message: Message):
+async def cmd_stats(message: Message, user: Optional[Dict[str, Any]]):
     """Handle /stats command"""
-    # Get user
-    user = await UserRepository.get_user_by_telegram_id(message.from_user.id)
-    
     if not user:
         await message.answer("⚠️ Your profile was not found. Please use /start to register.")
         return
@@ -372,11 +377,8 @@ async def cmd_stats(message: Message):
     await message.answer(stats_text)
 
 @router.message(Command("settings"))
-async def cmd_settings(message: Message):
+async def cmd_settings(message: Message, user: Optional[Dict[str, Any]]):
     """Handle /settings command"""
-    # Get user
-    user = await UserRepository.get_user_by_telegram_id(message.from_user.id)
-    
     if not user:
         await message.answer("⚠️ Your profile was not found. Please use /start to register.")
         return
@@ -1,12 +1,13 @@
+from typing import Any, Dict, Optional
 from aiogram import Router, F, Bot
 from aiogram.types import CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from loguru import logger
 
-from app.database.repositories import UserRepository, MatchRepository
-from app.database.models import MatchUpdate, MatchHistoryCreate
-from app.services.notification import NotificationService
+from app.database.repositories import UserRepository, MatchRepository, user_loader, match_loader
+from app.database.models import MatchUpdate
+from app.services.outbox import OutboxService
 
 router = Router()
 
@@ -14,37 +15,30 @@ class FeedbackStates(StatesGroup):
     waiting_for_match_feedback = State()
 
 @router.callback_query(F.data.startswith("match_accept_"))
-async def on_match_accept(callback: CallbackQuery, bot: Bot):
+async def on_match_accept(callback: CallbackQuery, bot: Bot, user: Optional[Dict[str, Any]]):
     """Handle match acceptance"""
     # Extract match ID from callback data
     match_id = int(callback.data.split("_")[-1])
     
     # Get match details
-    match = await MatchRepository.get_match_by_id(match_id)
+    match = await match_loader.load(match_id)
     if not match:
         await callback.answer("Match not found", show_alert=True)
         return
     
-    # Get user
-    user = await UserRepository.get_user_by_telegram_id(callback.from_user.id)
     if not user:
         await callback.answer("User not found", show_alert=True)
         return
     
-    # Update match status
-    match_update = MatchUpdate(status="accepted")
-    success = await MatchRepository.update_match(match_id, match_update)
+    # Update match status and queue the notification to the other user
+    success = await OutboxService.update_match_status(match_id, "accepted", user['id'])
     
     if success:
-        # Send notification to the other user
-        notification_service = NotificationService(bot)
-        await notification_service.notify_match_status(match_id, "accepted", user['id'])
-        
         await callback.answer("Match accepted! You can now contact the other person.", show_alert=True)
         
         # Update the message
         other_user_id = match['user1_id'] if match['user1_id'] != user['id'] else match['user2_id']
-        other_user = await UserRepository.get_user_by_id(other_user_id)
+        other_user = await user_loader.load(other_user_id)
         
         from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
         
@@ -77,32 +71,25 @@ async def on_match_accept(callback: CallbackQuery, bot: Bot):
         await callback.answer("Failed to accept match. Please try again.", show_alert=True)
 
 @router.callback_query(F.data.startswith("match_decline_"))
-async def on_match_decline(callback: CallbackQuery, bot: Bot):
+async def on_match_decline(callback: CallbackQuery, bot: Bot, user: Optional[Dict[str, Any]]):
     """Handle match decline"""
     # Extract match ID from callback data
     match_id = int(callback.data.split("_")[-1])
     
     # Get match details
-    match = await MatchRepository.get_match_by_id(match_id)
+    match = await match_loader.load(match_id)
     if not match:
         await callback.answer("Match not found", show_alert=True)
         return
     
-    # Get user
-    user = await UserRepository.get_user_by_telegram_id(callback.from_user.id)
     if not user:
         await callback.answer("User not found", show_alert=True)
         return
     
-    # Update match status
-    match_update = MatchUpdate(status="declined")
-    success = await MatchRepository.update_match(match_id, match_update)
+    # Update match status and queue the notification to the other user
+    success = await OutboxService.update_match_status(match_id, "declined", user['id'])
     
     if success:
-        # Send notification to the other user
-        notification_service = NotificationService(bot)
-        await notification_service.notify_match_status(match_id, "declined", user['id'])
-        
         await callback.answer("Match declined.", show_alert=True)
         
         # Update the message
@@ -116,41 +103,25 @@ async def on_match_decline(callback: CallbackQuery, bot: Bot):
         await callback.answer("Failed to decline match. Please try again.", show_alert=True)
 
 @router.callback_query(F.data.startswith("match_complete_"))
-async def on_match_complete(callback: CallbackQuery, bot: Bot):
+async def on_match_complete(callback: CallbackQuery, bot: Bot, user: Optional[Dict[str, Any]]):
     """Handle match completion"""
     # Extract match ID from callback data
     match_id = int(callback.data.split("_")[-1])
     
     # Get match details
-    match = await MatchRepository.get_match_by_id(match_id)
+    match = await match_loader.load(match_id)
     if not match:
         await callback.answer("Match not found", show_alert=True)
         return
     
-    # Get user
-    user = await UserRepository.get_user_by_telegram_id(callback.from_user.id)
     if not user:
         await callback.answer("User not found", show_alert=True)
         return
     
-    # Update match status
-    match_update = MatchUpdate(status="completed")
-    success = await MatchRepository.update_match(match_id, match_update)
+    # Update match status, add it to the history and queue the notification to both users
+    success = await OutboxService.update_match_status(match_id, "completed")
     
     if success:
-        # Add to match history
-        history_entry = MatchHistoryCreate(
-            user1_id=match['user1_id'],
-            user2_id=match['user2_id'],
-            status="completed"
-        )
-        
-        await MatchRepository.add_to_history(history_entry)
-        
-        # Send notification to both users
-        notification_service = NotificationService(bot)
-        await notification_service.notify_match_status(match_id, "completed")
-        
         await callback.answer("Match marked as completed!", show_alert=True)
         
         # Update the message
@@ -196,7 +167,7 @@ async def on_feedback_request(callback: CallbackQuery, state: FSMContext):
     )
 
 @router.message(FeedbackStates.waiting_for_match_feedback)
-async def process_match_feedback(message, state: FSMContext):
+async def process_match_feedback(message, state: FSMContext, user: Optional[Dict[str, Any]]):
     """Process match feedback"""
     # Get data from state
     data = await state.get_data()
@@ -208,14 +179,12 @@ async def process_match_feedback(message, state: FSMContext):
         return
     
     # Get match details
-    match = await MatchRepository.get_match_by_id(match_id)
+    match = await match_loader.load(match_id)
     if not match:
         await message.answer("Match not found. Please try again.")
         await state.clear()
         return
     
-    # Get user
-    user = await UserRepository.get_user_by_telegram_id(message.from_user.id)
     if not user:
         await message.answer("User not found. Please try again.")
         await state.clear()
@@ -241,13 +210,11 @@ async def process_match_feedback(message, state: FSMContext):
     await state.clear()
 
 @router.callback_query(F.data.startswith("settings_status_"))
-async def on_status_toggle(callback: CallbackQuery):
+async def on_status_toggle(callback: CallbackQuery, user: Optional[Dict[str, Any]]):
     """Handle status toggle"""
     # Extract action from callback data
     action = callback.data.split("_")[-1]
     
-    # Get user
-    user = await UserRepository.get_user_by_telegram_id(callback.from_user.id)
     if not user:
         await callback.answer("User not found", show_alert=True)
         return
@@ -1,23 +1,22 @@
+from typing import Any, Dict, Optional
 from aiogram import Router, F, Bot
 from aiogram.types import Message, WebAppInfo, WebAppData
 from loguru import logger
 import json
 
-from app.database.repositories import UserRepository, MatchRepository
+from app.database.repositories import UserRepository, MatchRepository, user_loader, match_loader
 from app.database.models import UserUpdate, MatchUpdate
 
 router = Router()
 
 @router.message(F.web_app_data)
-async def process_webapp_data(message: Message, bot: Bot):
+async def process_webapp_data(message: Message, bot: Bot, user: Optional[Dict[str, Any]]):
     """Process data received from the web app"""
     try:
         # Get the data from the web app
         web_app_data = message.web_app_data
         data = json.loads(web_app_data.data)
         
-        # Get user
-        user = await UserRepository.get_user_by_telegram_id(message.from_user.id)
         if not user:
             await message.answer("⚠️ Your profile was not found. Please use /start to register.")
             return
@@ -66,7 +65,7 @@ async def process_webapp_data(message: Message, bot: Bot):
             
             if match_id and feedback_text:
                 # Get match
-                match = await MatchRepository.get_match_by_id(match_id)
+                match = await match_loader.load(match_id)
                 if not match:
                     await message.answer("Match not found.")
                     return
@@ -99,23 +98,18 @@ async def process_webapp_data(message: Message, bot: Bot):
             
             if match_id and action_type:
                 # Get match
-                match = await MatchRepository.get_match_by_id(match_id)
+                match = await match_loader.load(match_id)
                 if not match:
                     await message.answer("Match not found.")
                     return
                 
                 # Process action
                 if action_type == 'accept':
-                    # Update match status to accepted
-                    match_update = MatchUpdate(status="accepted")
-                    success = await MatchRepository.update_match(match_id, match_update)
+                    # Update match status to accepted and queue the notification to the other user
+                    from app.services.outbox import OutboxService
+                    success = await OutboxService.update_match_status(match_id, "accepted", user['id'])
                     
                     if success:
-                        # Send notification to the other user
-                        from app.services.notification import NotificationService
-                        notification_service = NotificationService(bot)
-                        await notification_service.notify_match_status(match_id, "accepted", user['id'])
-                        
                         await message.answer(
                             "✅ You've accepted the match! You can now contact the other person."
                         )
@@ -125,16 +119,11 @@ async def process_webapp_data(message: Message, bot: Bot):
                         )
                 
                 elif action_type == 'decline':
-                    # Update match status to declined
-                    match_update = MatchUpdate(status="declined")
-                    success = await MatchRepository.update_match(match_id, match_update)
+                    # Update match status to declined and queue the notification to the other user
+                    from app.services.outbox import OutboxService
+                    success = await OutboxService.update_match_status(match_id, "declined", user['id'])
                     
                     if success:
-                        # Send notification to the other user
-                        from app.services.notification import NotificationService
-                        notification_service = NotificationService(bot)
-                        await notification_service.notify_match_status(match_id, "declined", user['id'])
-                        
                         await message.answer(
                             "✅ You've declined the match. We'll find you a new match soon!"
                         )
@@ -144,27 +133,11 @@ async def process_webapp_data(message: Message, bot: Bot):
                         )
                 
                 elif action_type == 'complete':
-                    # Update match status to completed
-                    match_update = MatchUpdate(status="completed")
-                    success = await MatchRepository.update_match(match_id, match_update)
+                    # Update match status to completed, add it to the history and queue the notification
+                    from app.services.outbox import OutboxService
+                    success = await OutboxService.update_match_status(match_id, "completed")
                     
                     if success:
-                        # Add to match history
-                        from app.database.models import MatchHistoryCreate
-                        
-                        history_entry = MatchHistoryCreate(
-                            user1_id=match['user1_id'],
-                            user2_id=match['user2_id'],
-                            status="completed"
-                        )
-                        
-                        await MatchRepository.add_to_history(history_entry)
-                        
-                        # Send notification to both users
-                        from app.services.notification import NotificationService
-                        notification_service = NotificationService(bot)
-                        await notification_service.notify_match_status(match_id, "completed")
-                        
                         await message.answer(
                             "✅ You've marked this match as completed. Thank you for participating!"
                         )
@@ -1,7 +1,9 @@
 # middlewares package
 from aiogram import Dispatcher
 from app.middlewares.logging import LoggingMiddleware
+from app.middlewares.user import UserMiddleware
 
 def setup_middlewares(dp: Dispatcher):
     """Setup middlewares for the dispatcher"""
-    dp.update.middleware(LoggingMiddleware())
\ No newline at end of file
+    dp.update.middleware(LoggingMiddleware())
+    dp.update.middleware(UserMiddleware())
\ No newline at end of file
@@ -0,0 +1,29 @@
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User
+
+from app.database.repositories import UserRepository
+
+
+class UserMiddleware(BaseMiddleware):
+    """Middleware that loads the sender's user row once per update
+
+    The row (or None for unregistered users) is passed to handlers as `user`.
+    Lookups go through the UserRepository cache.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        """Inject the user into handler data"""
+        from_user = data.get('event_from_user')
+
+        if from_user and isinstance(from_user, User):
+            data['user'] = await UserRepository.get_user_by_telegram_id(from_user.id)
+        else:
+            data['user'] = None
+
+        return await handler(event, data)
@@ -1,6 +1,5 @@
-import asyncio
 import os
-from datetime import datetime, time
+from datetime import datetime, time, timedelta
 import pytz
 from loguru import logger
 
@@ -10,6 +9,8 @@ from apscheduler.triggers.cron import CronTrigger
 
 from app.services.matching import MatchingService
 from app.services.notification import NotificationService
+from app.services.dispatcher import NotificationDispatcher
+from app.services.timezones import due_timezones
 
 
 class Scheduler:
@@ -18,7 +19,10 @@ class Scheduler:
     def __init__(self, bot: Bot):
         self.bot = bot
         self.scheduler = AsyncIOScheduler()
-        self.notification_service = NotificationService(bot)
+        self.dispatcher = NotificationDispatcher(bot)
+        self.notification_service = NotificationService(bot, self.dispatcher)
+        self.match_day = os.getenv("MATCH_DAY", "Monday")
+        self.notification_hour = int(os.getenv("NOTIFICATION_HOUR", "9"))
     
     def start(self):
         """Start the scheduler"""
@@ -33,19 +37,28 @@ class Scheduler:
             replace_existing=True
         )
         
-        # Schedule notification for upcoming matches
-        notification_hour = int(os.getenv("NOTIFICATION_HOUR", "9"))
-        
+        # Check hourly which timezones have reached the reminder hour on the match day
         self.scheduler.add_job(
             self.send_match_reminders,
-            trigger=CronTrigger(day_of_week=match_day.lower()[:3], hour=notification_hour),
+            trigger=CronTrigger(minute=0),
             id="match_reminders",
             replace_existing=True
         )
         
+        # Keep partitions ahead of time and archive old ones once a day
+        self.scheduler.add_job(
+            self.maintain_partitions,
+            trigger=CronTrigger(hour=3),
+            id="partition_maintenance",
+            replace_existing=True
+        )
+        
         # Start the scheduler
         self.scheduler.start()
-        logger.info(f"Scheduler started. Matching process scheduled for {match_day} at {match_hour}:00")
+        logger.info(
+            f"Scheduler started. Matching process scheduled for {match_day} at {match_hour}:00, "
+            f"reminders at {self.notification_hour}:00 local time"
+        )
     
     def shutdown(self):
         """Shutdown the scheduler"""
@@ -64,58 +77,53 @@ class Scheduler:
                 logger.info("No matches created")
                 return
             
-            # Save matches to database
+            # Save matches to database; the announcements are queued in the outbox
             match_ids = await MatchingService.save_matches(matches)
             
-            # Send notifications
-            for match_id in match_ids:
-                await self.notification_service.notify_match(match_id)
-                # Add a small delay to avoid flooding Telegram API
-                await asyncio.sleep(0.5)
-            
             logger.info(f"Matching process completed. Created {len(match_ids)} matches.")
         
         except Exception as e:
             logger.error(f"Error in matching process: {e}")
     
     async def send_match_reminders(self):
-        """Send reminders for pending matches"""
-        logger.info("Sending match reminders")
-        
+        """Send reminders for pending matches to users whose local reminder hour has come"""
         try:
-            # Get all pending matches
-            from app.database.repositories import MatchRepository
+            from app.database.repositories import UserRepository, MatchRepository
             
-            # Get all matches with status "pending"
-            matches = await MatchRepository.get_matches_by_status("pending")
+            # Only the UTC offset buckets currently at the reminder hour on the match day
+            timezones = await UserRepository.get_active_timezones()
+            due = due_timezones(timezones, self.notification_hour, self.match_day)
             
-            if not matches:
-                logger.info("No pending matches to remind")
+            if not due:
                 return
             
-            # Send reminders
-            for match in matches:
-                await self.notification_service.send_reminder(match['id'])
-                # Add a small delay to avoid flooding Telegram API
-                await asyncio.sleep(0.5)
+            logger.info(f"Sending match reminders for timezones: {', '.join(name or 'default' for name in due)}")
             
-            logger.info(f"Sent reminders for {len(matches)} pending matches")
+            # West of the matching hour the reminder hour comes after today's round;
+            # only remind about matches from earlier rounds, not ones made minutes ago
+            created_before = datetime.now(pytz.utc) - timedelta(days=1)
+            
+            # Stream pending matches joined to both participants straight into the sender
+            sent = await self.dispatcher.run(
+                self.notification_service.send_reminder_row,
+                MatchRepository.iter_pending_reminders(timezones=due, created_before=created_before)
+            )
+            
+            logger.info(f"Sent {sent} reminders for pending matches")
         
         except Exception as e:
             logger.error(f"Error sending match reminders: {e}")
-
-
-# Add this method to MatchRepository
-async def get_matches_by_status(status: str):
-    """Get all matches with a specific status"""
-    pool = await get_pool()
     
-    async with pool.acquire() as conn:
-        matches = await conn.fetch('''
-            SELECT * FROM matches WHERE status = $1
-        ''', status)
+    async def maintain_partitions(self):
+        """Create upcoming partitions and archive expired ones"""
+        try:
+            from app.database.partitions import ensure_partitions, archive_partitions
+            
+            await ensure_partitions()
+            archived = await archive_partitions()
+            
+            if archived:
+                logger.info(f"Archived {len(archived)} old partitions")
         
-        return [dict(match) for match in matches]
-
-# Import these at the top of the file
-from app.database.connection import get_pool
\ No newline at end of file
+        except Exception as e:
+            logger.error(f"Error maintaining partitions: {e}")
@@ -0,0 +1,161 @@
+import asyncio
+import os
+from time import monotonic
+from typing import Any, AsyncIterable, Awaitable, Callable, Dict, Iterable, Optional, Union
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from loguru import logger
+
+
+# Bad request descriptions that mean the chat is gone rather than the message being wrong
+UNREACHABLE_DESCRIPTIONS = ("chat not found", "user is deactivated", "bot was blocked", "peer_id_invalid")
+
+
+def is_unreachable_error(error: Exception) -> bool:
+    """Check whether a send error means the chat can no longer receive messages"""
+    if isinstance(error, TelegramForbiddenError):
+        return True
+
+    if isinstance(error, TelegramBadRequest):
+        description = str(error).lower()
+        return any(text in description for text in UNREACHABLE_DESCRIPTIONS)
+
+    return False
+
+
+class NotificationDispatcher:
+    """Rate-limited, concurrent sender for Telegram messages
+
+    Combines a global token bucket, a minimum interval between messages to the
+    same chat and a bounded number of in-flight requests. Flood control errors
+    pause all senders for the requested time and lower the rate, which then
+    creeps back up with every successful send.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        rate: Optional[float] = None,
+        chat_interval: Optional[float] = None,
+        concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None
+    ):
+        self.bot = bot
+        self.max_rate = rate or float(os.getenv("NOTIFICATION_RATE_LIMIT", "28"))
+        self.chat_interval = chat_interval if chat_interval is not None else float(os.getenv("NOTIFICATION_CHAT_INTERVAL", "1.0"))
+        self.concurrency = concurrency or int(os.getenv("NOTIFICATION_CONCURRENCY", "20"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("NOTIFICATION_MAX_RETRIES", "5"))
+
+        self.rate = self.max_rate
+        self._tokens = self.max_rate
+        self._updated = monotonic()
+        self._paused_until = 0.0
+        self._chat_next: Dict[int, float] = {}
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def _acquire_token(self):
+        """Wait for a slot in the global token bucket"""
+        while True:
+            now = monotonic()
+
+            if now < self._paused_until:
+                wait = self._paused_until - now
+            else:
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self.rate
+
+            await asyncio.sleep(wait)
+
+    async def _wait_for_chat(self, chat_id: int):
+        """Keep messages to the same chat at least chat_interval apart"""
+        now = monotonic()
+        slot = max(now, self._chat_next.get(chat_id, 0.0))
+        self._chat_next[chat_id] = slot + self.chat_interval
+
+        # Forget chats whose spacing has expired so the map stays small
+        if len(self._chat_next) > 10000:
+            self._chat_next = {chat: until for chat, until in self._chat_next.items() if until > now}
+
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> Any:
+        """Send a message within the rate limits, retrying on flood control"""
+        async with self._semaphore:
+            attempt = 0
+
+            while True:
+                await self._wait_for_chat(chat_id)
+                await self._acquire_token()
+
+                try:
+                    result = await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                except TelegramRetryAfter as e:
+                    attempt += 1
+                    if attempt > self.max_retries:
+                        raise
+
+                    # Pause every sender and back off multiplicatively
+                    self._paused_until = max(self._paused_until, monotonic() + e.retry_after)
+                    self.rate = max(1.0, self.rate * 0.8)
+                    logger.warning(
+                        f"Flood control for chat {chat_id}, retrying in {e.retry_after}s "
+                        f"at {self.rate:.1f} msg/s"
+                    )
+                    continue
+
+                # Recover the rate slowly after successful sends
+                self.rate = min(self.max_rate, self.rate + 0.05)
+                return result
+
+    async def run(
+        self,
+        func: Callable[[Any], Awaitable[Any]],
+        items: Union[Iterable[Any], AsyncIterable[Any]]
+    ) -> int:
+        """Call func for every item with a bounded number of concurrent workers
+
+        Items may be a regular or an async iterable; they are pulled lazily so
+        a streaming source is never fully loaded. Returns how many calls
+        returned a truthy result.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        succeeded = 0
+
+        async def produce():
+            if hasattr(items, "__aiter__"):
+                async for item in items:
+                    await queue.put(item)
+            else:
+                for item in items:
+                    await queue.put(item)
+
+        async def work():
+            nonlocal succeeded
+            while True:
+                item = await queue.get()
+                try:
+                    if await func(item):
+                        succeeded += 1
+                except Exception as e:
+                    logger.error(f"Error dispatching notification: {e}")
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.create_task(work()) for _ in range(self.concurrency)]
+        try:
+            await produce()
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        return succeeded
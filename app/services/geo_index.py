@@ -0,0 +1,140 @@
+from math import asin, cos, floor, pi, radians, sin
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE = EARTH_RADIUS_KM * pi / 180
+
+# Smallest cell edge so that tiny radii don't explode the number of cells
+MIN_CELL_KM = 1.0
+
+
+def has_location(user: Dict[str, Any]) -> bool:
+    """Check whether a user has a usable location"""
+    return bool(user['location_lat'] and user['location_lon'])
+
+
+class GeoGridIndex:
+    """Lat/lon grid over the users of a matching round"""
+
+    def __init__(self, users: Sequence[Dict[str, Any]], cell_km: Optional[float] = None):
+        self.users = users
+        self._positions: Dict[int, int] = {}
+        self._rows: Dict[int, Dict[int, List[int]]] = {}
+        self._unlocated: List[int] = []
+
+        # Size cells from the largest radius so most lookups only touch neighbouring cells
+        if cell_km is None:
+            radii = [user['radius'] or 0 for user in users if has_location(user)]
+            cell_km = max(radii, default=0)
+
+        self.cell_km = max(float(cell_km), MIN_CELL_KM)
+        self._step = self.cell_km / KM_PER_DEGREE
+
+        # Columns evenly divide the full circle so they wrap around the antimeridian
+        self._columns = max(1, int(360 // self._step))
+        self._lon_step = 360 / self._columns
+
+        for position, user in enumerate(users):
+            self._positions[user['id']] = position
+
+            if not has_location(user):
+                self._unlocated.append(position)
+                continue
+
+            row, column = self._cell(user['location_lat'], user['location_lon'])
+            self._rows.setdefault(row, {}).setdefault(column, []).append(position)
+
+    def _cell(self, lat: float, lon: float):
+        """Get the grid cell for a point"""
+        row = floor((lat + 90) / self._step)
+        column = floor((lon + 180) / self._lon_step) % self._columns
+        return row, column
+
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Get a user of the round by ID"""
+        position = self._positions.get(user_id)
+        return self.users[position] if position is not None else None
+
+    def nearby_positions(self, user: Dict[str, Any]) -> List[int]:
+        """Get positions of users that may be within the user's radius, in round order
+
+        Users without a location are always included, just like a full scan
+        would include them. Exact distances still have to be checked by the caller.
+        """
+        if not has_location(user):
+            return list(range(len(self.users)))
+
+        positions = self._nearby_positions(
+            user['location_lat'], user['location_lon'], user['radius'] or 0
+        )
+        positions.extend(self._unlocated)
+        positions.sort()
+
+        return positions
+
+    def nearby(self, user: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Get users that may be within the user's radius, in round order"""
+        return [self.users[position] for position in self.nearby_positions(user)]
+
+    def cell_neighbourhoods(self) -> Iterator[Tuple[List[int], List[int]]]:
+        """Yield the located users of each cell with every user that may be within their radii
+
+        The neighbourhood covers the largest radius in the cell from anywhere
+        inside it, so it is a superset for each of the cell's users. Users
+        without a location are always included, in round order.
+        """
+        # Farthest a point in a cell can be from its centre, measured along a meridian and a parallel
+        margin = (self._step + self._lon_step) / 2 * KM_PER_DEGREE
+
+        for row, cells in self._rows.items():
+            lat = min(max((row + 0.5) * self._step - 90, -90), 90)
+
+            for column, positions in cells.items():
+                lon = (column + 0.5) * self._lon_step - 180
+                reach = max(self.users[position]['radius'] or 0 for position in positions) + margin
+
+                neighbourhood = self._nearby_positions(lat, lon, reach)
+                neighbourhood.extend(self._unlocated)
+                neighbourhood.sort()
+
+                yield positions, neighbourhood
+
+    def _nearby_positions(self, lat: float, lon: float, radius_km: float) -> List[int]:
+        """Get positions of located users in the cells covering a circle"""
+        # Angular radius of the search circle
+        delta = min(radius_km / EARTH_RADIUS_KM + 1e-9, pi)
+        delta_lat = delta * 180 / pi
+
+        first_row = floor((max(lat - delta_lat, -90) + 90) / self._step)
+        last_row = floor((min(lat + delta_lat, 90) + 90) / self._step)
+
+        # Longitude half-width of the circle; it spans every meridian near the poles
+        polar_cos = cos(radians(lat))
+        if lat + delta_lat >= 90 or lat - delta_lat <= -90 or sin(delta) >= polar_cos:
+            columns = None
+        else:
+            delta_lon = asin(sin(delta) / polar_cos) * 180 / pi
+            first_column = floor((lon - delta_lon + 180) / self._lon_step)
+            last_column = floor((lon + delta_lon + 180) / self._lon_step)
+
+            if last_column - first_column + 1 >= self._columns:
+                columns = None
+            else:
+                columns = {column % self._columns for column in range(first_column, last_column + 1)}
+
+        positions = []
+        for row in range(first_row, last_row + 1):
+            cells = self._rows.get(row)
+            if not cells:
+                continue
+
+            if columns is None:
+                for cell in cells.values():
+                    positions.extend(cell)
+            else:
+                for column in columns:
+                    cell = cells.get(column)
+                    if cell:
+                        positions.extend(cell)
+
+        return positions
@@ -0,0 +1,79 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+
+class InterestIndex:
+    """Interest vocabulary, bitmasks and posting lists for the users of a matching round"""
+
+    def __init__(self, users: Sequence[Dict[str, Any]]):
+        self.users = users
+        self.vocabulary: Dict[str, int] = {}
+        self.masks: List[int] = []
+        self._positions: Dict[int, int] = {}
+        self._postings: List[List[int]] = []
+
+        for position, user in enumerate(users):
+            self._positions[user['id']] = position
+
+            mask = 0
+            for interest in user['interests'] or []:
+                interest_id = self.vocabulary.get(interest)
+                if interest_id is None:
+                    interest_id = self.vocabulary[interest] = len(self.vocabulary)
+                    self._postings.append([])
+
+                # Duplicated interests must not add the user to a posting list twice
+                if not mask >> interest_id & 1:
+                    self._postings[interest_id].append(position)
+                    mask |= 1 << interest_id
+
+            self.masks.append(mask)
+
+    def encode(self, interests: Iterable[str]) -> int:
+        """Encode interests as a bitmask, ignoring ones outside the vocabulary"""
+        mask = 0
+        for interest in interests or []:
+            interest_id = self.vocabulary.get(interest)
+            if interest_id is not None:
+                mask |= 1 << interest_id
+        return mask
+
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Get a user of the round by ID"""
+        position = self._positions.get(user_id)
+        return self.users[position] if position is not None else None
+
+    def mask(self, user: Dict[str, Any]) -> int:
+        """Get the interest bitmask of a user"""
+        position = self._positions.get(user['id'])
+        if position is None:
+            return self.encode(user['interests'])
+        return self.masks[position]
+
+    def overlaps(self, user: Dict[str, Any], candidate: Dict[str, Any]) -> bool:
+        """Check whether two users have at least one interest in common"""
+        return (self.mask(user) & self.mask(candidate)) != 0
+
+    def _union(self, mask: int) -> List[int]:
+        """Get sorted positions of users sharing any interest from a bitmask"""
+        positions = set()
+
+        # Walk the set bits from the lowest one up
+        while mask:
+            lowest = mask & -mask
+            positions.update(self._postings[lowest.bit_length() - 1])
+            mask ^= lowest
+
+        return sorted(positions)
+
+    def candidate_positions(self, user: Dict[str, Any]) -> List[int]:
+        """Get positions of users sharing at least one interest with the user, in round order"""
+        return self._union(self.mask(user))
+
+    def candidates(self, user: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Get users sharing at least one interest with the user, in round order"""
+        return [self.users[position] for position in self.candidate_positions(user)]
+
+    def users_with_any(self, interests: List[str]) -> List[Dict[str, Any]]:
+        """Get users with any of the given interests, like the interests filter of
+        UserRepository.get_users_by_criteria but without a database round trip"""
+        return [self.users[position] for position in self._union(self.encode(interests))]
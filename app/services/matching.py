@@ -1,41 +1,39 @@
 import asyncio
 import random
-from typing import List, Dict, Any, Tuple, Set
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from math import floor
+from typing import List, Dict, Any, Tuple, Set, Optional, AbstractSet
 from datetime import datetime
 import pytz
 from loguru import logger
 
 from app.database.repositories import UserRepository, MatchRepository
-from app.database.models import MatchCreate
-
-
-async def select_candidate(available_candidates):
-    # Получаем список предыдущих матчей для каждого кандидата
-    matches_list = await asyncio.gather(
-        *[MatchRepository.get_previous_matches(candidate['id']) for candidate in available_candidates]
-    )
-    # Сопоставляем кандидатов с количеством их предыдущих матчей
-    candidate_with_counts = zip(available_candidates, matches_list)
-    # Выбираем кандидата с минимальным количеством предыдущих матчей
-    candidate = min(candidate_with_counts, key=lambda item: len(item[1]))[0]
-    return candidate
+from app.database.connection import transaction
+from app.database.repositories import OutboxRepository
+from app.database.models import MatchCreate, MatchingUser
+from app.services.pair_history import PairHistory
+from app.services.geo_index import GeoGridIndex, has_location
+from app.services.interest_index import InterestIndex
+from app.services.matching_kernel import CandidateKernel, numpy_available
+from app.services.pairing import UNMATCHED, maximum_matching
+from app.services.outbox import OutboxService
+from app.services.timezones import announcement_time
 
 
 class MatchingService:
     """Service for matching users for coffee meetings"""
     
     @staticmethod
-    async def get_active_users_for_matching() -> List[Dict[str, Any]]:
+    async def get_active_users_for_matching() -> List[MatchingUser]:
         """Get all active users eligible for matching"""
-        # Get all active users
-        users = await UserRepository.get_active_users()
-        
         # Filter out users who have missed too many matches in a row
         max_missed = int(os.getenv("MAX_MISSED_MATCHES", "3"))
+        missed_streaks = await MatchRepository.get_missed_streaks()
         eligible_users = []
         
-        for user in users:
-            missed_count = await MatchRepository.count_missed_matches(user['id'])
+        # Stream lean snapshots so only the eligible users' matching fields are kept in memory
+        async for user in UserRepository.iter_matching_users():
+            missed_count = missed_streaks.get(user['id'], 0)
             if missed_count < max_missed:
                 eligible_users.append(user)
             else:
@@ -44,19 +42,65 @@ class MatchingService:
         return eligible_users
     
     @staticmethod
-    async def get_available_candidates(user_id: int, all_users: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Get all available candidates for a user"""
+    async def get_available_candidates(
+        user_id: int,
+        all_users: List[Dict[str, Any]],
+        history: Optional[PairHistory] = None,
+        geo_index: Optional[GeoGridIndex] = None,
+        interest_index: Optional[InterestIndex] = None
+    ) -> List[Dict[str, Any]]:
+        """Get all available candidates for a user
+        
+        Indexes must be built over the same all_users list.
+        """
         # Get the user
-        user = next((u for u in all_users if u['id'] == user_id), None)
+        if geo_index is not None:
+            user = geo_index.get(user_id)
+        elif interest_index is not None:
+            user = interest_index.get(user_id)
+        else:
+            user = next((u for u in all_users if u['id'] == user_id), None)
         if not user:
             return []
         
         # Get previously matched users
-        previous_matches = await MatchRepository.get_previous_matches(user_id)
+        if history is not None:
+            previous_matches = history.partners(user_id)
+        else:
+            previous_matches = set(await MatchRepository.get_previous_matches(user_id))
+        
+        return MatchingService.filter_candidates(
+            user, all_users, previous_matches,
+            geo_index=geo_index, interest_index=interest_index
+        )
+    
+    @staticmethod
+    def filter_candidates(
+        user: Dict[str, Any],
+        all_users: List[Dict[str, Any]],
+        previous_matches: AbstractSet[int],
+        geo_index: Optional[GeoGridIndex] = None,
+        interest_index: Optional[InterestIndex] = None
+    ) -> List[Dict[str, Any]]:
+        """Filter the users of a round down to the candidates for one user"""
+        user_id = user['id']
+        
+        # Narrow the scan down to neighbouring grid cells and shared interest postings
+        positions = None
+        if geo_index is not None:
+            positions = geo_index.nearby_positions(user)
+        if interest_index is not None:
+            interest_positions = interest_index.candidate_positions(user)
+            if positions is None:
+                positions = interest_positions
+            else:
+                positions = sorted(set(positions).intersection(interest_positions))
+        
+        pool = all_users if positions is None else [all_users[p] for p in positions]
         
         # Filter candidates
         candidates = []
-        for candidate in all_users:
+        for candidate in pool:
             # Skip self
             if candidate['id'] == user_id:
                 continue
@@ -83,16 +127,53 @@ class MatchingService:
                 continue
             
             # Check for common interests
-            user_interests = set(user['interests'])
-            candidate_interests = set(candidate['interests'])
-            
-            if not user_interests.intersection(candidate_interests):
-                continue
+            if interest_index is not None:
+                if not interest_index.overlaps(user, candidate):
+                    continue
+            else:
+                user_interests = set(user['interests'])
+                candidate_interests = set(candidate['interests'])
+                
+                if not user_interests.intersection(candidate_interests):
+                    continue
             
             candidates.append(candidate)
         
         return candidates
     
+    @staticmethod
+    def get_vectorized_candidates(
+        users: List[Dict[str, Any]],
+        history: PairHistory
+    ) -> List[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+        """Get available candidates for every user using the NumPy kernel over the geo grid"""
+        kernel = CandidateKernel(users, interest_index=InterestIndex(users))
+        users_with_candidates = [None] * len(users)
+        
+        # The grid yields users cell by cell; keep the result in round order
+        for position, candidate_positions in kernel.iter_candidates(GeoGridIndex(users)):
+            user = users[position]
+            previous_matches = history.partners(user['id'])
+            
+            candidates = [users[p] for p in candidate_positions if users[p]['id'] not in previous_matches]
+            users_with_candidates[position] = (user, candidates)
+        
+        return users_with_candidates
+    
+    @staticmethod
+    def get_matching_backend() -> str:
+        """Get the candidate generation backend to use ("numpy" or "python")"""
+        backend = os.getenv("MATCHING_BACKEND", "auto").lower()
+        
+        if backend == "auto":
+            return "numpy" if numpy_available() else "python"
+        
+        if backend == "numpy" and not numpy_available():
+            logger.warning("NumPy is not installed, falling back to the pure Python matching backend")
+            return "python"
+        
+        return backend
+    
     @staticmethod
     def _calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
         """Calculate distance between two points in kilometers using Haversine formula"""
@@ -111,31 +192,56 @@ class MatchingService:
         return c * r
     
     @staticmethod
-    async def create_matches() -> List[Tuple[int, int]]:
-        """Create matches between users"""
-        logger.info("Starting matching process")
+    def get_candidates_for_round(
+        users: List[Dict[str, Any]],
+        history: PairHistory,
+        backend: str = "python"
+    ) -> List[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+        """Get available candidates for every user of a round"""
+        if backend == "numpy":
+            return MatchingService.get_vectorized_candidates(users, history)
         
-        # Get all eligible users
-        users = await MatchingService.get_active_users_for_matching()
-        logger.info(f"Found {len(users)} eligible users for matching")
-        
-        if len(users) < 2:
-            logger.warning("Not enough users for matching")
-            return []
+        # Bucket users by location and interests once for the whole round
+        geo_index = GeoGridIndex(users)
+        interest_index = InterestIndex(users)
         
-        # Sort users by number of available candidates (ascending)
         users_with_candidates = []
         for user in users:
-            candidates = await MatchingService.get_available_candidates(user['id'], users)
+            candidates = MatchingService.filter_candidates(
+                user, users, history.partners(user['id']),
+                geo_index=geo_index, interest_index=interest_index
+            )
             users_with_candidates.append((user, candidates))
         
-        users_with_candidates.sort(key=lambda x: len(x[1]))
+        return users_with_candidates
+    
+    @staticmethod
+    def pair_users(
+        users_with_candidates: List[Tuple[Dict[str, Any], List[Dict[str, Any]]]],
+        history: PairHistory,
+        positions: Optional[List[int]] = None
+    ) -> Tuple[List[Tuple[Tuple[int, int], Tuple[int, int]]], List[Tuple[Tuple[int, int], Dict[str, Any]]]]:
+        """Greedily pair users, starting with the ones with fewest candidates
+        
+        Returns the matches and the unmatched users, each tagged with the
+        (candidate count, position) key of the user that was processed, so
+        results of several partitions can be merged in serial order.
+        """
+        if positions is None:
+            positions = list(range(len(users_with_candidates)))
+        
+        # Sort users by number of available candidates (ascending)
+        keyed = sorted(
+            (((len(candidates), position), user, candidates)
+             for position, (user, candidates) in zip(positions, users_with_candidates)),
+            key=lambda item: item[0]
+        )
         
         # Create matches
         matches = []
         matched_users: Set[int] = set()
         
-        for user, candidates in users_with_candidates:
+        for key, user, candidates in keyed:
             # Skip if user already matched
             if user['id'] in matched_users:
                 continue
@@ -148,48 +254,295 @@ class MatchingService:
                 continue
             
             # Select candidate with minimum previous matches
-            candidate = await select_candidate(available_candidates)
-            # candidate = min(available_candidates, 
-            #                key=lambda c: len(MatchRepository.get_previous_matches(c['id'])))
+            candidate = min(available_candidates, key=lambda c: history.count(c['id']))
             
             # Create match
-            matches.append((user['id'], candidate['id']))
+            matches.append((key, (user['id'], candidate['id'])))
             matched_users.add(user['id'])
             matched_users.add(candidate['id'])
             
             logger.info(f"Created match between users {user['id']} and {candidate['id']}")
         
-        # Handle remaining users (for odd number of users)
-        remaining_users = [u[0] for u in users_with_candidates if u[0]['id'] not in matched_users]
+        remaining = [(key, user) for key, user, _ in keyed if user['id'] not in matched_users]
         
-        if len(remaining_users) >= 3:
-            # Create a group of 3
-            group = remaining_users[:3]
-            matches.append((group[0]['id'], group[1]['id']))
-            matches.append((group[1]['id'], group[2]['id']))
-            matches.append((group[0]['id'], group[2]['id']))
-            
-            logger.info(f"Created group match between users {group[0]['id']}, {group[1]['id']}, and {group[2]['id']}")
+        return matches, remaining
+    
+    @staticmethod
+    def pair_users_maximum(
+        users_with_candidates: List[Tuple[Dict[str, Any], List[Dict[str, Any]]]],
+        history: PairHistory,
+        positions: Optional[List[int]] = None,
+        time_budget: Optional[float] = None
+    ) -> Tuple[List[Tuple[Tuple[int, int], Tuple[int, int]]], List[Tuple[Tuple[int, int], Dict[str, Any]]]]:
+        """Pair users with a maximum-cardinality matching on the candidate graph
+        
+        Starts from the greedy pairing and grows it along augmenting paths, so
+        it never pairs fewer users than greedy. Returns the same tagged matches
+        and unmatched users as pair_users.
+        """
+        if positions is None:
+            positions = list(range(len(users_with_candidates)))
+        if time_budget is None:
+            time_budget = float(os.getenv("MATCHING_TIME_BUDGET", "60"))
+        
+        greedy_matches, _ = MatchingService.pair_users(users_with_candidates, history, positions)
+        
+        users = [user for user, _ in users_with_candidates]
+        keys = [(len(candidates), position) for position, (_, candidates) in zip(positions, users_with_candidates)]
+        index = {user['id']: i for i, user in enumerate(users)}
+        
+        # Candidate graph, undirected: either side listing the other is enough
+        neighbours: List[Set[int]] = [set() for _ in users]
+        for i, (_, candidates) in enumerate(users_with_candidates):
+            for candidate in candidates:
+                j = index.get(candidate['id'])
+                if j is not None and j != i:
+                    neighbours[i].add(j)
+                    neighbours[j].add(i)
+        
+        # Prefer partners with fewer previous matches when the search has a choice
+        adjacency = [
+            sorted(adjacent, key=lambda j: (history.count(users[j]['id']), keys[j]))
+            for adjacent in neighbours
+        ]
+        
+        match = [UNMATCHED] * len(users)
+        for _, (user1_id, user2_id) in greedy_matches:
+            match[index[user1_id]] = index[user2_id]
+            match[index[user2_id]] = index[user1_id]
+        
+        order = sorted(range(len(users)), key=keys.__getitem__)
+        if not maximum_matching(adjacency, match, order, time_budget):
+            logger.warning(f"Matching time budget of {time_budget}s ran out, the result may not be maximum")
+        
+        matches = []
+        remaining = []
+        for i in order:
+            j = match[i]
+            if j == UNMATCHED:
+                remaining.append((keys[i], users[i]))
+            elif keys[i] < keys[j]:
+                matches.append((keys[i], (users[i]['id'], users[j]['id'])))
+        
+        logger.info(f"Maximum matching paired {len(matches)} couples, greedy paired {len(greedy_matches)}")
         
-        return matches
+        return matches, remaining
+    
+    @staticmethod
+    def pair(
+        users_with_candidates: List[Tuple[Dict[str, Any], List[Dict[str, Any]]]],
+        history: PairHistory,
+        positions: Optional[List[int]] = None,
+        engine: str = "greedy"
+    ) -> Tuple[List[Tuple[Tuple[int, int], Tuple[int, int]]], List[Tuple[Tuple[int, int], Dict[str, Any]]]]:
+        """Pair users with the given engine ("maximum" or "greedy")"""
+        if engine == "maximum":
+            return MatchingService.pair_users_maximum(users_with_candidates, history, positions)
+        return MatchingService.pair_users(users_with_candidates, history, positions)
+    
+    @staticmethod
+    def get_pairing_engine() -> str:
+        """Get the pairing engine to use ("maximum" or "greedy")"""
+        return os.getenv("MATCHING_ENGINE", "maximum").lower()
+    
+    @staticmethod
+    def group_remaining(remaining_users: List[Dict[str, Any]]) -> List[Tuple[int, int]]:
+        """Handle remaining users (for odd number of users)"""
+        if len(remaining_users) < 3:
+            return []
+        
+        # Create a group of 3
+        group = remaining_users[:3]
+        
+        logger.info(f"Created group match between users {group[0]['id']}, {group[1]['id']}, and {group[2]['id']}")
+        
+        return [
+            (group[0]['id'], group[1]['id']),
+            (group[1]['id'], group[2]['id']),
+            (group[0]['id'], group[2]['id']),
+        ]
+    
+    @staticmethod
+    def partition_users(users: List[Dict[str, Any]], geo_degrees: float = 0) -> List[List[int]]:
+        """Split round positions into independent partitions by language
+        
+        Users can only match within the same language, so language partitions
+        give the same result as a single serial run. A non-zero geo_degrees
+        additionally splits each language into coarse lat/lon regions, which is
+        faster but drops pairs that straddle region borders.
+        """
+        partitions: Dict[Any, List[int]] = {}
+        
+        for position, user in enumerate(users):
+            key = (user['preferred_language'],)
+            if geo_degrees > 0:
+                if has_location(user):
+                    key += (floor(user['location_lat'] / geo_degrees), floor(user['location_lon'] / geo_degrees))
+                else:
+                    key += (None, None)
+            partitions.setdefault(key, []).append(position)
+        
+        # Biggest partitions first so they start as early as possible
+        return sorted(partitions.values(), key=len, reverse=True)
+    
+    @staticmethod
+    async def compute_partitioned(
+        users: List[Dict[str, Any]],
+        history: PairHistory,
+        backend: str,
+        workers: Optional[int] = None,
+        geo_degrees: float = 0,
+        engine: str = "greedy"
+    ) -> List[Tuple[int, int]]:
+        """Run candidate generation and pairing per partition in a process pool"""
+        if workers is None:
+            workers = int(os.getenv("MATCHING_WORKERS", "0")) or os.cpu_count() or 1
+        
+        partitions = MatchingService.partition_users(users, geo_degrees)
+        logger.info(f"Matching {len(partitions)} partitions with {workers} workers")
+        
+        loop = asyncio.get_running_loop()
+        executor = ProcessPoolExecutor(max_workers=workers)
+        try:
+            results = await asyncio.gather(*[
+                loop.run_in_executor(
+                    executor, match_partition,
+                    [users[p] for p in positions], positions,
+                    history.restrict(users[p]['id'] for p in positions), backend, engine
+                )
+                for positions in partitions
+            ])
+        finally:
+            # Never wait on the loop; a cancelled round's partitions that haven't started are dropped
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        # Merge partitions back into the order a serial run would produce
+        matches = sorted((item for partition_matches, _ in results for item in partition_matches), key=lambda item: item[0])
+        remaining = sorted((item for _, partition_remaining in results for item in partition_remaining), key=lambda item: item[0])
+        logger.info(f"{len(remaining)} users left unmatched before grouping")
+        
+        return [pair for _, pair in matches] + MatchingService.group_remaining([user for _, user in remaining])
+    
+    @staticmethod
+    async def run_off_loop(func, *args):
+        """Run CPU-bound matching work without blocking the event loop
+        
+        MATCHING_EXECUTOR selects a separate process (default), a thread,
+        or "inline" to run directly on the loop.
+        """
+        mode = os.getenv("MATCHING_EXECUTOR", "process").lower()
+        if mode == "inline":
+            return func(*args)
+        
+        executor_class = ThreadPoolExecutor if mode == "thread" else ProcessPoolExecutor
+        executor = executor_class(max_workers=1)
+        loop = asyncio.get_running_loop()
+        
+        try:
+            return await loop.run_in_executor(executor, func, *args)
+        finally:
+            # Leaving a `with` block would wait for the work to finish and block the
+            # loop if the round was cancelled; the worker exits once it is done instead
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    @staticmethod
+    async def create_matches(
+        partitioned: Optional[bool] = None,
+        workers: Optional[int] = None,
+        seed: Optional[int] = None
+    ) -> List[Tuple[int, int]]:
+        """Create matches between users"""
+        logger.info("Starting matching process")
+        
+        # Get all eligible users
+        users = await MatchingService.get_active_users_for_matching()
+        logger.info(f"Found {len(users)} eligible users for matching")
+        
+        if len(users) < 2:
+            logger.warning("Not enough users for matching")
+            return []
+        
+        # Shuffle users with a fixed seed to vary the processing order between rounds
+        if seed is None and os.getenv("MATCHING_SEED"):
+            seed = int(os.getenv("MATCHING_SEED"))
+        if seed is not None:
+            users = list(users)
+            random.Random(seed).shuffle(users)
+        
+        # Load the pair history once for the whole round
+        history = await PairHistory.load()
+        logger.info(f"Loaded pair history for {len(history)} users")
+        
+        backend = MatchingService.get_matching_backend()
+        engine = MatchingService.get_pairing_engine()
+        logger.info(f"Generating candidates with the {backend} backend and pairing with the {engine} engine")
+        
+        if partitioned is None:
+            partitioned = os.getenv("MATCHING_PARTITIONED", "false").lower() in ("1", "true", "yes")
+        
+        if partitioned:
+            geo_degrees = float(os.getenv("MATCHING_PARTITION_GEO_DEGREES", "0"))
+            return await MatchingService.compute_partitioned(users, history, backend, workers, geo_degrees, engine)
+        
+        # Keep the bot responsive while the round is being computed
+        return await MatchingService.run_off_loop(compute_matches, users, history, backend, engine)
     
     @staticmethod
     async def save_matches(matches: List[Tuple[int, int]]) -> List[int]:
-        """Save matches to database"""
-        match_ids = []
-        
-        for user1_id, user2_id in matches:
-            match = MatchCreate(
-                user1_id=user1_id,
-                user2_id=user2_id,
-                status="pending"
-            )
+        """Save matches to database and queue their announcements"""
+        # Write the whole round at once so it is saved completely or not at all
+        async with transaction() as conn:
+            match_ids = await MatchRepository.create_matches([
+                MatchCreate(
+                    user1_id=user1_id,
+                    user2_id=user2_id,
+                    status="pending"
+                )
+                for user1_id, user2_id in matches
+            ], conn=conn)
+            
+            # Announce at each user's local match hour instead of all at once
+            match_hour = int(os.getenv("MATCH_HOUR", "10"))
+            user_ids = list({user_id for match in matches for user_id in match})
+            timezones = await UserRepository.get_timezones(user_ids, conn=conn)
+            available_at = {
+                user_id: announcement_time(timezone, match_hour)
+                for user_id, timezone in timezones.items()
+            }
             
-            match_id = await MatchRepository.create_match(match)
-            match_ids.append(match_id)
+            await OutboxRepository.enqueue_many(
+                OutboxService.match_created_entries(match_ids, matches, available_at), conn=conn
+            )
         
         logger.info(f"Saved {len(match_ids)} matches to database")
         return match_ids
 
 
+
+def compute_matches(
+    users: List[Dict[str, Any]],
+    history: PairHistory,
+    backend: str = "python",
+    engine: str = "greedy"
+) -> List[Tuple[int, int]]:
+    """Run candidate generation and pairing for a whole round"""
+    users_with_candidates = MatchingService.get_candidates_for_round(users, history, backend)
+    matches, remaining = MatchingService.pair(users_with_candidates, history, engine=engine)
+    logger.info(f"{len(remaining)} users left unmatched before grouping")
+    
+    return [pair for _, pair in matches] + MatchingService.group_remaining([user for _, user in remaining])
+
+
+def match_partition(
+    users: List[Dict[str, Any]],
+    positions: List[int],
+    history: PairHistory,
+    backend: str,
+    engine: str = "greedy"
+):
+    """Run candidate generation and pairing for one partition in a worker process"""
+    users_with_candidates = MatchingService.get_candidates_for_round(users, history, backend)
+    return MatchingService.pair(users_with_candidates, history, positions, engine)
+
+
 import os  # Add this import at the top of the file
\ No newline at end of file
@@ -0,0 +1,128 @@
+import os
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.services.geo_index import EARTH_RADIUS_KM, GeoGridIndex, has_location
+from app.services.interest_index import InterestIndex
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - the pure Python backend is used instead
+    np = None
+
+# Maximum number of user pairs evaluated at once; bounds the size of the block matrices
+DEFAULT_BLOCK_SIZE = 1 << 22
+
+
+def numpy_available() -> bool:
+    """Check whether the vectorized backend can be used"""
+    return np is not None
+
+
+class CandidateKernel:
+    """Vectorized candidate filters over the users of a matching round
+
+    Applies the same location, language and interest checks as
+    MatchingService.get_available_candidates, but a block of users at a time.
+    """
+
+    def __init__(
+        self,
+        users: Sequence[Dict[str, Any]],
+        block_size: Optional[int] = None,
+        interest_index: Optional[InterestIndex] = None
+    ):
+        if np is None:
+            raise RuntimeError("NumPy is required for the vectorized matching backend")
+
+        if block_size is None:
+            block_size = int(os.getenv("MATCHING_BLOCK_SIZE", str(DEFAULT_BLOCK_SIZE)))
+
+        self.users = users
+        self.block_size = max(1, block_size)
+        count = len(users)
+
+        # Locations in radians; users without one are skipped by the distance check
+        self.located = np.fromiter((has_location(user) for user in users), dtype=bool, count=count)
+        self.lat = np.radians(np.fromiter(
+            (user['location_lat'] if has_location(user) else 0.0 for user in users),
+            dtype=np.float64, count=count
+        ))
+        self.lon = np.radians(np.fromiter(
+            (user['location_lon'] if has_location(user) else 0.0 for user in users),
+            dtype=np.float64, count=count
+        ))
+        self.cos_lat = np.cos(self.lat)
+        self.radius = np.fromiter((user['radius'] or 0 for user in users), dtype=np.float64, count=count)
+
+        # Languages as integer codes
+        languages: Dict[Any, int] = {}
+        self.language = np.fromiter(
+            (languages.setdefault(user['preferred_language'], len(languages)) for user in users),
+            dtype=np.int32, count=count
+        )
+
+        # Interests as bitsets split into 64-bit words
+        if interest_index is None:
+            interest_index = InterestIndex(users)
+
+        words = max(1, (len(interest_index.vocabulary) + 63) // 64)
+        self.interests = np.zeros((count, words), dtype=np.uint64)
+        for position, mask in enumerate(interest_index.masks):
+            for word in range(words):
+                self.interests[position, word] = (mask >> (64 * word)) & 0xFFFFFFFFFFFFFFFF
+
+    def candidate_mask(self, rows: "np.ndarray", columns: "np.ndarray") -> "np.ndarray":
+        """Get the candidate mask for the users at `rows` against the users at `columns`"""
+        # Language preference
+        mask = self.language[rows, None] == self.language[None, columns]
+
+        # Common interests
+        overlap = np.zeros_like(mask)
+        for word in range(self.interests.shape[1]):
+            overlap |= (self.interests[rows, word, None] & self.interests[None, columns, word]) != 0
+        mask &= overlap
+
+        # Distance, only checked when both users have a location
+        dlat = self.lat[None, columns] - self.lat[rows, None]
+        dlon = self.lon[None, columns] - self.lon[rows, None]
+        a = np.sin(dlat / 2) ** 2 + self.cos_lat[rows, None] * self.cos_lat[None, columns] * np.sin(dlon / 2) ** 2
+        distance = 2 * np.arcsin(np.sqrt(np.clip(a, 0, 1))) * EARTH_RADIUS_KM
+
+        both_located = self.located[rows, None] & self.located[None, columns]
+        mask &= ~both_located | (distance <= self.radius[rows, None])
+
+        # Skip self
+        mask &= rows[:, None] != columns[None, :]
+
+        return mask
+
+    def _iter_block(self, rows: "np.ndarray", columns: "np.ndarray") -> Iterator[Tuple[int, List[int]]]:
+        """Yield candidates of the users at `rows` among `columns`, a block of rows at a time"""
+        rows_per_block = max(1, self.block_size // max(len(columns), 1))
+
+        for start in range(0, len(rows), rows_per_block):
+            block = rows[start:start + rows_per_block]
+            mask = self.candidate_mask(block, columns)
+
+            for offset, position in enumerate(block.tolist()):
+                yield position, columns[np.flatnonzero(mask[offset])].tolist()
+
+    def iter_candidates(self, geo_index: Optional[GeoGridIndex] = None) -> Iterator[Tuple[int, List[int]]]:
+        """Yield each user's position with the positions of their candidates
+
+        Without a grid every user is compared with everyone, in position
+        order. With one, the located users of each grid cell are only compared
+        with the users in reach of that cell, and positions come out grouped
+        by cell. Candidates are in round order either way.
+        """
+        everyone = np.arange(len(self.users))
+
+        if geo_index is None:
+            yield from self._iter_block(everyone, everyone)
+            return
+
+        for positions, neighbourhood in geo_index.cell_neighbourhoods():
+            yield from self._iter_block(np.array(positions), np.array(neighbourhood))
+
+        # Users without a location may be matched with anyone
+        yield from self._iter_block(everyone[~self.located], everyone)
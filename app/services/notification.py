@@ -7,43 +7,63 @@ from loguru import logger
 from aiogram import Bot
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
-from app.database.repositories import UserRepository, MatchRepository
+from app.database.repositories import UserRepository, MatchRepository, user_loader, match_loader
+from app.services.dispatcher import NotificationDispatcher, is_unreachable_error
 
 
 class NotificationService:
     """Service for sending notifications to users"""
     
-    def __init__(self, bot: Bot):
+    def __init__(self, bot: Bot, dispatcher: Optional[NotificationDispatcher] = None):
         self.bot = bot
+        self.dispatcher = dispatcher
         self.webapp_url = os.getenv("WEBAPP_URL", "")
     
-    async def notify_match(self, match_id: int) -> bool:
-        """Notify users about a new match"""
+    async def _send(self, chat_id: int, text: str, **kwargs):
+        """Send a message, through the rate-limited dispatcher when there is one
+        
+        Users whose chat blocked the bot or no longer exists are deactivated
+        and returns None for them. The users.unreachable_since flag is the only
+        record of this, so a user reactivated by /start is reachable again at once.
+        """
         try:
-            # Get match details
-            match = await MatchRepository.get_match_by_id(match_id)
-            if not match:
-                logger.error(f"Match {match_id} not found")
-                return False
-            
-            # Get user details
-            user1 = await UserRepository.get_user_by_id(match['user1_id'])
-            user2 = await UserRepository.get_user_by_id(match['user2_id'])
-            
-            if not user1 or not user2:
-                logger.error(f"Users for match {match_id} not found")
-                return False
+            if self.dispatcher is not None:
+                return await self.dispatcher.send_message(chat_id, text, **kwargs)
             
-            # Send notifications
-            await self._send_match_notification(user1, user2, match_id)
-            await self._send_match_notification(user2, user1, match_id)
-            
-            logger.info(f"Match notifications sent for match {match_id}")
-            return True
+            return await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
         
         except Exception as e:
-            logger.error(f"Error sending match notification: {e}")
+            if not is_unreachable_error(e):
+                raise
+            
+            # Keep the user out of future rounds until they come back
+            if await UserRepository.mark_unreachable(chat_id):
+                logger.info(f"Chat {chat_id} is unreachable, user deactivated: {e}")
+            return None
+    
+    async def notify_match_user(self, match_id: int, user_id: int) -> bool:
+        """Notify one participant about a new match
+        
+        Delivery errors are raised so the outbox can retry.
+        """
+        # Get match details
+        match = await match_loader.load(match_id)
+        if not match:
+            logger.error(f"Match {match_id} not found")
             return False
+        
+        # Get user details
+        partner_id = match['user2_id'] if match['user1_id'] == user_id else match['user1_id']
+        user, partner = await user_loader.load_many([user_id, partner_id])
+        
+        if not user or not partner:
+            logger.error(f"Users for match {match_id} not found")
+            return False
+        
+        await self._send_match_notification(user, partner, match_id)
+        
+        logger.info(f"Match notification sent for match {match_id} to user {user_id}")
+        return True
     
     async def _send_match_notification(self, user: Dict[str, Any], match_partner: Dict[str, Any], match_id: int):
         """Send match notification to a user"""        
@@ -69,93 +89,65 @@ class NotificationService:
         )
         
         # Send message
-        await self.bot.send_message(
+        await self._send(
             chat_id=user['telegram_id'],
             text=message,
             reply_markup=keyboard,
             parse_mode="HTML"
         )
     
-    async def notify_match_status(self, match_id: int, status: str, user_id: Optional[int] = None) -> bool:
-        """Notify users about match status change"""
-        try:
-            # Get match details
-            match = await MatchRepository.get_match_by_id(match_id)
-            if not match:
-                logger.error(f"Match {match_id} not found")
-                return False
-            
-            # Get user details
-            user1 = await UserRepository.get_user_by_id(match['user1_id'])
-            user2 = await UserRepository.get_user_by_id(match['user2_id'])
-            
-            if not user1 or not user2:
-                logger.error(f"Users for match {match_id} not found")
-                return False
-            
-            # Determine which user initiated the status change
-            initiator = None
-            recipient = None
-            
-            if user_id:
-                if user_id == user1['id']:
-                    initiator = user1
-                    recipient = user2
-                else:
-                    initiator = user2
-                    recipient = user1
-            
-            # Send notification based on status
-            if status == "accepted":
-                if initiator and recipient:
-                    await self._send_acceptance_notification(recipient, initiator, match_id)
-                
-            elif status == "declined":
-                if initiator and recipient:
-                    await self._send_decline_notification(recipient, initiator, match_id)
-                
-            elif status == "completed":
-                # Send completion notification to both users
-                feedback_btn = InlineKeyboardButton(
-                    text="Leave Feedback", 
-                    callback_data=f"feedback_{match_id}"
-                )
-                keyboard = InlineKeyboardMarkup(
-                    inline_keyboard=[[feedback_btn]]  # one button per row
-                )
-                
-                message = (
-                    f"✅ <b>Coffee Match Completed!</b>\n\n"
-                    f"Your coffee chat with <b>{user2['full_name']}</b> has been marked as completed.\n\n"
-                    f"Would you like to leave feedback?"
-                )
-                
-                await self.bot.send_message(
-                    chat_id=user1['telegram_id'],
-                    text=message,
-                    reply_markup=keyboard,
-                    parse_mode="HTML"
-                )
-                
-                message = (
-                    f"✅ <b>Coffee Match Completed!</b>\n\n"
-                    f"Your coffee chat with <b>{user1['full_name']}</b> has been marked as completed.\n\n"
-                    f"Would you like to leave feedback?"
-                )
-                
-                await self.bot.send_message(
-                    chat_id=user2['telegram_id'],
-                    text=message,
-                    reply_markup=keyboard,
-                    parse_mode="HTML"
-                )
-            
-            logger.info(f"Match status notification sent for match {match_id}, status: {status}")
-            return True
+    async def notify_match_status_user(self, match_id: int, status: str, user_id: int) -> bool:
+        """Notify one participant about a match status change made by their partner
         
-        except Exception as e:
-            logger.error(f"Error sending match status notification: {e}")
+        Delivery errors are raised so the outbox can retry.
+        """
+        # Get match details
+        match = await match_loader.load(match_id)
+        if not match:
+            logger.error(f"Match {match_id} not found")
             return False
+        
+        # Get user details
+        partner_id = match['user2_id'] if match['user1_id'] == user_id else match['user1_id']
+        user, partner = await user_loader.load_many([user_id, partner_id])
+        
+        if not user or not partner:
+            logger.error(f"Users for match {match_id} not found")
+            return False
+        
+        # Send notification based on status
+        if status == "accepted":
+            await self._send_acceptance_notification(user, partner, match_id)
+        elif status == "declined":
+            await self._send_decline_notification(user, partner, match_id)
+        elif status == "completed":
+            await self._send_completion_notification(user, partner, match_id)
+        
+        logger.info(f"Match status notification sent for match {match_id} to user {user_id}, status: {status}")
+        return True
+    
+    async def _send_completion_notification(self, user: Dict[str, Any], partner: Dict[str, Any], match_id: int):
+        """Send notification that match was completed"""
+        feedback_btn = InlineKeyboardButton(
+            text="Leave Feedback", 
+            callback_data=f"feedback_{match_id}"
+        )
+        keyboard = InlineKeyboardMarkup(
+            inline_keyboard=[[feedback_btn]]  # one button per row
+        )
+        
+        message = (
+            f"✅ <b>Coffee Match Completed!</b>\n\n"
+            f"Your coffee chat with <b>{partner['full_name']}</b> has been marked as completed.\n\n"
+            f"Would you like to leave feedback?"
+        )
+        
+        await self._send(
+            chat_id=user['telegram_id'],
+            text=message,
+            reply_markup=keyboard,
+            parse_mode="HTML"
+        )
     
     async def _send_acceptance_notification(self, user: Dict[str, Any], acceptor: Dict[str, Any], match_id: int):
         """Send notification that match was accepted"""
@@ -181,7 +173,7 @@ class NotificationService:
             f"You can now contact them directly to arrange a time and place for your coffee chat."
         )
         
-        await self.bot.send_message(
+        await self._send(
             chat_id=user['telegram_id'],
             text=message,
             reply_markup=keyboard,
@@ -196,77 +188,48 @@ class NotificationService:
             f"Don't worry, we'll find you a new match soon!"
         )
         
-        await self.bot.send_message(
+        await self._send(
             chat_id=user['telegram_id'],
             text=message,
             parse_mode="HTML"
         )
     
-    async def send_reminder(self, match_id: int) -> bool:
-        """Send reminder about pending match"""
+    def render_reminder(self, match_id: int, partner_id: int, partner_full_name: str):
+        """Build the reminder text and keyboard for one participant of a pending match"""
+        # Add view profile button
+        profile_url = f"{self.webapp_url}/profile/{partner_id}"
+        view_profile = InlineKeyboardButton(text="View Profile", web_app={"url": profile_url})
+        
+        # Add accept/decline buttons
+        accept = InlineKeyboardButton(text="Accept ✅", callback_data=f"match_accept_{match_id}")
+        decline = InlineKeyboardButton(text="Decline ❌", callback_data=f"match_decline_{match_id}")
+        
+        keyboard = InlineKeyboardMarkup(
+            inline_keyboard=[[view_profile], [accept, decline]]  # one button per row
+        )
+        
+        message = (
+            f"⏰ <b>Reminder: Pending Coffee Match</b>\n\n"
+            f"You still have a pending coffee match with <b>{partner_full_name}</b>.\n\n"
+            f"Please accept or decline the match."
+        )
+        
+        return message, keyboard
+    
+    async def send_reminder_row(self, row: Dict[str, Any]) -> bool:
+        """Send one reminder from a row of MatchRepository.iter_pending_reminders"""
         try:
-            # Get match details
-            match = await MatchRepository.get_match_by_id(match_id)
-            if not match or match['status'] != "pending":
-                return False
-            
-            # Get user details
-            user1 = await UserRepository.get_user_by_id(match['user1_id'])
-            user2 = await UserRepository.get_user_by_id(match['user2_id'])
+            message, keyboard = self.render_reminder(row['match_id'], row['partner_id'], row['partner_full_name'])
             
-            if not user1 or not user2:
-                return False
-            
-            # Add view profile button
-            profile_url = f"{self.webapp_url}/profile/{user2['id']}"
-            view_profile = InlineKeyboardButton(text="View Profile", web_app={"url": profile_url})
-            
-            # Add accept/decline buttons
-            accept = InlineKeyboardButton(text="Accept ✅", callback_data=f"match_accept_{match_id}")
-            decline = InlineKeyboardButton(text="Decline ❌", callback_data=f"match_decline_{match_id}")
-            
-            keyboard = InlineKeyboardMarkup(
-                inline_keyboard=[[view_profile], [accept, decline]]  # one button per row
-            )
-            
-            # Send reminder to user1
-            message = (
-                f"⏰ <b>Reminder: Pending Coffee Match</b>\n\n"
-                f"You still have a pending coffee match with <b>{user2['full_name']}</b>.\n\n"
-                f"Please accept or decline the match."
-            )
-            
-            await self.bot.send_message(
-                chat_id=user1['telegram_id'],
-                text=message,
-                reply_markup=keyboard,
-                parse_mode="HTML"
-            )
-            
-            # Send reminder to user2
-            profile_url = f"{self.webapp_url}/profile/{user1['id']}"
-            view_profile = InlineKeyboardButton(text="View Profile", web_app={"url": profile_url})
-
-            keyboard = InlineKeyboardMarkup(
-                inline_keyboard=[[view_profile], [accept, decline]]  # one button per row
-            )
-            
-            message = (
-                f"⏰ <b>Reminder: Pending Coffee Match</b>\n\n"
-                f"You still have a pending coffee match with <b>{user1['full_name']}</b>.\n\n"
-                f"Please accept or decline the match."
-            )
-            
-            await self.bot.send_message(
-                chat_id=user2['telegram_id'],
+            await self._send(
+                chat_id=row['telegram_id'],
                 text=message,
                 reply_markup=keyboard,
                 parse_mode="HTML"
             )
             
-            logger.info(f"Reminder sent for match {match_id}")
             return True
         
         except Exception as e:
-            logger.error(f"Error sending reminder: {e}")
-            return False
\ No newline at end of file
+            logger.error(f"Error sending reminder for match {row['match_id']}: {e}")
+            return False
@@ -0,0 +1,185 @@
+import asyncio
+import os
+import random
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from app.database.connection import transaction
+from app.database.repositories import MatchRepository, OutboxRepository
+from app.database.repositories.outbox_repository import OutboxEntry
+from app.database.models import MatchUpdate, MatchHistoryCreate
+from app.services.notification import NotificationService
+
+
+class OutboxService:
+    """Helpers that change state and queue the matching notifications atomically"""
+
+    @staticmethod
+    def match_created_entries(
+        match_ids: List[int],
+        matches: List[Tuple[int, int]],
+        available_at: Optional[Dict[int, Optional[datetime]]] = None
+    ) -> List[OutboxEntry]:
+        """Build one announcement per participant of every new match
+        
+        `available_at` maps user IDs to when their announcement may be sent.
+        """
+        entries = []
+        available_at = available_at or {}
+
+        for match_id, (user1_id, user2_id) in zip(match_ids, matches):
+            for user_id in (user1_id, user2_id):
+                entries.append((
+                    "match_created",
+                    {"match_id": match_id, "user_id": user_id},
+                    f"match_created:{match_id}:{user_id}",
+                    available_at.get(user_id)
+                ))
+
+        return entries
+
+    @staticmethod
+    def match_status_entries(
+        match_id: int,
+        status: str,
+        user1_id: int,
+        user2_id: int,
+        user_id: Optional[int] = None
+    ) -> List[OutboxEntry]:
+        """Build one status notification per recipient of a match status change
+        
+        Acceptances and declines go to the partner of `user_id`, who made the
+        change; completions go to both participants. Each recipient gets their
+        own entry so a retry never repeats a message someone already received.
+        """
+        if status == "completed":
+            recipients = [user1_id, user2_id]
+        elif status in ("accepted", "declined") and user_id:
+            recipients = [user2_id if user_id == user1_id else user1_id]
+        else:
+            recipients = []
+
+        return [
+            (
+                "match_status_user",
+                {"match_id": match_id, "status": status, "user_id": recipient_id},
+                f"match_status:{match_id}:{status}:{recipient_id}",
+                None
+            )
+            for recipient_id in recipients
+        ]
+
+    @staticmethod
+    async def update_match_status(match_id: int, status: str, user_id: Optional[int] = None) -> bool:
+        """Update a match status and queue the status notification in one transaction"""
+        async with transaction() as conn:
+            success = await MatchRepository.update_match(match_id, MatchUpdate(status=status), conn=conn)
+            if not success:
+                return False
+
+            match = await conn.fetchrow('SELECT user1_id, user2_id FROM matches WHERE id = $1', match_id)
+
+            # Completed matches also go to the history
+            if status == "completed":
+                await MatchRepository.add_to_history(MatchHistoryCreate(
+                    user1_id=match['user1_id'],
+                    user2_id=match['user2_id'],
+                    status="completed"
+                ), conn=conn)
+
+            await OutboxRepository.enqueue_many(
+                OutboxService.match_status_entries(match_id, status, match['user1_id'], match['user2_id'], user_id),
+                conn=conn
+            )
+
+        return True
+
+
+class OutboxWorker:
+    """Pool of async tasks delivering queued notifications with retries"""
+
+    def __init__(
+        self,
+        notification_service: NotificationService,
+        workers: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        max_attempts: Optional[int] = None
+    ):
+        self.notification_service = notification_service
+        self.workers = workers or int(os.getenv("OUTBOX_WORKERS", "10"))
+        self.batch_size = batch_size or int(os.getenv("OUTBOX_BATCH_SIZE", "20"))
+        self.max_attempts = max_attempts or int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+        self.poll_interval = float(os.getenv("OUTBOX_POLL_INTERVAL", "2"))
+        self.lease_seconds = float(os.getenv("OUTBOX_LEASE_SECONDS", "300"))
+        self.backoff_base = float(os.getenv("OUTBOX_BACKOFF_BASE", "5"))
+        self.backoff_max = float(os.getenv("OUTBOX_BACKOFF_MAX", "3600"))
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        """Start the worker tasks"""
+        self._tasks = [asyncio.create_task(self._work(index)) for index in range(self.workers)]
+        logger.info(f"Outbox started with {self.workers} workers")
+
+    async def stop(self):
+        """Stop the worker tasks; claimed entries are retried once their lease expires"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Outbox stopped")
+
+    async def _work(self, index: int):
+        """Claim and deliver due notifications until cancelled"""
+        while True:
+            try:
+                entries = await OutboxRepository.claim_batch(self.batch_size, self.lease_seconds)
+            except Exception as e:
+                logger.error(f"Outbox worker {index} failed to claim notifications: {e}")
+                entries = []
+
+            if not entries:
+                # Spread polling so idle workers don't hit the database in lockstep
+                await asyncio.sleep(self.poll_interval * random.uniform(0.5, 1.5))
+                continue
+
+            for entry in entries:
+                try:
+                    await self._deliver(entry)
+                except Exception as e:
+                    logger.error(f"Outbox worker {index} failed to record notification {entry['id']}: {e}")
+
+    async def _deliver(self, entry: Dict[str, Any]):
+        """Deliver one notification and record the outcome"""
+        error = None
+        try:
+            if await self._handle(entry['kind'], entry['payload']):
+                await OutboxRepository.mark_sent(entry['id'])
+                return
+            error = "Notification handler reported a failure"
+        except Exception as e:
+            error = f"{e.__class__.__name__}: {e}"
+
+        if entry['attempts'] >= self.max_attempts:
+            logger.error(f"Giving up on notification {entry['idempotency_key']}: {error}")
+            await OutboxRepository.mark_failed(entry['id'], error)
+            return
+
+        # Exponential backoff with jitter
+        delay = min(self.backoff_base * 2 ** (entry['attempts'] - 1), self.backoff_max)
+        delay *= random.uniform(0.8, 1.2)
+        logger.warning(f"Notification {entry['idempotency_key']} failed, retrying in {delay:.0f}s: {error}")
+        await OutboxRepository.mark_retry(entry['id'], error, delay)
+
+    async def _handle(self, kind: str, payload: Dict[str, Any]) -> bool:
+        """Route a notification to the NotificationService"""
+        if kind == "match_created":
+            return await self.notification_service.notify_match_user(payload['match_id'], payload['user_id'])
+
+        if kind == "match_status_user":
+            return await self.notification_service.notify_match_status_user(
+                payload['match_id'], payload['status'], payload['user_id']
+            )
+
+        raise ValueError(f"Unknown notification kind: {kind}")
@@ -0,0 +1,58 @@
+from typing import Dict, Iterable, Set, Tuple, AbstractSet
+
+from app.database.repositories import MatchRepository
+
+
+class PairHistory:
+    """In-memory snapshot of who has already been matched with whom"""
+    
+    def __init__(self, pairs: Iterable[Tuple[int, int]] = ()):
+        # Adjacency sets keyed by user ID
+        self._partners: Dict[int, Set[int]] = {}
+        
+        for user1_id, user2_id in pairs:
+            self.add(user1_id, user2_id)
+    
+    @classmethod
+    async def load(cls) -> "PairHistory":
+        """Load all historical pairs with a single streaming query"""
+        history = cls()
+        
+        async for user1_id, user2_id in MatchRepository.iter_match_pairs():
+            history.add(user1_id, user2_id)
+        
+        return history
+    
+    def add(self, user1_id: int, user2_id: int):
+        """Record that two users have been matched"""
+        if user1_id is None or user2_id is None or user1_id == user2_id:
+            return
+        
+        self._partners.setdefault(user1_id, set()).add(user2_id)
+        self._partners.setdefault(user2_id, set()).add(user1_id)
+    
+    def partners(self, user_id: int) -> AbstractSet[int]:
+        """Get IDs of users the given user has been matched with before"""
+        return self._partners.get(user_id, frozenset())
+    
+    def count(self, user_id: int) -> int:
+        """Get the number of distinct previous partners of a user"""
+        return len(self._partners.get(user_id, ()))
+    
+    def has_met(self, user1_id: int, user2_id: int) -> bool:
+        """Check whether two users have been matched before"""
+        return user2_id in self._partners.get(user1_id, ())
+    
+    def restrict(self, user_ids: Iterable[int]) -> "PairHistory":
+        """Get a snapshot holding only the given users' partner sets"""
+        history = PairHistory()
+        
+        for user_id in user_ids:
+            partners = self._partners.get(user_id)
+            if partners:
+                history._partners[user_id] = partners
+        
+        return history
+    
+    def __len__(self) -> int:
+        return len(self._partners)
@@ -0,0 +1,130 @@
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set
+
+UNMATCHED = -1
+
+
+def _find_augmenting_path(root: int, adjacency: List[List[int]], match: List[int], dead: Set[int]):
+    """Search for an augmenting path from an unmatched vertex (Edmonds' blossom algorithm)
+
+    State is kept in dicts keyed by the vertices actually reached, so a search
+    only costs as much as the part of the graph it explores. Returns the free
+    vertex the path ends at and the parent links, or UNMATCHED and the list of
+    vertices of the (Hungarian) search tree when there is no such path.
+    """
+    parent: Dict[int, int] = {}
+    base: Dict[int, int] = {}
+    used = {root}
+    tree = [root]
+    queue = deque([root])
+
+    def base_of(vertex: int) -> int:
+        return base.get(vertex, vertex)
+
+    def lowest_common_ancestor(a: int, b: int) -> int:
+        seen = set()
+        while True:
+            a = base_of(a)
+            seen.add(a)
+            if match[a] == UNMATCHED:
+                break
+            a = parent[match[a]]
+        while True:
+            b = base_of(b)
+            if b in seen:
+                return b
+            b = parent[match[b]]
+
+    def mark_path(vertex: int, blossom_base: int, child: int, blossom: Set[int]):
+        while base_of(vertex) != blossom_base:
+            blossom.add(base_of(vertex))
+            blossom.add(base_of(match[vertex]))
+            parent[vertex] = child
+            child = match[vertex]
+            vertex = parent[match[vertex]]
+
+    while queue:
+        vertex = queue.popleft()
+
+        for neighbour in adjacency[vertex]:
+            if neighbour in dead or base_of(vertex) == base_of(neighbour) or match[vertex] == neighbour:
+                continue
+
+            if neighbour == root or (match[neighbour] != UNMATCHED and match[neighbour] in parent):
+                # Odd cycle: contract the blossom into its base
+                blossom_base = lowest_common_ancestor(vertex, neighbour)
+                blossom: Set[int] = set()
+                mark_path(vertex, blossom_base, neighbour, blossom)
+                mark_path(neighbour, blossom_base, vertex, blossom)
+
+                for member in tree:
+                    if base_of(member) in blossom:
+                        base[member] = blossom_base
+                        if member not in used:
+                            used.add(member)
+                            queue.append(member)
+
+            elif neighbour not in parent:
+                parent[neighbour] = vertex
+                tree.append(neighbour)
+
+                if match[neighbour] == UNMATCHED:
+                    return neighbour, parent
+
+                mate = match[neighbour]
+                used.add(mate)
+                tree.append(mate)
+                queue.append(mate)
+
+    return UNMATCHED, tree
+
+
+def maximum_matching(
+    adjacency: List[List[int]],
+    match: Optional[List[int]] = None,
+    order: Optional[Iterable[int]] = None,
+    time_budget: Optional[float] = None
+) -> bool:
+    """Grow a matching to maximum cardinality on a sparse undirected graph
+
+    `match` holds each vertex's partner or UNMATCHED and is updated in place,
+    so a greedy matching can be passed in as a starting point. Free vertices
+    are tried in `order`. Vertices of a failed search tree can never be part
+    of an augmenting path again and are dropped from later searches.
+
+    Returns False when the time budget ran out before the matching was
+    proven maximum.
+    """
+    count = len(adjacency)
+    if match is None:
+        match = [UNMATCHED] * count
+    if order is None:
+        order = range(count)
+
+    deadline = time.monotonic() + time_budget if time_budget is not None else None
+    dead: Set[int] = set()
+
+    for root in order:
+        if match[root] != UNMATCHED or root in dead or not adjacency[root]:
+            continue
+
+        if deadline is not None and time.monotonic() > deadline:
+            return False
+
+        end, found = _find_augmenting_path(root, adjacency, match, dead)
+
+        if end == UNMATCHED:
+            dead.update(found)
+            continue
+
+        # Flip the matched and unmatched edges along the path
+        vertex = end
+        while vertex != UNMATCHED:
+            previous = found[vertex]
+            next_vertex = match[previous]
+            match[vertex] = previous
+            match[previous] = vertex
+            vertex = next_vertex
+
+    return True
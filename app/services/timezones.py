@@ -0,0 +1,84 @@
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+import pytz
+
+DAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+
+def get_timezone(name: Optional[str]):
+    """Resolve a user's timezone, falling back to the configured default"""
+    try:
+        return pytz.timezone(name or os.getenv("TIMEZONE", "UTC"))
+    except pytz.UnknownTimeZoneError:
+        return pytz.timezone(os.getenv("TIMEZONE", "UTC"))
+
+
+def utc_now() -> datetime:
+    """Get the current time as an aware UTC datetime"""
+    return datetime.now(pytz.utc)
+
+
+def weekday_index(day: str) -> int:
+    """Convert a day name like "Monday" or "mon" to a weekday number"""
+    day = day.lower()
+    for index, name in enumerate(DAYS):
+        if name.startswith(day[:3]):
+            return index
+
+    raise ValueError(f"Unknown day: {day}")
+
+
+def bucket_by_offset(timezones: Iterable[str], now: Optional[datetime] = None) -> Dict[int, List[str]]:
+    """Group timezone names by their current UTC offset in minutes"""
+    now = now or utc_now()
+    buckets: Dict[int, List[str]] = defaultdict(list)
+
+    for name in timezones:
+        offset = now.astimezone(get_timezone(name)).utcoffset()
+        buckets[int(offset.total_seconds() // 60)].append(name)
+
+    return dict(buckets)
+
+
+def due_timezones(
+    timezones: Iterable[str],
+    hour: int,
+    day: Optional[str] = None,
+    now: Optional[datetime] = None
+) -> List[str]:
+    """Get the timezones whose local time is currently within `hour` (on `day`)"""
+    now = now or utc_now()
+    due = []
+
+    # Every timezone in a bucket shares the same local time
+    for offset, names in bucket_by_offset(timezones, now).items():
+        local = now + timedelta(minutes=offset)
+
+        if local.hour != hour:
+            continue
+        if day is not None and local.weekday() != weekday_index(day):
+            continue
+
+        due.extend(names)
+
+    return due
+
+
+def announcement_time(timezone: Optional[str], hour: int, now: Optional[datetime] = None) -> Optional[datetime]:
+    """Get when to deliver a notification so it arrives at the user's local hour
+
+    Returns the local `hour` later today, or None (deliver now) when that hour
+    has already passed.
+    """
+    now = now or utc_now()
+    tz = get_timezone(timezone)
+    local = now.astimezone(tz)
+
+    if local.hour >= hour:
+        return None
+
+    target = tz.localize(datetime(local.year, local.month, local.day, hour))
+    return target.astimezone(pytz.utc)
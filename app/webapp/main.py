@@ -155,7 +155,7 @@ async def get_user(telegram_id: int):
             detail="User not found"
         )
     
-    return JSONResponse(content=jsonable_encoder(user))
+    return JSONResponse(content=jsonable_encoder(dict(user)))
 
 @app.get("/api/user/profile/{user_id}", response_class=JSONResponse)
 async def get_user_profile(user_id: int):
@@ -218,16 +218,25 @@ async def process_webapp_data(data: WebAppResponse):
         # Get user by Telegram ID from init data
         # In a real app, you would extract the user ID from the validated Telegram data
         # For simplicity, we'll assume the user ID is provided in the request
-        user_id = data.profile.user_id if hasattr(data.profile, "user_id") else None
+        telegram_id = data.profile.user_id if hasattr(data.profile, "user_id") else None
         
-        if not user_id:
+        if not telegram_id:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="User ID not provided"
             )
         
+        # The Mini App sends the Telegram ID; updates go by the internal ID
+        user = await UserRepository.get_user_by_telegram_id(telegram_id)
+        
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
+        
         # Update user
-        success = await UserRepository.update_user(user_id, user_update)
+        success = await UserRepository.update_user(user['id'], user_update)
         
         if not success:
             logger.info("Failed to update user profile, probably not found in db")
@@ -0,0 +1,53 @@
+"""Compare match yield and runtime of the greedy and maximum pairing engines
+
+Usage: python -m benchmarks.pairing_benchmark [users ...]
+"""
+import random
+import sys
+import time
+
+from loguru import logger
+
+from app.services.matching import MatchingService
+from app.services.pair_history import PairHistory
+
+
+def make_round(count: int, average_candidates: float = 3.0, seed: int = 42):
+    """Build a sparse synthetic candidate graph with city-like locality"""
+    rng = random.Random(seed)
+    users = [{'id': i + 1} for i in range(count)]
+    window = 200
+    users_with_candidates = []
+    
+    for position, user in enumerate(users):
+        degree = min(int(rng.expovariate(1 / average_candidates)), window)
+        candidates = set()
+        for _ in range(degree):
+            other = (position + rng.randint(-window, window)) % count
+            if other != position:
+                candidates.add(other)
+        users_with_candidates.append((user, [users[other] for other in sorted(candidates)]))
+    
+    history = PairHistory((rng.randint(1, count), rng.randint(1, count)) for _ in range(count))
+    return users_with_candidates, history
+
+
+def run(count: int):
+    users_with_candidates, history = make_round(count)
+    
+    for engine in ("greedy", "maximum"):
+        start = time.perf_counter()
+        matches, remaining = MatchingService.pair(users_with_candidates, history, engine=engine)
+        elapsed = time.perf_counter() - start
+        
+        print(
+            f"{count:>8} users  {engine:<8} {len(matches):>8} pairs  "
+            f"{len(remaining):>8} unmatched  {elapsed:8.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    logger.remove()
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    for size in sizes:
+        run(size)
@@ -12,6 +12,7 @@ from app.handlers import register_all_handlers
 from app.middlewares import setup_middlewares
 from app.commands import set_bot_commands
 from app.scheduler import Scheduler
+from app.services.outbox import OutboxWorker
 
 # Load environment variables
 load_dotenv()
@@ -44,6 +45,10 @@ async def main():
     scheduler = Scheduler(bot)
     scheduler.start()
     
+    # Start delivering queued notifications
+    outbox_worker = OutboxWorker(scheduler.notification_service)
+    outbox_worker.start()
+    
     # Start polling
     try:
         logger.info("Bot started successfully!")
@@ -51,6 +56,7 @@ async def main():
     finally:
         logger.info("Shutting down...")
         scheduler.shutdown()
+        await outbox_worker.stop()
         await close_pool()
         await bot.session.close()
 
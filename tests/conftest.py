@@ -0,0 +1,31 @@
+import asyncio
+
+import asyncpg
+import pytest
+from dotenv import load_dotenv
+
+# Load environment variables for testing
+load_dotenv(".env.test", override=True)
+
+from app.database.connection import create_pool, close_pool
+
+
+@pytest.fixture(scope="session")
+def event_loop():
+    """Create an event loop for the test session"""
+    loop = asyncio.get_event_loop_policy().new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+async def db_pool():
+    """Create a database pool for testing, skipping the test when PostgreSQL is unavailable"""
+    try:
+        pool = await create_pool()
+    except (OSError, asyncio.TimeoutError, asyncpg.PostgresError) as e:
+        await close_pool()
+        pytest.skip(f"PostgreSQL test database is not available: {e}")
+    
+    yield pool
+    await close_pool()
@@ -0,0 +1,100 @@
+import pytest
+import asyncio
+from time import monotonic
+from unittest.mock import AsyncMock, MagicMock
+
+from unittest.mock import patch
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+from app.services.dispatcher import NotificationDispatcher, is_unreachable_error
+from app.services.notification import NotificationService
+
+@pytest.mark.asyncio
+async def test_global_rate_limit():
+    """Test that sends never exceed the bucket rate after the initial burst"""
+    mock_bot = AsyncMock()
+    dispatcher = NotificationDispatcher(mock_bot, rate=50, chat_interval=0, concurrency=10)
+    
+    start = monotonic()
+    await dispatcher.run(lambda chat_id: dispatcher.send_message(chat_id, "hi"), range(100))
+    elapsed = monotonic() - start
+    
+    assert mock_bot.send_message.call_count == 100
+    # 50 messages fit in the initial burst, the other 50 need about a second
+    assert elapsed >= 0.9
+
+@pytest.mark.asyncio
+async def test_per_chat_spacing():
+    """Test that messages to one chat are spaced out"""
+    mock_bot = AsyncMock()
+    sent_at = []
+    mock_bot.send_message.side_effect = lambda **kwargs: sent_at.append(monotonic())
+    dispatcher = NotificationDispatcher(mock_bot, rate=1000, chat_interval=0.1, concurrency=5)
+    
+    await asyncio.gather(*[dispatcher.send_message(42, "hi") for _ in range(4)])
+    
+    gaps = [later - earlier for earlier, later in zip(sent_at, sent_at[1:])]
+    assert len(sent_at) == 4
+    assert min(gaps) >= 0.09
+
+@pytest.mark.asyncio
+async def test_retry_after_pauses_and_retries():
+    """Test that flood control errors are retried after the requested delay"""
+    mock_bot = AsyncMock()
+    mock_bot.send_message.side_effect = [
+        TelegramRetryAfter(method=MagicMock(), message="Flood control exceeded", retry_after=1),
+        "ok",
+    ]
+    dispatcher = NotificationDispatcher(mock_bot, rate=30, chat_interval=0, concurrency=1)
+    
+    start = monotonic()
+    result = await dispatcher.send_message(42, "hi")
+    
+    assert result == "ok"
+    assert monotonic() - start >= 0.9
+    assert mock_bot.send_message.call_count == 2
+    assert dispatcher.rate < dispatcher.max_rate
+
+@pytest.mark.asyncio
+async def test_run_consumes_async_iterables():
+    """Test that run pulls items from an async generator and counts successes"""
+    async def items():
+        for i in range(10):
+            yield i
+    
+    dispatcher = NotificationDispatcher(AsyncMock(), concurrency=3)
+    
+    async def handle(item):
+        if item == 3:
+            raise RuntimeError("boom")
+        return item % 2 == 0
+    
+    assert await dispatcher.run(handle, items()) == 5
+
+def test_is_unreachable_error():
+    """Test classifying send errors"""
+    method = MagicMock()
+    
+    assert is_unreachable_error(TelegramForbiddenError(method, "Forbidden: bot was blocked by the user"))
+    assert is_unreachable_error(TelegramBadRequest(method, "Bad Request: chat not found"))
+    assert not is_unreachable_error(TelegramBadRequest(method, "Bad Request: message is too long"))
+    assert not is_unreachable_error(TelegramRetryAfter(method, "Too Many Requests", 1))
+
+@pytest.mark.asyncio
+async def test_unreachable_chat_is_marked():
+    """Test that a blocked chat deactivates its user instead of raising"""
+    mock_bot = AsyncMock()
+    mock_bot.send_message.side_effect = TelegramForbiddenError(MagicMock(), "Forbidden: bot was blocked by the user")
+    notification_service = NotificationService(mock_bot)
+    
+    with patch("app.services.notification.UserRepository") as repository:
+        # Only the first failure changes the row
+        repository.mark_unreachable = AsyncMock(side_effect=[True, False])
+        
+        assert await notification_service._send(42, "hi") is None
+        assert await notification_service._send(42, "hi again") is None
+    
+    # Nothing is remembered in process, so a user who came back would get the second message
+    assert repository.mark_unreachable.await_count == 2
+    assert mock_bot.send_message.call_count == 2
@@ -0,0 +1,68 @@
+import pytest
+import random
+
+from app.services.geo_index import GeoGridIndex, has_location
+from app.services.matching import MatchingService
+from app.services.pair_history import PairHistory
+
+
+def make_users(count, seed=42):
+    """Generate users spread over a few cities, the poles and the antimeridian"""
+    rng = random.Random(seed)
+    centers = [(40.7128, -74.0060), (48.8566, 2.3522), (-36.8485, 174.7633),
+               (64.8378, -179.9), (89.5, 30.0), (-89.2, -100.0)]
+    users = []
+    
+    for i in range(count):
+        if rng.random() < 0.1:
+            lat, lon = None, None
+        else:
+            lat, lon = rng.choice(centers)
+            lat = max(min(lat + rng.uniform(-0.5, 0.5), 89.99), -89.99)
+            lon = (lon + rng.uniform(-0.8, 0.8) + 180) % 360 - 180
+        
+        users.append({
+            'id': i + 1,
+            'location_lat': lat,
+            'location_lon': lon,
+            'radius': rng.choice([1, 5, 10, 25, 50]),
+            'preferred_language': rng.choice(['en', 'ru']),
+            'interests': rng.sample(['coffee', 'python', 'testing', 'asyncio', 'music'], 2),
+        })
+    
+    return users
+
+def test_nearby_is_superset_of_users_within_radius():
+    """Test that the grid never drops a user that is within the radius"""
+    users = make_users(400)
+    index = GeoGridIndex(users)
+    
+    for user in users:
+        nearby_ids = {candidate['id'] for candidate in index.nearby(user)}
+        
+        for candidate in users:
+            if not has_location(user) or not has_location(candidate):
+                assert candidate['id'] in nearby_ids
+                continue
+            
+            distance = MatchingService._calculate_distance(
+                user['location_lat'], user['location_lon'],
+                candidate['location_lat'], candidate['location_lon']
+            )
+            if distance <= user['radius']:
+                assert candidate['id'] in nearby_ids
+
+@pytest.mark.asyncio
+async def test_indexed_candidates_match_full_scan():
+    """Test that candidate generation with the grid matches the full scan"""
+    users = make_users(300, seed=7)
+    history = PairHistory([(1, 2), (3, 4), (5, 6)])
+    index = GeoGridIndex(users)
+    
+    for user in users:
+        expected = await MatchingService.get_available_candidates(user['id'], users, history=history)
+        actual = await MatchingService.get_available_candidates(
+            user['id'], users, history=history, geo_index=index
+        )
+        
+        assert [c['id'] for c in actual] == [c['id'] for c in expected]
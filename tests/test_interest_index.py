@@ -0,0 +1,52 @@
+import pytest
+
+from app.services.geo_index import GeoGridIndex
+from app.services.interest_index import InterestIndex
+from app.services.matching import MatchingService
+from app.services.pair_history import PairHistory
+from tests.test_geo_index import make_users
+
+USERS = [
+    {'id': 1, 'interests': ['coffee', 'python']},
+    {'id': 2, 'interests': ['python', 'python']},
+    {'id': 3, 'interests': ['music']},
+    {'id': 4, 'interests': []},
+]
+
+def test_vocabulary_and_masks():
+    """Test interest encoding into bitmasks"""
+    index = InterestIndex(USERS)
+    
+    assert index.vocabulary == {'coffee': 0, 'python': 1, 'music': 2}
+    assert index.masks == [0b011, 0b010, 0b100, 0]
+    assert index.encode(['music', 'unknown']) == 0b100
+
+def test_posting_list_lookups():
+    """Test candidate lookups through the inverted index"""
+    index = InterestIndex(USERS)
+    
+    assert [u['id'] for u in index.candidates(USERS[0])] == [1, 2]
+    assert [u['id'] for u in index.candidates(USERS[3])] == []
+    assert [u['id'] for u in index.users_with_any(['music', 'coffee'])] == [1, 3]
+    assert index.overlaps(USERS[0], USERS[1])
+    assert not index.overlaps(USERS[1], USERS[2])
+
+@pytest.mark.asyncio
+async def test_indexed_candidates_match_full_scan():
+    """Test that candidate generation with both indexes matches the full scan"""
+    users = make_users(300, seed=11)
+    history = PairHistory([(1, 2), (7, 8)])
+    geo_index = GeoGridIndex(users)
+    interest_index = InterestIndex(users)
+    
+    for user in users:
+        expected = await MatchingService.get_available_candidates(user['id'], users, history=history)
+        by_interest = await MatchingService.get_available_candidates(
+            user['id'], users, history=history, interest_index=interest_index
+        )
+        by_both = await MatchingService.get_available_candidates(
+            user['id'], users, history=history, geo_index=geo_index, interest_index=interest_index
+        )
+        
+        assert [c['id'] for c in by_interest] == [c['id'] for c in expected]
+        assert [c['id'] for c in by_both] == [c['id'] for c in expected]
@@ -0,0 +1,59 @@
+import pytest
+import asyncio
+
+from app.database.repositories.loader import DataLoader
+
+
+def make_loader(calls, **kwargs):
+    async def batch_fn(keys):
+        calls.append(sorted(keys))
+        await asyncio.sleep(0.01)
+        return {key: f"value-{key}" for key in keys if key >= 0}
+    
+    return DataLoader(batch_fn, **kwargs)
+
+@pytest.mark.asyncio
+async def test_same_tick_requests_are_batched():
+    """Test that concurrent loads become one batch call"""
+    calls = []
+    loader = make_loader(calls)
+    
+    results = await asyncio.gather(*[loader.load(key) for key in [3, 1, 2, -1]])
+    
+    assert results == ["value-3", "value-1", "value-2", None]
+    assert calls == [[-1, 1, 2, 3]]
+
+@pytest.mark.asyncio
+async def test_duplicate_and_in_flight_requests_share_a_future():
+    """Test that repeated keys are only loaded once while pending"""
+    calls = []
+    loader = make_loader(calls)
+    
+    first = asyncio.ensure_future(loader.load(1))
+    await asyncio.sleep(0)
+    
+    # The first batch is now running; the same key joins it
+    results = await asyncio.gather(first, loader.load(1), loader.load(1))
+    
+    assert results == ["value-1"] * 3
+    assert calls == [[1]]
+    
+    # Once resolved nothing is cached
+    await loader.load(1)
+    assert calls == [[1], [1]]
+
+@pytest.mark.asyncio
+async def test_batches_are_split_and_errors_shared():
+    """Test the batch size limit and error propagation"""
+    calls = []
+    loader = make_loader(calls, max_batch_size=2)
+    
+    assert await loader.load_many([1, 2, 3]) == ["value-1", "value-2", "value-3"]
+    assert calls == [[1, 2], [3]]
+    
+    async def failing(keys):
+        raise RuntimeError("database down")
+    
+    loader = DataLoader(failing)
+    results = await asyncio.gather(loader.load(1), loader.load(2), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.database.models import UserCreate
+from app.database.repositories import MatchRepository, UserRepository
+from app.database.repositories.match_repository import for_participant
+
+TELEGRAM_IDS = [556000001, 556000002, 556000003, 556000004]
+STATUSES = ["missed", "cancelled", "missed", "completed", "pending", "missed", "completed", "cancelled"]
+
+# The single OR-predicate queries the per-participant branches replaced
+OR_MATCHES = "SELECT * FROM matches WHERE (user1_id = $1 OR user2_id = $1) ORDER BY created_at DESC"
+OR_MATCHES_BY_STATUS = "SELECT * FROM matches WHERE (user1_id = $1 OR user2_id = $1) AND status = $2 ORDER BY created_at DESC"
+OR_HISTORY = "SELECT * FROM match_history WHERE user1_id = $1 OR user2_id = $1 ORDER BY match_date DESC"
+OR_RECENT = "SELECT id, status FROM matches WHERE (user1_id = $1 OR user2_id = $1) ORDER BY created_at DESC LIMIT 10"
+OR_STATS = '''
+    SELECT COUNT(*) AS total,
+           COUNT(*) FILTER (WHERE status = 'completed') AS completed,
+           COUNT(*) FILTER (WHERE status IN ('missed', 'cancelled')) AS missed,
+           COUNT(*) FILTER (WHERE status = 'pending') AS pending
+    FROM matches
+    WHERE user1_id = $1 OR user2_id = $1
+'''
+
+
+@pytest.fixture
+async def match_rows(db_pool):
+    """Create users with more matches and history each than count_missed_matches looks at"""
+    async with db_pool.acquire() as conn:
+        await conn.execute("DELETE FROM users WHERE telegram_id = ANY($1::bigint[])", TELEGRAM_IDS)
+    UserRepository.clear_cache()
+    
+    user_ids = [
+        await UserRepository.create_user(UserCreate(telegram_id=telegram_id, full_name=f"Participant {telegram_id}"))
+        for telegram_id in TELEGRAM_IDS
+    ]
+    
+    # Every ordered pair several times over, so each branch alone holds more than
+    # ten rows, plus a self-match that both branches would otherwise return
+    pairs = [(a, b) for a in user_ids for b in user_ids if a != b] * 4 + [(user_ids[0], user_ids[0])]
+    now = datetime.now(timezone.utc)
+    
+    async with db_pool.acquire() as conn:
+        for i, (user1_id, user2_id) in enumerate(pairs):
+            await conn.execute('''
+                INSERT INTO matches (user1_id, user2_id, status, created_at) VALUES ($1, $2, $3, $4)
+            ''', user1_id, user2_id, STATUSES[i % len(STATUSES)], now - timedelta(hours=i))
+            await conn.execute('''
+                INSERT INTO match_history (user1_id, user2_id, status, match_date) VALUES ($1, $2, $3, $4)
+            ''', user1_id, user2_id, STATUSES[i % len(STATUSES)], now - timedelta(hours=3 * i))
+    
+    yield user_ids
+    
+    async with db_pool.acquire() as conn:
+        await conn.execute("DELETE FROM users WHERE telegram_id = ANY($1::bigint[])", TELEGRAM_IDS)
+    UserRepository.clear_cache()
+
+
+@pytest.mark.asyncio
+async def test_user_matches_match_or_query(db_pool, match_rows):
+    """Test that the participant branches return the same matches in the same order"""
+    async with db_pool.acquire() as conn:
+        for user_id in match_rows:
+            expected = await conn.fetch(OR_MATCHES, user_id)
+            matches = await MatchRepository.get_user_matches(user_id)
+            
+            assert [dict(match) for match in matches] == [dict(match) for match in expected]
+            
+            for status in ("missed", "completed", "pending"):
+                expected = await conn.fetch(OR_MATCHES_BY_STATUS, user_id, status)
+                matches = await MatchRepository.get_user_matches(user_id, status)
+                
+                assert [match['id'] for match in matches] == [match['id'] for match in expected]
+
+
+@pytest.mark.asyncio
+async def test_match_history_matches_or_query(db_pool, match_rows):
+    """Test that history is returned once per entry, newest first"""
+    async with db_pool.acquire() as conn:
+        for user_id in match_rows:
+            expected = await conn.fetch(OR_HISTORY, user_id)
+            history = await MatchRepository.get_match_history(user_id)
+            
+            assert [dict(entry) for entry in history] == [dict(entry) for entry in expected]
+
+
+@pytest.mark.asyncio
+async def test_recent_matches_respect_limit(db_pool, match_rows):
+    """Test that pushing the LIMIT into each branch keeps the overall newest ten"""
+    query = f'''
+        SELECT id, status FROM (
+            {for_participant('id, status, created_at', 'matches', tail=' ORDER BY created_at DESC LIMIT 10')}
+        ) AS recent
+        ORDER BY created_at DESC
+        LIMIT 10
+    '''
+    
+    async with db_pool.acquire() as conn:
+        for user_id in match_rows:
+            expected = await conn.fetch(OR_RECENT, user_id)
+            recent = await conn.fetch(query, user_id)
+            
+            assert len(expected) == 10
+            assert [tuple(row) for row in recent] == [tuple(row) for row in expected]
+            
+            # The streak is read off the same rows
+            streak = 0
+            for row in expected:
+                if row['status'] not in ('missed', 'cancelled'):
+                    break
+                streak += 1
+            
+            assert await MatchRepository.count_missed_matches(user_id) == streak
+
+
+@pytest.mark.asyncio
+async def test_match_stats_match_or_query(db_pool, match_rows, monkeypatch):
+    """Test the aggregate fallback against the OR query"""
+    monkeypatch.setenv("MATCH_STATS_COUNTERS", "false")
+    
+    async with db_pool.acquire() as conn:
+        for user_id in match_rows:
+            expected = await conn.fetchrow(OR_STATS, user_id)
+            
+            assert await MatchRepository.get_match_stats(user_id) == dict(expected)
@@ -0,0 +1,74 @@
+import pytest
+
+from app.services.geo_index import GeoGridIndex, has_location
+from app.services.matching import MatchingService
+from app.services.matching_kernel import CandidateKernel, numpy_available
+from app.services.pair_history import PairHistory
+from tests.test_geo_index import make_users
+
+pytestmark = pytest.mark.skipif(not numpy_available(), reason="NumPy is not installed")
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("block_size", [1, 37, 1 << 22])
+@pytest.mark.parametrize("grid", [False, True])
+async def test_vectorized_candidates_match_reference(block_size, grid):
+    """Test that the NumPy kernel agrees with the pure Python implementation, with and without the grid"""
+    users = make_users(250, seed=3)
+    history = PairHistory([(1, 2), (2, 3), (10, 11)])
+    
+    kernel = CandidateKernel(users, block_size=block_size)
+    results = list(kernel.iter_candidates(GeoGridIndex(users) if grid else None))
+    
+    # Every user comes out exactly once
+    assert sorted(position for position, _ in results) == list(range(len(users)))
+    
+    for position, candidate_positions in results:
+        user = users[position]
+        expected = await MatchingService.get_available_candidates(user['id'], users, history=PairHistory())
+        
+        assert [users[p]['id'] for p in candidate_positions] == [c['id'] for c in expected]
+    
+    # History exclusion is applied on top of the kernel
+    for user, candidates in MatchingService.get_vectorized_candidates(users, history):
+        expected = await MatchingService.get_available_candidates(user['id'], users, history=history)
+        
+        assert [c['id'] for c in candidates] == [c['id'] for c in expected]
+
+def test_interest_bitsets_span_multiple_words():
+    """Test that more than 64 distinct interests are encoded correctly"""
+    users = [
+        {'id': i, 'location_lat': None, 'location_lon': None, 'radius': 10,
+         'preferred_language': 'en', 'interests': [f"interest-{i}", "shared" if i % 2 else f"only-{i}"]}
+        for i in range(100)
+    ]
+    
+    kernel = CandidateKernel(users)
+    candidates = dict(kernel.iter_candidates())
+    
+    assert kernel.interests.shape[1] > 1
+    assert candidates[1] == [p for p in range(1, 100, 2) if p != 1]
+    assert candidates[0] == []
+
+def test_grid_neighbourhoods_cover_every_reachable_user():
+    """Test that a cell's neighbourhood holds everyone within any of its users' radii"""
+    users = make_users(600, seed=11)
+    index = GeoGridIndex(users)
+    covered = set()
+    
+    for positions, neighbourhood in index.cell_neighbourhoods():
+        covered.update(positions)
+        reachable = set(neighbourhood)
+        
+        for position in positions:
+            user = users[position]
+            for other, candidate in enumerate(users):
+                if not has_location(candidate):
+                    assert other in reachable
+                elif MatchingService._calculate_distance(
+                    user['location_lat'], user['location_lon'],
+                    candidate['location_lat'], candidate['location_lon']
+                ) <= user['radius']:
+                    assert other in reachable
+    
+    # Every located user is in some cell
+    assert covered == {p for p, user in enumerate(users) if has_location(user)}
@@ -0,0 +1,40 @@
+import pytest
+import random
+
+from app.services.matching import MatchingService, compute_matches
+from app.services.matching_kernel import numpy_available
+from app.services.pair_history import PairHistory
+from tests.test_geo_index import make_users
+
+def make_history(users, count, seed=5):
+    """Generate random previous pairs between users"""
+    rng = random.Random(seed)
+    ids = [user['id'] for user in users]
+    return PairHistory((rng.choice(ids), rng.choice(ids)) for _ in range(count))
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", ["python", "numpy"])
+@pytest.mark.parametrize("engine", ["greedy", "maximum"])
+async def test_partitioned_matches_equal_serial(backend, engine):
+    """Test that partitioned matching reproduces the serial result"""
+    if backend == "numpy" and not numpy_available():
+        pytest.skip("NumPy is not installed")
+    
+    users = make_users(400, seed=21)
+    random.Random(1).shuffle(users)
+    history = make_history(users, 300)
+    
+    serial = compute_matches(users, history, backend, engine)
+    partitioned = await MatchingService.compute_partitioned(users, history, backend, workers=2, engine=engine)
+    
+    assert serial
+    assert partitioned == serial
+
+def test_partition_users_by_language():
+    """Test that partitions never mix languages and cover every user"""
+    users = make_users(200, seed=2)
+    partitions = MatchingService.partition_users(users)
+    
+    assert sorted(p for positions in partitions for p in positions) == list(range(len(users)))
+    for positions in partitions:
+        assert len({users[p]['preferred_language'] for p in positions}) == 1
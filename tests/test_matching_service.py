@@ -7,10 +7,10 @@ from dotenv import load_dotenv
 # Load environment variables for testing
 load_dotenv(".env.test", override=True)
 
-from app.database.connection import create_pool, close_pool
 from app.database.repositories import UserRepository, MatchRepository
-from app.database.models import UserCreate
+from app.database.models import UserCreate, MatchUpdate, MatchingUser
 from app.services.matching import MatchingService
+from app.services.pair_history import PairHistory
 
 # Test data
 TEST_USERS = [
@@ -52,21 +52,7 @@ TEST_USERS = [
     )
 ]
 
-@pytest.fixture(scope="session")
-def event_loop():
-    """Create an event loop for the test session"""
-    loop = asyncio.get_event_loop_policy().new_event_loop()
-    yield loop
-    loop.close()
-
-@pytest.fixture(scope="session")
-async def db_pool():
-    """Create a database pool for testing"""
-    pool = await create_pool()
-    yield pool
-    await close_pool()
-
-@pytest.fixture(async_generator)
+@pytest.fixture
 async def clean_db(db_pool):
     """Clean the database before and after tests"""
     async with db_pool.acquire() as conn:
@@ -78,6 +64,9 @@ async def clean_db(db_pool):
         await conn.execute("DELETE FROM matches")
         await conn.execute("DELETE FROM match_history")
     
+    # Rows were deleted behind the repository's back
+    UserRepository.clear_cache()
+    
     yield
     
     async with db_pool.acquire() as conn:
@@ -102,22 +91,36 @@ async def create_test_users(clean_db):
 @pytest.mark.asyncio
 async def test_get_active_users_for_matching(create_test_users):
     """Test getting active users for matching"""
-    # Mock the count_missed_matches method to always return 0
-    with patch.object(MatchRepository, 'count_missed_matches', return_value=0):
+    user_ids = create_test_users
+    
+    # Mock the get_missed_streaks method to report no missed streaks
+    with patch.object(MatchRepository, 'get_missed_streaks', return_value={}):
         users = await MatchingService.get_active_users_for_matching()
         
         # Verify all test users are included
         assert len(users) >= len(TEST_USERS)
         
-        # Verify our test users are in the active users
-        test_telegram_ids = [user.telegram_id for user in TEST_USERS]
-        found_count = 0
+        # Verify our test users are in the active users with their matching fields
+        users_by_id = {user['id']: user for user in users}
+        
+        for user_id, test_user in zip(user_ids, TEST_USERS):
+            assert users_by_id[user_id]['preferred_language'] == test_user.preferred_language
+            assert list(users_by_id[user_id]['interests']) == test_user.interests
+
+@pytest.mark.asyncio
+async def test_get_active_users_for_matching_excludes_missed(create_test_users):
+    """Test that users with a long missed streak are excluded from matching"""
+    user_ids = create_test_users
+    
+    # Report a streak above MAX_MISSED_MATCHES for the first test user only
+    with patch.object(MatchRepository, 'get_missed_streaks', return_value={user_ids[0]: 3}):
+        users = await MatchingService.get_active_users_for_matching()
         
-        for user in users:
-            if user['telegram_id'] in test_telegram_ids:
-                found_count += 1
+        eligible_ids = [user['id'] for user in users]
         
-        assert found_count == len(TEST_USERS)
+        assert user_ids[0] not in eligible_ids
+        assert user_ids[1] in eligible_ids
+        assert user_ids[2] in eligible_ids
 
 @pytest.mark.asyncio
 async def test_get_available_candidates(create_test_users):
@@ -154,17 +157,17 @@ async def test_create_matches(create_test_users):
     # Mock the necessary methods
     with patch.object(MatchingService, 'get_active_users_for_matching') as mock_get_users, \
          patch.object(MatchingService, 'get_available_candidates') as mock_get_candidates, \
-         patch.object(MatchRepository, 'get_previous_matches', return_value=[]):
+         patch.object(PairHistory, 'load', return_value=PairHistory()):
         
         # Get all users
         users = await UserRepository.get_active_users()
         test_users = [user for user in users if user['telegram_id'] in [u.telegram_id for u in TEST_USERS]]
         
-        # Setup mocks
-        mock_get_users.return_value = test_users
+        # Setup mocks; matching runs on snapshots, which unlike rows can be sent to worker processes
+        mock_get_users.return_value = [MatchingUser.from_row(user) for user in test_users]
         
         # Mock get_available_candidates to return all other users
-        def mock_get_candidates_impl(user_id, all_users):
+        def mock_get_candidates_impl(user_id, all_users, **kwargs):
             return [u for u in all_users if u['id'] != user_id]
         
         mock_get_candidates.side_effect = mock_get_candidates_impl
@@ -206,4 +209,38 @@ async def test_save_matches(create_test_users):
     assert match is not None
     assert match['user1_id'] == test_users[0]['id']
     assert match['user2_id'] == test_users[1]['id']
-    assert match['status'] == 'pending'
\ No newline at end of file
+    assert match['status'] == 'pending'
+@pytest.mark.asyncio
+async def test_save_matches_bulk_order(create_test_users):
+    """Test that a bulk save returns IDs in the order of the matches"""
+    user_ids = create_test_users
+    
+    test_matches = [
+        (user_ids[0], user_ids[1]),
+        (user_ids[1], user_ids[2]),
+        (user_ids[0], user_ids[2]),
+    ]
+    
+    match_ids = await MatchingService.save_matches(test_matches)
+    
+    assert len(match_ids) == len(test_matches)
+    
+    for match_id, (user1_id, user2_id) in zip(match_ids, test_matches):
+        match = await MatchRepository.get_match_by_id(match_id)
+        assert match['user1_id'] == user1_id
+        assert match['user2_id'] == user2_id
+
+@pytest.mark.asyncio
+async def test_match_stats_follow_status_changes(create_test_users):
+    """Test that the per-user counters track match creation and status updates"""
+    user_ids = create_test_users
+    
+    match_ids = await MatchingService.save_matches([(user_ids[0], user_ids[1]), (user_ids[0], user_ids[2])])
+    await MatchRepository.update_match(match_ids[0], MatchUpdate(status="completed"))
+    
+    stats = await MatchRepository.get_match_stats(user_ids[0])
+    assert stats == {"total": 2, "completed": 1, "missed": 0, "pending": 1}
+    
+    # Rebuilding from the matches table gives the same numbers
+    await MatchRepository.rebuild_match_stats()
+    assert await MatchRepository.get_match_stats(user_ids[0]) == stats
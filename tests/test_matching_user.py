@@ -0,0 +1,44 @@
+import pickle
+import pytest
+
+from app.database.models import MatchingUser
+from app.services.matching import MatchingService, compute_matches
+from tests.test_geo_index import make_users
+from tests.test_matching_partitions import make_history
+
+
+def test_matching_user_reads_like_a_row():
+    """Test field access by key and by attribute"""
+    user = MatchingUser.from_row({
+        'id': 7, 'location_lat': 48.85, 'location_lon': 2.35, 'radius': 10,
+        'preferred_language': 'en', 'interests': ['coffee', 'python'],
+    })
+    
+    assert user['id'] == user.id == 7
+    assert user['interests'] == ('coffee', 'python')
+    assert not hasattr(user, '__dict__')
+    
+    # Fields left out of the snapshot behave like missing keys
+    with pytest.raises(KeyError):
+        user['bio']
+
+def test_matching_user_round_trips_through_pickle():
+    """Test that snapshots can be sent to worker processes"""
+    user = MatchingUser(3, None, None, 5, 'ru', None)
+    copy = pickle.loads(pickle.dumps(user))
+    
+    assert [copy[field] for field in MatchingUser.__slots__] == [3, None, None, 5, 'ru', ()]
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("engine", ["greedy", "maximum"])
+async def test_snapshots_match_like_rows(engine):
+    """Test that matching on snapshots gives the same pairs as on row dicts"""
+    rows = make_users(300, seed=8)
+    users = [MatchingUser.from_row(row) for row in rows]
+    history = make_history(rows, 200)
+    
+    expected = compute_matches(rows, history, "python", engine)
+    
+    assert expected
+    assert compute_matches(users, history, "python", engine) == expected
+    assert await MatchingService.compute_partitioned(users, history, "python", workers=2, engine=engine) == expected
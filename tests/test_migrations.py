@@ -0,0 +1,140 @@
+import asyncio
+import os
+import sys
+
+import asyncpg
+import pytest
+from unittest.mock import AsyncMock
+
+from app.database.migrations import MIGRATIONS, latest_version, run_migrations
+
+
+def test_versions_are_unique_and_ordered():
+    """Test that migration versions increase without gaps"""
+    versions = [migration.version for migration in MIGRATIONS]
+    assert versions == list(range(1, len(MIGRATIONS) + 1))
+    assert latest_version() == versions[-1]
+
+
+def test_concurrent_migrations_only_create_indexes_concurrently():
+    """Test that statements run outside a transaction are named concurrent index builds"""
+    for migration in MIGRATIONS:
+        if not migration.concurrent:
+            continue
+        for name, statement in migration.statements:
+            assert "CONCURRENTLY" in statement
+            assert name in statement
+
+
+@pytest.mark.asyncio
+async def test_current_schema_runs_no_ddl():
+    """Test that nothing but the version check runs when the schema is current"""
+    conn = AsyncMock()
+    conn.fetchval.side_effect = [True, latest_version()]
+
+    assert await run_migrations(conn) == (latest_version(), latest_version())
+    conn.execute.assert_not_awaited()
+
+
+# Runs the same startup path as bot.py and run_webapp.py in a fresh process
+INIT_DB = '''
+import asyncio
+from app.database.connection import create_pool, close_pool
+
+async def main():
+    await create_pool()
+    await close_pool()
+
+asyncio.run(main())
+'''
+
+
+@pytest.fixture
+async def scratch_db(db_pool):
+    """Create an empty database, named after the test one, for a migration run from scratch"""
+    name = f"{os.getenv('DB_NAME', 'coffee_bot')}_migrations"
+
+    async with db_pool.acquire() as conn:
+        await conn.execute(f'DROP DATABASE IF EXISTS {name} WITH (FORCE)')
+        await conn.execute(f'CREATE DATABASE {name}')
+
+    yield name
+
+    async with db_pool.acquire() as conn:
+        await conn.execute(f'DROP DATABASE IF EXISTS {name} WITH (FORCE)')
+
+
+async def start_twice(database: str):
+    """Initialise a database from two processes at once and check both started"""
+    env = {**os.environ, "DB_NAME": database}
+
+    processes = [
+        await asyncio.create_subprocess_exec(
+            sys.executable, "-c", INIT_DB, env=env,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+        )
+        for _ in range(2)
+    ]
+    outputs = await asyncio.gather(*[process.communicate() for process in processes])
+
+    for process, (output, _) in zip(processes, outputs):
+        assert process.returncode == 0, output.decode()
+
+
+async def connect(database: str) -> asyncpg.Connection:
+    """Connect to another database on the test server"""
+    return await asyncpg.connect(
+        host=os.getenv("DB_HOST", "localhost"),
+        port=int(os.getenv("DB_PORT", "5432")),
+        database=database,
+        user=os.getenv("DB_USER", "postgres"),
+        password=os.getenv("DB_PASSWORD", "postgres")
+    )
+
+
+@pytest.mark.asyncio
+async def test_concurrent_startups_both_migrate(scratch_db):
+    """Test that two processes initialising an empty database at once both succeed"""
+    await start_twice(scratch_db)
+
+    conn = await connect(scratch_db)
+    try:
+        assert await conn.fetchval('SELECT MAX(version) FROM schema_version') == latest_version()
+    finally:
+        await conn.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_startups_backfill_stats_once(scratch_db):
+    """Test that the counters of existing matches are filled once, by the migrating process"""
+    await start_twice(scratch_db)
+
+    # Matches from before the counters existed
+    conn = await connect(scratch_db)
+    try:
+        user_ids = [
+            await conn.fetchval(
+                "INSERT INTO users (telegram_id, full_name) VALUES ($1, $2) RETURNING id", telegram_id, "Counted"
+            )
+            for telegram_id in (1, 2)
+        ]
+        for status in ("completed", "missed", "pending"):
+            await conn.execute(
+                "INSERT INTO matches (user1_id, user2_id, status) VALUES ($1, $2, $3)", *user_ids, status
+            )
+        await conn.execute('DELETE FROM user_match_stats')
+        await conn.execute('DELETE FROM schema_version WHERE version = 5')
+    finally:
+        await conn.close()
+
+    await start_twice(scratch_db)
+
+    conn = await connect(scratch_db)
+    try:
+        stats = await conn.fetch('SELECT * FROM user_match_stats ORDER BY user_id')
+        assert [dict(row) for row in stats] == [
+            {"user_id": user_id, "total": 3, "completed": 1, "missed": 1, "pending": 1}
+            for user_id in user_ids
+        ]
+    finally:
+        await conn.close()
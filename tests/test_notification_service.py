@@ -2,15 +2,19 @@ import pytest
 import asyncio
 from unittest.mock import patch, MagicMock, AsyncMock
 import os
+import json
 from dotenv import load_dotenv
 
 # Load environment variables for testing
 load_dotenv(".env.test", override=True)
 
-from app.database.connection import create_pool, close_pool
+from app.database.connection import get_pool
 from app.database.repositories import UserRepository, MatchRepository
 from app.database.models import UserCreate, MatchCreate
 from app.services.notification import NotificationService
+from app.services.outbox import OutboxService
+from app.handlers.base import cmd_start
+from aiogram.exceptions import TelegramForbiddenError
 
 # Test data
 TEST_USERS = [
@@ -40,21 +44,7 @@ TEST_USERS = [
     )
 ]
 
-@pytest.fixture(scope="session")
-def event_loop():
-    """Create an event loop for the test session"""
-    loop = asyncio.get_event_loop_policy().new_event_loop()
-    yield loop
-    loop.close()
-
-@pytest.fixture(scope="session")
-async def db_pool():
-    """Create a database pool for testing"""
-    pool = await create_pool()
-    yield pool
-    await close_pool()
-
-@pytest.fixture(async_generator)
+@pytest.fixture
 async def clean_db(db_pool):
     """Clean the database before and after tests"""
     async with db_pool.acquire() as conn:
@@ -65,6 +55,10 @@ async def clean_db(db_pool):
         # Also clean up matches
         await conn.execute("DELETE FROM matches")
         await conn.execute("DELETE FROM match_history")
+        await conn.execute("DELETE FROM notification_outbox")
+    
+    # Rows were deleted behind the repository's back
+    UserRepository.clear_cache()
     
     yield
     
@@ -105,9 +99,11 @@ async def create_test_match(create_test_users):
     return match_id
 
 @pytest.mark.asyncio
-async def test_notify_match(create_test_match):
-    """Test notifying users about a match"""
+async def test_notify_match_user(create_test_match):
+    """Test notifying one participant about a match"""
     match_id = create_test_match
+    match = await MatchRepository.get_match_by_id(match_id)
+    user = await UserRepository.get_user_by_id(match['user1_id'])
     
     # Create mock bot
     mock_bot = AsyncMock()
@@ -116,14 +112,14 @@ async def test_notify_match(create_test_match):
     # Create notification service
     notification_service = NotificationService(mock_bot)
     
-    # Notify match
-    result = await notification_service.notify_match(match_id)
+    # Notify the first participant only
+    result = await notification_service.notify_match_user(match_id, user['id'])
     
     # Verify result
     assert result is True
     
-    # Verify bot.send_message was called twice (once for each user)
-    assert mock_bot.send_message.call_count == 2
+    mock_bot.send_message.assert_awaited_once()
+    assert mock_bot.send_message.await_args.kwargs['chat_id'] == user['telegram_id']
 
 @pytest.mark.asyncio
 async def test_notify_match_status_accepted(create_test_match):
@@ -140,14 +136,15 @@ async def test_notify_match_status_accepted(create_test_match):
     # Create notification service
     notification_service = NotificationService(mock_bot)
     
-    # Notify match status
-    result = await notification_service.notify_match_status(match_id, "accepted", match['user1_id'])
+    # Notify the other user that user 1 accepted
+    result = await notification_service.notify_match_status_user(match_id, "accepted", match['user2_id'])
     
     # Verify result
     assert result is True
     
     # Verify bot.send_message was called once (for the other user)
     assert mock_bot.send_message.call_count == 1
+    assert mock_bot.send_message.await_args.kwargs['chat_id'] == TEST_USERS[1].telegram_id
 
 @pytest.mark.asyncio
 async def test_notify_match_status_declined(create_test_match):
@@ -164,19 +161,21 @@ async def test_notify_match_status_declined(create_test_match):
     # Create notification service
     notification_service = NotificationService(mock_bot)
     
-    # Notify match status
-    result = await notification_service.notify_match_status(match_id, "declined", match['user1_id'])
+    # Notify the other user that user 1 declined
+    result = await notification_service.notify_match_status_user(match_id, "declined", match['user2_id'])
     
     # Verify result
     assert result is True
     
     # Verify bot.send_message was called once (for the other user)
     assert mock_bot.send_message.call_count == 1
+    assert mock_bot.send_message.await_args.kwargs['chat_id'] == TEST_USERS[1].telegram_id
 
 @pytest.mark.asyncio
 async def test_notify_match_status_completed(create_test_match):
     """Test notifying users about match completion"""
     match_id = create_test_match
+    match = await MatchRepository.get_match_by_id(match_id)
     
     # Create mock bot
     mock_bot = AsyncMock()
@@ -185,32 +184,159 @@ async def test_notify_match_status_completed(create_test_match):
     # Create notification service
     notification_service = NotificationService(mock_bot)
     
-    # Notify match status
-    result = await notification_service.notify_match_status(match_id, "completed")
-    
-    # Verify result
-    assert result is True
+    # Completion is queued for both participants
+    for user_id in (match['user1_id'], match['user2_id']):
+        assert await notification_service.notify_match_status_user(match_id, "completed", user_id) is True
     
     # Verify bot.send_message was called twice (once for each user)
     assert mock_bot.send_message.call_count == 2
 
 @pytest.mark.asyncio
-async def test_send_reminder(create_test_match):
-    """Test sending reminders"""
+async def test_notify_match_status_user(create_test_match):
+    """Test notifying a single participant about a status change"""
     match_id = create_test_match
+    match = await MatchRepository.get_match_by_id(match_id)
     
     # Create mock bot
     mock_bot = AsyncMock()
     mock_bot.send_message = AsyncMock()
     
-    # Create notification service
     notification_service = NotificationService(mock_bot)
     
-    # Send reminder
-    result = await notification_service.send_reminder(match_id)
+    # User 1 hears that User 2 accepted
+    assert await notification_service.notify_match_status_user(match_id, "accepted", match['user1_id']) is True
     
-    # Verify result
-    assert result is True
+    assert mock_bot.send_message.call_count == 1
+    kwargs = mock_bot.send_message.await_args.kwargs
+    assert kwargs['chat_id'] == TEST_USERS[0].telegram_id
+    assert "User Two" in kwargs['text']
+
+@pytest.mark.asyncio
+async def test_both_acceptances_are_queued(create_test_match):
+    """Test that each participant's acceptance queues a notification for the other"""
+    match_id = create_test_match
+    match = await MatchRepository.get_match_by_id(match_id)
     
-    # Verify bot.send_message was called twice (once for each user)
-    assert mock_bot.send_message.call_count == 2
\ No newline at end of file
+    assert await OutboxService.update_match_status(match_id, "accepted", match['user1_id']) is True
+    assert await OutboxService.update_match_status(match_id, "accepted", match['user2_id']) is True
+    
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch('''
+            SELECT payload FROM notification_outbox WHERE kind = 'match_status_user' ORDER BY id
+        ''')
+    
+    recipients = [json.loads(row['payload'])['user_id'] for row in rows]
+    assert recipients == [match['user2_id'], match['user1_id']]
+
+@pytest.mark.asyncio
+async def test_blocked_user_is_notified_after_start(create_test_match):
+    """Test that a user who blocked the bot and came back with /start gets messages again"""
+    match_id = create_test_match
+    match = await MatchRepository.get_match_by_id(match_id)
+    
+    # The first user has blocked the bot
+    mock_bot = AsyncMock()
+    mock_bot.send_message = AsyncMock(side_effect=[
+        TelegramForbiddenError(MagicMock(), "Forbidden: bot was blocked by the user"),
+        MagicMock()
+    ])
+    notification_service = NotificationService(mock_bot)
+    
+    assert await notification_service.notify_match_user(match_id, match['user1_id']) is True
+    user = await UserRepository.get_user_by_id(match['user1_id'])
+    assert user['unreachable_since'] is not None
+    assert user['is_active'] is False
+    
+    # They unblock the bot and send /start
+    message = AsyncMock()
+    message.from_user.id = user['telegram_id']
+    await cmd_start(message, AsyncMock(), user)
+    
+    # The same long-lived service reaches them again
+    assert await notification_service.notify_match_user(match_id, match['user1_id']) is True
+    assert mock_bot.send_message.call_count == 2
+    assert mock_bot.send_message.await_args.kwargs['chat_id'] == user['telegram_id']
+    
+    user = await UserRepository.get_user_by_id(match['user1_id'])
+    assert user['unreachable_since'] is None
+    assert user['is_active'] is True
+
+@pytest.mark.asyncio
+async def test_iter_pending_reminders(create_test_match):
+    """Test streaming reminder rows and sending them"""
+    match_id = create_test_match
+    
+    # One row per participant, each naming the other one
+    rows = [row async for row in MatchRepository.iter_pending_reminders() if row['match_id'] == match_id]
+    assert len(rows) == 2
+    assert {row['partner_full_name'] for row in rows} == {"User One", "User Two"}
+    
+    # Create mock bot
+    mock_bot = AsyncMock()
+    mock_bot.send_message = AsyncMock()
+    
+    notification_service = NotificationService(mock_bot)
+    
+    for row in rows:
+        assert await notification_service.send_reminder_row(row) is True
+    
+    assert mock_bot.send_message.call_count == 2
+
+@pytest.mark.asyncio
+async def test_pending_reminders_are_paged(create_test_match, db_pool):
+    """Test that reminders come in ID pages without a transaction open between rows"""
+    match = await MatchRepository.get_match_by_id(create_test_match)
+    match_ids = [create_test_match] + [
+        await MatchRepository.create_match(MatchCreate(
+            user1_id=match['user1_id'], user2_id=match['user2_id'], status="pending"
+        ))
+        for _ in range(2)
+    ]
+    
+    rows = []
+    async for row in MatchRepository.iter_pending_reminders(batch_size=1):
+        # Sends happen here; nothing may be left idle in a transaction meanwhile
+        async with db_pool.acquire() as conn:
+            assert await conn.fetchval('''
+                SELECT COUNT(*) FROM pg_stat_activity
+                WHERE datname = current_database() AND state LIKE 'idle in transaction%'
+            ''') == 0
+        
+        if row['match_id'] in match_ids:
+            rows.append(row['match_id'])
+    
+    assert rows == sorted(match_ids * 2)
+
+@pytest.mark.asyncio
+async def test_reminders_skip_matches_from_current_round(create_test_match, db_pool):
+    """Test that the reminder run leaves out matches made in the same day's round"""
+    from app.scheduler import Scheduler
+    
+    fresh_match_id = create_test_match
+    match = await MatchRepository.get_match_by_id(fresh_match_id)
+    
+    # A pending match from last week's round
+    old_match_id = await MatchRepository.create_match(MatchCreate(
+        user1_id=match['user1_id'], user2_id=match['user2_id'], status="pending"
+    ))
+    async with db_pool.acquire() as conn:
+        await conn.execute(
+            "UPDATE matches SET created_at = created_at - INTERVAL '7 days' WHERE id = $1", old_match_id
+        )
+    
+    scheduler = Scheduler(AsyncMock())
+    reminded = []
+    
+    async def send_reminder_row(row):
+        reminded.append(row['match_id'])
+        return True
+    
+    scheduler.notification_service.send_reminder_row = send_reminder_row
+    
+    # Every timezone is at the reminder hour
+    with patch("app.scheduler.due_timezones", side_effect=lambda timezones, hour, day: timezones):
+        await scheduler.send_match_reminders()
+    
+    assert reminded.count(old_match_id) == 2
+    assert fresh_match_id not in reminded
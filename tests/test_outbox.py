@@ -0,0 +1,113 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.services.outbox import OutboxService, OutboxWorker
+
+
+def test_match_created_entries():
+    """Test that every participant gets their own idempotent announcement"""
+    entries = OutboxService.match_created_entries([10, 11], [(1, 2), (3, 4)])
+
+    assert [entry[2] for entry in entries] == [
+        "match_created:10:1",
+        "match_created:10:2",
+        "match_created:11:3",
+        "match_created:11:4",
+    ]
+    assert entries[1][1] == {"match_id": 10, "user_id": 2}
+
+
+def test_match_status_entries_per_recipient():
+    """Test that status changes notify each recipient with their own key"""
+    # Each acceptance goes to the other participant, so both get a message
+    first = OutboxService.match_status_entries(10, "accepted", 1, 2, user_id=1)
+    second = OutboxService.match_status_entries(10, "accepted", 1, 2, user_id=2)
+
+    assert [entry[2] for entry in first + second] == ["match_status:10:accepted:2", "match_status:10:accepted:1"]
+    assert first[0][1] == {"match_id": 10, "status": "accepted", "user_id": 2}
+
+    # Completions go to both participants, one entry each
+    completed = OutboxService.match_status_entries(10, "completed", 1, 2)
+    assert [entry[1]['user_id'] for entry in completed] == [1, 2]
+
+    # Nobody to tell without the user who made the change
+    assert OutboxService.match_status_entries(10, "declined", 1, 2) == []
+
+
+def make_entry(attempts: int):
+    return {
+        "id": 1,
+        "kind": "match_created",
+        "payload": {"match_id": 10, "user_id": 1},
+        "idempotency_key": "match_created:10:1",
+        "attempts": attempts,
+    }
+
+
+@pytest.mark.asyncio
+async def test_deliver_marks_sent():
+    """Test that a delivered notification is marked as sent"""
+    notification_service = AsyncMock()
+    notification_service.notify_match_user.return_value = True
+    worker = OutboxWorker(notification_service, workers=1)
+
+    with patch("app.services.outbox.OutboxRepository") as repository:
+        repository.mark_sent = AsyncMock(return_value=True)
+        await worker._deliver(make_entry(1))
+
+    notification_service.notify_match_user.assert_awaited_once_with(10, 1)
+    repository.mark_sent.assert_awaited_once_with(1)
+
+
+@pytest.mark.asyncio
+async def test_deliver_retries_with_backoff():
+    """Test that failed deliveries are retried with a growing delay"""
+    notification_service = AsyncMock()
+    notification_service.notify_match_user.side_effect = RuntimeError("network")
+    worker = OutboxWorker(notification_service, workers=1, max_attempts=8)
+    worker.backoff_base = 5
+
+    with patch("app.services.outbox.OutboxRepository") as repository:
+        repository.mark_retry = AsyncMock(return_value=True)
+        await worker._deliver(make_entry(3))
+
+    entry_id, error, delay = repository.mark_retry.await_args.args
+    assert entry_id == 1
+    assert "network" in error
+    assert 20 * 0.8 <= delay <= 20 * 1.2
+
+
+@pytest.mark.asyncio
+async def test_deliver_gives_up_after_max_attempts():
+    """Test that a notification is marked failed after the last attempt"""
+    notification_service = AsyncMock()
+    notification_service.notify_match_user.return_value = False
+    worker = OutboxWorker(notification_service, workers=1, max_attempts=3)
+
+    with patch("app.services.outbox.OutboxRepository") as repository:
+        repository.mark_failed = AsyncMock(return_value=True)
+        repository.mark_retry = AsyncMock(return_value=True)
+        await worker._deliver(make_entry(3))
+
+    repository.mark_failed.assert_awaited_once()
+    repository.mark_retry.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_deliver_routes_status_to_one_recipient():
+    """Test that a status entry only notifies its own recipient"""
+    notification_service = AsyncMock()
+    notification_service.notify_match_status_user.return_value = True
+    worker = OutboxWorker(notification_service, workers=1)
+    entry = dict(
+        make_entry(1),
+        kind="match_status_user",
+        payload={"match_id": 10, "status": "completed", "user_id": 2},
+        idempotency_key="match_status:10:completed:2"
+    )
+
+    with patch("app.services.outbox.OutboxRepository") as repository:
+        repository.mark_sent = AsyncMock(return_value=True)
+        await worker._deliver(entry)
+
+    notification_service.notify_match_status_user.assert_awaited_once_with(10, "completed", 2)
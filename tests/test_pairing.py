@@ -0,0 +1,76 @@
+import pytest
+import random
+from itertools import combinations
+
+from app.services.matching import MatchingService
+from app.services.pair_history import PairHistory
+from app.services.pairing import UNMATCHED, maximum_matching
+
+def brute_force_size(count, edges):
+    """Get the maximum matching size by exhaustive search"""
+    best = 0
+    
+    def search(start, used, size):
+        nonlocal best
+        best = max(best, size)
+        for index in range(start, len(edges)):
+            a, b = edges[index]
+            if a not in used and b not in used:
+                search(index + 1, used | {a, b}, size + 1)
+    
+    search(0, frozenset(), 0)
+    return best
+
+def make_adjacency(count, edges):
+    adjacency = [[] for _ in range(count)]
+    for a, b in edges:
+        adjacency[a].append(b)
+        adjacency[b].append(a)
+    return adjacency
+
+def test_blossom_is_contracted():
+    """Test a graph where greedy gets stuck and the path runs through an odd cycle"""
+    # Triangle 0-1-2 with pendants 3 (on 0) and 4 (on 1), starting from the matching 1-2
+    edges = [(0, 1), (1, 2), (0, 2), (0, 3), (1, 4)]
+    match = [UNMATCHED, 2, 1, UNMATCHED, UNMATCHED]
+    
+    assert maximum_matching(make_adjacency(5, edges), match)
+    assert sum(1 for partner in match if partner != UNMATCHED) == 4
+
+@pytest.mark.parametrize("seed", range(30))
+def test_matches_brute_force(seed):
+    """Test that the matching is maximum on small random graphs"""
+    rng = random.Random(seed)
+    count = rng.randint(2, 11)
+    edges = [pair for pair in combinations(range(count), 2) if rng.random() < 0.3]
+    match = [UNMATCHED] * count
+    
+    assert maximum_matching(make_adjacency(count, edges), match)
+    
+    # The result is a valid matching on the graph
+    edge_set = {frozenset(edge) for edge in edges}
+    for vertex, partner in enumerate(match):
+        if partner != UNMATCHED:
+            assert match[partner] == vertex
+            assert frozenset((vertex, partner)) in edge_set
+    
+    assert sum(1 for partner in match if partner != UNMATCHED) // 2 == brute_force_size(count, edges)
+
+def test_maximum_engine_never_pairs_fewer_than_greedy():
+    """Test that the maximum engine improves on the greedy pairing"""
+    rng = random.Random(9)
+    users = [{'id': i} for i in range(1, 301)]
+    users_with_candidates = []
+    for user in users:
+        candidates = [other for other in rng.sample(users, 3) if other['id'] != user['id']]
+        users_with_candidates.append((user, candidates))
+    history = PairHistory()
+    
+    greedy, _ = MatchingService.pair_users(users_with_candidates, history)
+    maximum, remaining = MatchingService.pair_users_maximum(users_with_candidates, history)
+    
+    assert len(maximum) >= len(greedy)
+    assert len(maximum) * 2 + len(remaining) == len(users)
+    
+    paired = [user_id for _, pair in maximum for user_id in pair]
+    assert len(paired) == len(set(paired))
@@ -0,0 +1,110 @@
+import csv
+import gzip
+from datetime import date, datetime, timezone
+
+import pytest
+
+from app.database.connection import get_pool
+from app.database.models import MatchCreate, UserCreate
+from app.database.partitions import (
+    add_months, archive_partitions, create_partitions, list_partitions, month_start,
+    partition_month, partition_name, partitions_to_archive
+)
+from app.database.repositories import MatchRepository, UserRepository
+from app.services.pair_history import PairHistory
+
+TELEGRAM_IDS = [555000001, 555000002]
+
+
+def test_add_months_crosses_years():
+    """Test month arithmetic around year boundaries"""
+    assert add_months(date(2024, 11, 1), 3) == date(2025, 2, 1)
+    assert add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+    assert add_months(date(2024, 12, 1), 0) == date(2024, 12, 1)
+
+
+def test_partition_names_round_trip():
+    """Test that partition names encode their month"""
+    name = partition_name("match_history", date(2024, 3, 1))
+
+    assert name == "match_history_2024_03"
+    assert partition_month("match_history", name) == date(2024, 3, 1)
+    assert partition_month("matches", name) is None
+    assert partition_month("matches", "matches_default") is None
+
+
+def test_partitions_to_archive():
+    """Test that only months ending before the cutoff are archived, oldest first"""
+    names = ["matches_default", "matches_2024_02", "matches_2023_12", "matches_2024_03", "matches_2024_01"]
+
+    assert partitions_to_archive("matches", names, date(2024, 3, 1)) == [
+        "matches_2023_12",
+        "matches_2024_01",
+        "matches_2024_02",
+    ]
+
+
+@pytest.fixture
+async def old_match(db_pool):
+    """Create a completed match dated well past any retention period"""
+    month = add_months(month_start(datetime.utcnow().date()), -24)
+    
+    async with db_pool.acquire() as conn:
+        await conn.execute("DELETE FROM users WHERE telegram_id = ANY($1::bigint[])", TELEGRAM_IDS)
+        await create_partitions(conn, "matches", month, month)
+    UserRepository.clear_cache()
+    
+    user_ids = [
+        await UserRepository.create_user(UserCreate(telegram_id=telegram_id, full_name=f"Archived {telegram_id}"))
+        for telegram_id in TELEGRAM_IDS
+    ]
+    match_id = await MatchRepository.create_match(MatchCreate(user1_id=user_ids[0], user2_id=user_ids[1], status="completed"))
+    
+    # Moving the partition key moves the row into the old month's partition
+    async with db_pool.acquire() as conn:
+        await conn.execute("UPDATE matches SET created_at = $1 WHERE id = $2", datetime(month.year, month.month, 2, tzinfo=timezone.utc), match_id)
+    
+    yield month, user_ids, match_id
+    
+    async with db_pool.acquire() as conn:
+        await conn.execute("DELETE FROM users WHERE telegram_id = ANY($1::bigint[])", TELEGRAM_IDS)
+        await conn.execute(f"DROP TABLE IF EXISTS {partition_name('matches', month)}")
+
+
+@pytest.mark.asyncio
+async def test_archive_requires_durable_destination(old_match, tmp_path):
+    """Test that nothing is dropped without retention and an existing absolute archive directory"""
+    month, _, match_id = old_match
+    
+    assert await archive_partitions(retention_months=0, archive_dir=str(tmp_path)) == []
+    assert await archive_partitions(retention_months=12, archive_dir="archive") == []
+    assert await archive_partitions(retention_months=12, archive_dir=str(tmp_path / "missing")) == []
+    
+    assert await MatchRepository.get_match_by_id(match_id) is not None
+
+
+@pytest.mark.asyncio
+async def test_archive_detaches_and_drops_old_partitions(old_match, tmp_path):
+    """Test that old months are exported, dropped, and still count as met pairs and in stats"""
+    month, user_ids, match_id = old_match
+    name = partition_name("matches", month)
+    stats = await MatchRepository.get_match_stats(user_ids[0])
+    
+    archived = await archive_partitions(retention_months=12, archive_dir=str(tmp_path))
+    
+    assert name in archived
+    async with (await get_pool()).acquire() as conn:
+        assert name not in await list_partitions(conn, "matches")
+        assert await conn.fetchval("SELECT to_regclass($1)", name) is None
+    assert await MatchRepository.get_match_by_id(match_id) is None
+    
+    # The rows are in the archive
+    with gzip.open(tmp_path / f"{name}.csv.gz", "rt") as archive:
+        rows = list(csv.DictReader(archive))
+    assert [int(row['id']) for row in rows] == [match_id]
+    
+    # The pair is still known and the counters keep the archived match
+    assert user_ids[1] in await MatchRepository.get_previous_matches(user_ids[0])
+    history = await PairHistory.load()
+    assert history.has_met(user_ids[0], user_ids[1])
+    assert await MatchRepository.get_match_stats(user_ids[0]) == stats
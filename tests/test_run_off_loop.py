@@ -0,0 +1,51 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from app.services.matching import MatchingService
+
+
+def where(value):
+    """Report the process and thread the work ran in"""
+    return value, os.getpid(), threading.get_ident()
+
+
+def slow(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["inline", "thread", "process"])
+async def test_run_off_loop_modes(mode, monkeypatch):
+    """Test that each executor mode returns the result from the expected place"""
+    monkeypatch.setenv("MATCHING_EXECUTOR", mode)
+    
+    value, pid, thread = await MatchingService.run_off_loop(where, 42)
+    
+    assert value == 42
+    if mode == "process":
+        assert pid != os.getpid()
+    else:
+        assert pid == os.getpid()
+        assert (thread == threading.get_ident()) == (mode == "inline")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["thread", "process"])
+async def test_cancelled_run_does_not_block_the_loop(mode, monkeypatch):
+    """Test that cancelling a running round returns control without waiting for the worker"""
+    monkeypatch.setenv("MATCHING_EXECUTOR", mode)
+    
+    task = asyncio.create_task(MatchingService.run_off_loop(slow, 2))
+    await asyncio.sleep(0.5)
+    
+    started = time.monotonic()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    
+    assert time.monotonic() - started < 1
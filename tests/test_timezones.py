@@ -0,0 +1,42 @@
+from datetime import datetime
+
+import pytz
+
+from app.services.timezones import announcement_time, bucket_by_offset, due_timezones, get_timezone
+
+# Monday 2024-01-08 08:00 UTC
+NOW = pytz.utc.localize(datetime(2024, 1, 8, 8, 0))
+
+
+def test_get_timezone_falls_back_for_unknown_names():
+    """Test that missing or invalid timezones use the default"""
+    assert get_timezone("Not/AZone").zone == get_timezone(None).zone
+    assert get_timezone("").zone == get_timezone(None).zone
+
+
+def test_bucket_by_offset():
+    """Test grouping timezones that share a UTC offset"""
+    buckets = bucket_by_offset(["Europe/Paris", "Europe/Berlin", "UTC", "Asia/Kolkata"], NOW)
+
+    assert sorted(buckets[60]) == ["Europe/Berlin", "Europe/Paris"]
+    assert buckets[0] == ["UTC"]
+    assert buckets[330] == ["Asia/Kolkata"]
+
+
+def test_due_timezones():
+    """Test that only timezones at the local hour on the right day are due"""
+    timezones = ["Europe/Paris", "UTC", "America/New_York", "Asia/Tokyo"]
+
+    # 08:00 UTC is 09:00 in Paris on Monday, 17:00 in Tokyo
+    assert due_timezones(timezones, 9, "Monday", NOW) == ["Europe/Paris"]
+    assert due_timezones(timezones, 9, "Tuesday", NOW) == []
+    assert due_timezones(timezones, 17, None, NOW) == ["Asia/Tokyo"]
+
+
+def test_announcement_time():
+    """Test that announcements wait for the local hour but never for the next day"""
+    # 03:00 in New York: wait until 10:00 local (15:00 UTC)
+    assert announcement_time("America/New_York", 10, NOW) == pytz.utc.localize(datetime(2024, 1, 8, 15, 0))
+
+    # 17:00 in Tokyo: the hour has passed, send now
+    assert announcement_time("Asia/Tokyo", 10, NOW) is None
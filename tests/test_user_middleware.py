@@ -0,0 +1,34 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from aiogram.types import User
+
+from app.middlewares.user import UserMiddleware
+
+
+@pytest.mark.asyncio
+async def test_user_is_injected():
+    """Test that the sender's user row is passed to the handler"""
+    middleware = UserMiddleware()
+    handler = AsyncMock(return_value="ok")
+    row = {'id': 1, 'telegram_id': 111}
+    data = {'event_from_user': User(id=111, is_bot=False, first_name="Test")}
+
+    with patch("app.middlewares.user.UserRepository") as repository:
+        repository.get_user_by_telegram_id = AsyncMock(return_value=row)
+        assert await middleware(handler, MagicMock(), data) == "ok"
+
+    repository.get_user_by_telegram_id.assert_awaited_once_with(111)
+    assert data['user'] == row
+
+
+@pytest.mark.asyncio
+async def test_no_sender():
+    """Test that updates without a sender get no user"""
+    middleware = UserMiddleware()
+    handler = AsyncMock()
+    data = {}
+
+    await middleware(handler, MagicMock(), data)
+
+    assert data['user'] is None
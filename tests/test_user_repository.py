@@ -7,7 +7,7 @@ from dotenv import load_dotenv
 # Load environment variables for testing
 load_dotenv(".env.test", override=True)
 
-from app.database.connection import create_pool, close_pool
+from app.database.connection import Row
 from app.database.repositories import UserRepository
 from app.database.models import UserCreate, UserUpdate
 
@@ -26,27 +26,16 @@ TEST_USER = UserCreate(
     timezone="UTC"
 )
 
-@pytest.fixture(scope="session")
-def event_loop():
-    """Create an event loop for the test session"""
-    loop = asyncio.get_event_loop_policy().new_event_loop()
-    yield loop
-    loop.close()
-
-@pytest.fixture(scope="session")
-async def db_pool():
-    """Create a database pool for testing"""
-    pool = await create_pool()
-    yield pool
-    await close_pool()
-
-@pytest.fixture(async_generator)
+@pytest.fixture
 async def clean_db(db_pool):
     """Clean the database before and after tests"""
     async with db_pool.acquire() as conn:
         # Clean up before test
         await conn.execute("DELETE FROM users WHERE telegram_id = $1", TEST_USER.telegram_id)
     
+    # Rows were deleted behind the repository's back
+    UserRepository.clear_cache()
+    
     yield
     
     async with db_pool.acquire() as conn:
@@ -176,4 +165,32 @@ async def test_get_active_users(clean_db):
             test_user_found = True
             break
     
-    assert test_user_found is False
\ No newline at end of file
+    assert test_user_found is False
+
+@pytest.mark.asyncio
+async def test_get_users_by_ids(clean_db):
+    """Test getting several users at once"""
+    # Create user
+    user_id = await UserRepository.create_user(TEST_USER)
+    
+    # Unknown IDs are left out
+    users = await UserRepository.get_users_by_ids([user_id, user_id, -1])
+    
+    assert list(users.keys()) == [user_id]
+    assert users[user_id]['telegram_id'] == TEST_USER.telegram_id
+
+@pytest.mark.asyncio
+async def test_users_are_read_only_rows(clean_db):
+    """Test that users come back as shared read-only rows"""
+    # Create user
+    user_id = await UserRepository.create_user(TEST_USER)
+    
+    user = await UserRepository.get_user_by_id(user_id)
+    assert isinstance(user, Row)
+    assert user['telegram_id'] == TEST_USER.telegram_id
+    assert dict(user)['id'] == user_id
+    
+    # The cached row is shared instead of copied, so it cannot be modified
+    assert await UserRepository.get_user_by_telegram_id(TEST_USER.telegram_id) is user
+    with pytest.raises(TypeError):
+        user['full_name'] = "Changed"
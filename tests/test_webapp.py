@@ -1,3 +1,4 @@
+import httpx
 import pytest
 from fastapi.testclient import TestClient
 import os
@@ -6,11 +7,17 @@ from dotenv import load_dotenv
 # Load environment variables for testing
 load_dotenv(".env.test", override=True)
 
+from app.database.models import UserCreate
+from app.database.repositories import UserRepository
 from app.webapp.main import app
 
 # Create test client
 client = TestClient(app)
 
+def api_client() -> httpx.AsyncClient:
+    """Client for endpoints that use the database, run on the test session's event loop"""
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
 def test_root_endpoint():
     """Test the root endpoint returns the main page"""
     response = client.get("/")
@@ -33,11 +40,13 @@ def test_profile_view_endpoint():
     assert response.status_code == 200
     assert "Profile" in response.text
 
-def test_api_user_profile_endpoint():
+@pytest.mark.asyncio
+async def test_api_user_profile_endpoint(db_pool):
     """Test the API endpoint for user profiles"""
     # This test will fail if the user_id doesn't exist in the database
     # In a real test, we would mock the database response
-    response = client.get("/api/user/profile/1")
+    async with api_client() as async_client:
+        response = await async_client.get("/api/user/profile/1")
     
     # We expect either a 200 OK with user data or a 404 Not Found
     assert response.status_code in [200, 404]
@@ -64,4 +73,47 @@ def test_static_files():
     """Test that static files are served correctly"""
     response = client.get("/static/css/styles.css")
     assert response.status_code == 200
-    assert "text/css" in response.headers["content-type"]
\ No newline at end of file
+    assert "text/css" in response.headers["content-type"]
+TELEGRAM_ID = 557000001
+
+@pytest.fixture
+async def webapp_user(db_pool):
+    """Create a user for the Mini App to edit"""
+    async with db_pool.acquire() as conn:
+        await conn.execute("DELETE FROM users WHERE telegram_id = $1", TELEGRAM_ID)
+    UserRepository.clear_cache()
+    
+    # Take the next internal ID so it can't coincide with the Telegram ID
+    user_id = await UserRepository.create_user(UserCreate(telegram_id=TELEGRAM_ID, full_name="Mini App User"))
+    
+    yield user_id
+    
+    async with db_pool.acquire() as conn:
+        await conn.execute("DELETE FROM users WHERE telegram_id = $1", TELEGRAM_ID)
+    UserRepository.clear_cache()
+
+@pytest.mark.asyncio
+async def test_webapp_saves_profile_by_telegram_id(webapp_user):
+    """Test that saving a profile from the Mini App updates the user with that Telegram ID"""
+    async with api_client() as async_client:
+        response = await async_client.post("/api/webapp/data", json={
+            "action": "update_profile",
+            "profile": {"user_id": TELEGRAM_ID, "full_name": "Edited Name", "bio": "Saved from the Mini App"}
+        })
+    
+    assert response.status_code == 200
+    
+    user = await UserRepository.get_user_by_id(webapp_user)
+    assert user['full_name'] == "Edited Name"
+    assert user['bio'] == "Saved from the Mini App"
+
+@pytest.mark.asyncio
+async def test_webapp_save_unknown_user(db_pool):
+    """Test that saving a profile for an unknown Telegram ID is a 404"""
+    async with api_client() as async_client:
+        response = await async_client.post("/api/webapp/data", json={
+            "action": "update_profile",
+            "profile": {"user_id": TELEGRAM_ID + 1, "full_name": "Nobody"}
+        })
+    
+    assert response.status_code == 404